@@ -3,129 +3,107 @@
 
 # In[ ]:
 
+import os
+import time
+
 import streamlit as st
-import pandas as pd
-from datetime import datetime
-import uuid
+
+import core
+import metrics
+
+# Page-specific modules (table views, replenishment, bulk I/O) are imported
+# inside their page below, so a run only loads what the open page uses.
 
 # Set a wide layout for better display of data tables and charts
 st.set_page_config(layout="wide")
 
-# Initialize session state for data storage
-if 'inventory' not in st.session_state:
-    st.session_state.inventory = pd.DataFrame(columns=[
-        'Product ID', 'Product Name', 'Description', 'Unit Price',
-        'Current Stock Quantity', 'Reorder Level'
-    ])
-if 'sales_orders' not in st.session_state:
-    st.session_state.sales_orders = pd.DataFrame(columns=[
-        'Order ID', 'Date', 'Customer Name', 'Products', 'Total Amount'
-    ])
-if 'purchase_orders' not in st.session_state:
-    st.session_state.purchase_orders = pd.DataFrame(columns=[
-        'Order ID', 'Date', 'Supplier Name', 'Products', 'Total Amount'
-    ])
-if 'customers' not in st.session_state:
-    st.session_state.customers = pd.DataFrame(columns=[
-        'Customer ID', 'Name', 'Contact Person', 'Email', 'Phone', 'Address'
-    ])
-if 'suppliers' not in st.session_state:
-    st.session_state.suppliers = pd.DataFrame(columns=[
-        'Supplier ID', 'Name', 'Contact Person', 'Email', 'Phone', 'Address'
-    ])
-if 'sales_history' not in st.session_state:
-    st.session_state.sales_history = pd.DataFrame(columns=['Date', 'Product ID', 'Product Name', 'Quantity', 'Total Sale'])
+# Each run is timed into the page render histogram at the end of the script.
+run_started = time.perf_counter()
+
+# Open the shared SQLite repository; every page reads and writes through it.
+@st.cache_resource
+def get_repository():
+    """Opens the repository once per server process."""
+    return core.open_repository()
+
+# Heavy reports run in worker processes, started on first use.
+@st.cache_resource
+def get_report_jobs():
+    """Starts the background report worker pool once per server process."""
+    import report_jobs
+    return report_jobs.ReportJobs(repo.path)
+
+repo = get_repository()
+# Pick up what other sessions and server processes committed since the last run.
+repo.refresh()
 
 # --- Sidebar Navigation ---
 st.sidebar.title("MSME360")
 st.sidebar.markdown("---")
-page = st.sidebar.radio(
-    "Navigation",
-    ["Dashboard", "Inventory Management", "Sales Management",
-     "Purchase Management", "Customer Management", "Supplier Management",
-     "Reporting"]
-)
+pages = ["Dashboard", "Inventory Management", "Sales Management",
+         "Purchase Management", "Customer Management", "Supplier Management",
+         "Reporting", "Import / Export"]
+# The Diagnostics page is hidden unless the URL has ?diagnostics=1 or
+# MSME360_DIAGNOSTICS is set on the server.
+if st.query_params.get("diagnostics") == "1" or os.environ.get('MSME360_DIAGNOSTICS'):
+    pages.append("Diagnostics")
+page = st.sidebar.radio("Navigation", pages)
 st.sidebar.markdown("---")
 st.sidebar.info("A simple, user-friendly ERP for managing your business operations.")
 
-# --- Utility Functions ---
-
-def generate_unique_id(prefix):
-    """Generates a unique ID with a given prefix."""
-    return f"{prefix}-{str(uuid.uuid4())[:8]}"
-
-def update_stock(product_id, quantity_change, operation):
-    """Updates the stock of a product based on a sale or purchase."""
-    if product_id in st.session_state.inventory['Product ID'].values:
-        idx = st.session_state.inventory[
-            st.session_state.inventory['Product ID'] == product_id
-        ].index[0]
-        current_stock = st.session_state.inventory.loc[idx, 'Current Stock Quantity']
-        if operation == 'sale':
-            st.session_state.inventory.loc[idx, 'Current Stock Quantity'] = current_stock - quantity_change
-        elif operation == 'purchase':
-            st.session_state.inventory.loc[idx, 'Current Stock Quantity'] = current_stock + quantity_change
-
 # --- Page Content ---
 
 # Dashboard
 if page == "Dashboard":
+    from aggregates import WINDOWS
+
     st.title("Dashboard")
     st.markdown("---")
 
+    aggregates = repo.aggregates
+
     # Metrics
     col1, col2, col3, col4 = st.columns(4)
 
-    total_sales = st.session_state.sales_orders['Total Amount'].sum()
-    col1.metric("Total Sales", f"₹{total_sales:,.2f}")
-
-    current_stock_value = (st.session_state.inventory['Unit Price'] * st.session_state.inventory['Current Stock Quantity']).sum()
-    col2.metric("Current Stock Value", f"₹{current_stock_value:,.2f}")
-
-    pending_orders = st.session_state.sales_orders.shape[0] - st.session_state.sales_orders[
-        'Order ID'
-    ].shape[0]  # A simple placeholder
-    col3.metric("Pending Orders", st.session_state.sales_orders.shape[0])
-
-    low_stock_items = st.session_state.inventory[
-        st.session_state.inventory['Current Stock Quantity'] <= st.session_state.inventory['Reorder Level']
-    ].shape[0]
-    col4.metric("Low Stock Items", low_stock_items)
+    col1.metric("Total Sales", f"₹{aggregates.total_sales:,.2f}")
+    col2.metric("Current Stock Value", f"₹{aggregates.stock_value:,.2f}")
+    col3.metric("Pending Orders", repo.count('sales_orders'))
+    col4.metric("Low Stock Items", aggregates.low_stock_count)
 
     st.markdown("---")
 
     # Sales Trend Chart
     st.subheader("Sales Trends")
-    if not st.session_state.sales_history.empty:
-        # Ensure 'Date' is datetime and 'Total Sale' is numeric for plotting
-        st.session_state.sales_history['Date'] = pd.to_datetime(st.session_state.sales_history['Date'])
-        st.session_state.sales_history['Total Sale'] = pd.to_numeric(st.session_state.sales_history['Total Sale'], errors='coerce')
-        sales_by_date = st.session_state.sales_history.groupby('Date')['Total Sale'].sum().reset_index()
-        st.line_chart(sales_by_date.set_index('Date'))
+    if aggregates.sales_by_day:
+        st.line_chart(aggregates.sales_trend())
     else:
         st.info("No sales data available to display trends.")
 
-    # Top-Selling Products Chart
+    # Top-Selling Products Chart, served from the rolling sales counters
     st.subheader("Top-Selling Products")
-    if not st.session_state.sales_history.empty:
-        st.session_state.sales_history['Quantity'] = pd.to_numeric(st.session_state.sales_history['Quantity'], errors='coerce')
-        clean_sales_history = st.session_state.sales_history.dropna(subset=['Quantity'])
-
-        if not clean_sales_history.empty:
-            top_products = clean_sales_history.groupby('Product Name')['Quantity'].sum().nlargest(5)
-            st.bar_chart(top_products)
-        else:
-            st.info("No valid sales data available to display top-selling products.")
+    top_window = st.radio(
+        "Period", list(WINDOWS), index=len(WINDOWS) - 1, horizontal=True, key="top_products_window"
+    )
+    top_products = repo.top_products(5, WINDOWS[top_window])
+    if not top_products.empty:
+        st.bar_chart(top_products.set_index('Product Name')['Units'])
     else:
         st.info("No sales data available to display top-selling products.")
 
 # Inventory Management
 elif page == "Inventory Management":
+    from datetime import date
+
+    from table_view import highlight_low_stock, low_stock_mask, paged_table, search_options
+
     st.title("Inventory Management")
     st.markdown("---")
 
-    inventory_tab, add_product_tab, update_stock_tab = st.tabs(
-        ["View Inventory", "Add New Product", "Update Stock"]
+    inventory = repo.inventory()
+    location_names = repo.location_names()
+
+    inventory_tab, add_product_tab, update_stock_tab, transfer_tab, locations_tab, stock_history_tab = st.tabs(
+        ["View Inventory", "Add New Product", "Update Stock", "Transfer Stock", "Locations", "Stock History"]
     )
 
     with add_product_tab:
@@ -138,118 +116,229 @@ elif page == "Inventory Management":
                 "Current Stock Quantity", min_value=0, step=1
             )
             reorder_level = st.number_input("Reorder Level", min_value=0, step=1)
+            opening_location = st.selectbox(
+                "Stock Held At", list(location_names), format_func=location_names.get, key="add_product_location"
+            )
             submitted = st.form_submit_button("Add Product")
 
             if submitted:
-                if product_name and unit_price and current_stock_quantity >= 0:
-                    new_product = pd.DataFrame([{
-                        'Product ID': generate_unique_id('PROD'),
-                        'Product Name': product_name,
-                        'Description': description,
-                        'Unit Price': unit_price,
-                        'Current Stock Quantity': current_stock_quantity,
-                        'Reorder Level': reorder_level
-                    }])
-                    st.session_state.inventory = pd.concat(
-                        [st.session_state.inventory, new_product], ignore_index=True
-                    )
-                    st.success(f"Product '{product_name}' added successfully!")
-                else:
-                    st.error("Please fill in all required fields.")
+                with metrics.timed('form', 'add_product'):
+                    try:
+                        core.add_product(
+                            repo, product_name, unit_price, description,
+                            current_stock_quantity, reorder_level, opening_location
+                        )
+                    except core.ValidationError:
+                        st.error("Please fill in all required fields.")
+                    else:
+                        inventory = repo.inventory()
+                        st.success(f"Product '{product_name}' added successfully!")
+
+    with locations_tab:
+        st.subheader("Add New Location")
+        with st.form("add_location_form"):
+            location_name = st.text_input("Name")
+            location_kind = st.selectbox("Kind", core.LOCATION_KINDS)
+            location_address = st.text_area("Address")
+            submitted = st.form_submit_button("Add Location")
+
+            if submitted:
+                with metrics.timed('form', 'add_location'):
+                    try:
+                        core.add_location(repo, location_name, location_kind, location_address)
+                    except core.ValidationError as e:
+                        st.error(str(e))
+                    else:
+                        location_names = repo.location_names()
+                        st.success(f"Location '{location_name}' added successfully!")
+
+        st.subheader("Locations")
+        st.dataframe(
+            repo.location_summary(), hide_index=True,
+            column_config={'Stock Value': st.column_config.NumberColumn(format="₹%.2f")}
+        )
+        st.subheader("Stock by Location")
+        paged_table(repo.stock_by_location(), "stock_by_location")
 
     with inventory_tab:
         st.subheader("All Products")
-        if not st.session_state.inventory.empty:
+        if not inventory.empty:
             # Highlight low stock items
-            def highlight_low_stock(row):
-                if row['Current Stock Quantity'] <= row['Reorder Level']:
-                    return ['background-color: #ffcccc'] * len(row)
-                return [''] * len(row)
-
-            st.dataframe(
-                st.session_state.inventory.style.apply(
-                    highlight_low_stock, axis=1
-                ).set_properties(
-                    **{'background-color': '#fff3cd'},
-                    subset=pd.IndexSlice[
-                        st.session_state.inventory[
-                            'Current Stock Quantity'
-                        ] <= st.session_state.inventory['Reorder Level'], :
-                    ]
-                )
+            paged_table(
+                inventory, "inventory_view", highlight=highlight_low_stock,
+                filters={"Show only low stock items": low_stock_mask}
             )
 
-            low_stock_items = st.session_state.inventory[
-                st.session_state.inventory['Current Stock Quantity'] <= st.session_state.inventory['Reorder Level']
-            ]
-            if not low_stock_items.empty:
+            if repo.aggregates.low_stock_count:
                 st.warning("Low Stock Alert! The following products are below their reorder level.")
-                st.dataframe(low_stock_items)
+                paged_table(repo.low_stock_items(), "inventory_low_stock")
         else:
             st.info("No products in inventory. Add a new product to get started.")
 
     with update_stock_tab:
         st.subheader("Update Stock")
-        if not st.session_state.inventory.empty:
-            product_to_update = st.selectbox(
-                "Select Product", st.session_state.inventory['Product Name']
+        if not inventory.empty:
+            product_options = search_options(
+                repo, 'inventory', "Find Product", "update_stock_search", "Product name or ID"
             )
-            product_id = st.session_state.inventory[
-                st.session_state.inventory['Product Name'] == product_to_update
-            ]['Product ID'].iloc[0]
+            product_to_update = st.selectbox("Select Product", product_options)
+            product_id = repo.product_id_for_name(product_to_update) if product_to_update else None
+            stock_location = st.selectbox(
+                "Location", list(location_names), format_func=location_names.get, key="update_stock_location"
+            )
+            if product_id is not None:
+                st.caption(
+                    f"In stock at {location_names[stock_location]}: {repo.get_stock(product_id, stock_location):,} "
+                    f"of {repo.get_stock(product_id):,} in total."
+                )
             operation = st.radio("Operation", ["Receive Stock", "Dispatch Stock"])
             quantity_change = st.number_input(
                 "Quantity to Update", min_value=1, step=1
             )
             update_button = st.button("Update Stock Quantity")
 
-            if update_button:
-                if operation == "Receive Stock":
-                    update_stock(product_id, quantity_change, 'purchase')
-                    st.success(f"Successfully received {quantity_change} units of {product_to_update}.")
-                else:
-                    current_stock = st.session_state.inventory[
-                        st.session_state.inventory['Product ID'] == product_id
-                    ]['Current Stock Quantity'].iloc[0]
-                    if current_stock >= quantity_change:
-                        update_stock(product_id, quantity_change, 'sale')
-                        st.success(f"Successfully dispatched {quantity_change} units of {product_to_update}.")
+            if update_button and product_id is None:
+                st.error("No product matches the search.")
+            elif update_button:
+                with metrics.timed('form', 'update_stock'):
+                    if operation == "Receive Stock":
+                        core.receive_stock(repo, product_id, quantity_change, stock_location)
+                        st.success(f"Successfully received {quantity_change} units of {product_to_update}.")
                     else:
-                        st.error("Cannot dispatch more than current stock.")
+                        try:
+                            core.dispatch_stock(repo, product_id, quantity_change, stock_location)
+                            st.success(f"Successfully dispatched {quantity_change} units of {product_to_update}.")
+                        except core.InsufficientStockError:
+                            st.error("Cannot dispatch more than current stock.")
         else:
             st.warning("Please add products to inventory before updating stock.")
 
+    with transfer_tab:
+        st.subheader("Transfer Stock Between Locations")
+        if inventory.empty or len(location_names) < 2:
+            st.warning("Please add products and at least two locations before transferring stock.")
+        else:
+            from_col, to_col = st.columns(2)
+            from_location = from_col.selectbox(
+                "From", list(location_names), format_func=location_names.get, key="transfer_from"
+            )
+            to_location = to_col.selectbox(
+                "To", [location for location in location_names if location != from_location],
+                format_func=location_names.get, key="transfer_to"
+            )
+            product_options = search_options(
+                repo, 'inventory', "Find Products", "transfer_product_search", "Product name or ID",
+                keep=st.session_state.get("transfer_products", [])
+            )
+            with st.form("transfer_stock_form"):
+                products_to_move = st.multiselect("Select Products", product_options, key="transfer_products")
+                transfer_lines = []
+                for product in products_to_move:
+                    product_id = repo.product_id_for_name(product)
+                    quantity = st.number_input(
+                        f"Quantity of {product} (at {location_names[from_location]}: "
+                        f"{repo.get_stock(product_id, from_location):,})",
+                        min_value=1, step=1, key=f"transfer_qty_{product_id}"
+                    )
+                    transfer_lines.append({'product_id': product_id, 'quantity': quantity})
+                submitted = st.form_submit_button("Transfer Stock")
+
+                if submitted:
+                    with metrics.timed('form', 'transfer_stock'):
+                        try:
+                            core.transfer_stock(repo, from_location, to_location, transfer_lines)
+                        except core.ValidationError as e:
+                            st.error(str(e))
+                        except core.InsufficientStockError as e:
+                            st.error(
+                                f"Cannot move {e.requested} units of {e.product_name}. "
+                                f"Only {e.available} at {location_names[from_location]}."
+                            )
+                        else:
+                            st.success(
+                                f"Moved {len(transfer_lines)} product(s) from {location_names[from_location]} "
+                                f"to {location_names[to_location]}."
+                            )
+
+    with stock_history_tab:
+        st.subheader("Stock History")
+        # Every receipt, dispatch, sale and purchase is in the stock ledger.
+        product_options = search_options(
+            repo, 'inventory', "Find Product", "stock_history_search", "Product name or ID"
+        )
+        product_col, date_col = st.columns([2, 1])
+        history_product = product_col.selectbox(
+            "Product", [None] + product_options, key="stock_history_product",
+            format_func=lambda name: "All products" if name is None else name
+        )
+        as_of = date_col.date_input("Stock as of", date.today(), key="stock_history_date")
+        history_product_id = None if history_product is None else repo.product_id_for_name(history_product)
+
+        if history_product_id is None:
+            st.markdown(f"**Stock at the end of {as_of:%d %b %Y}**")
+            paged_table(repo.stock_as_of(as_of), "stock_as_of")
+        else:
+            stock_then = repo.stock_as_of(as_of, history_product_id)['Stock'].iloc[0]
+            st.metric(f"Stock at the end of {as_of:%d %b %Y}", int(stock_then))
+        st.markdown("**Latest Movements**")
+        paged_table(repo.stock_movements(history_product_id), "stock_movements")
+
+        if st.button("Check Stock Against Ledger"):
+            discrepancies = repo.stock_discrepancies()
+            if discrepancies.empty:
+                st.success("Every product's stock matches its ledger balance.")
+            else:
+                st.error(f"{len(discrepancies)} products differ from their ledger balance.")
+                st.dataframe(discrepancies, hide_index=True)
+
 # Sales Management
 elif page == "Sales Management":
+    from table_view import paged_table, search_options
+
     st.title("Sales Management")
     st.markdown("---")
 
-    create_sale_tab, view_sales_tab = st.tabs(["Create Sale Order", "View Sales Orders"])
+    inventory = repo.inventory()
+    customers = repo.customers()
+    sales_orders = repo.sales_orders()
+
+    create_sale_tab, ingest_tab, view_sales_tab = st.tabs(
+        ["Create Sale Order", "Import Channel Orders", "View Sales Orders"]
+    )
 
     with create_sale_tab:
         st.subheader("Create New Sale Order")
-        if st.session_state.inventory.empty or st.session_state.customers.empty:
+        if inventory.empty or customers.empty:
             st.warning("Please add products to inventory and customers before creating a sale.")
         else:
-            with st.form("create_sale_form"):
-                customer_name = st.selectbox(
-                    "Select Customer", st.session_state.customers['Name']
+            location_names = repo.location_names()
+            sale_location = st.selectbox(
+                "Sell From", list(location_names), format_func=location_names.get, key="sale_location"
+            )
+            customer_col, product_col = st.columns(2)
+            with customer_col:
+                customer_options = search_options(
+                    repo, 'customers', "Find Customer", "sale_customer_search",
+                    "Name, contact person, email or phone"
                 )
-                products_sold = st.multiselect(
-                    "Select Products", st.session_state.inventory['Product Name']
+            with product_col:
+                product_options = search_options(
+                    repo, 'inventory', "Find Products", "sale_product_search", "Product name or ID",
+                    keep=st.session_state.get("sale_products", [])
                 )
+            with st.form("create_sale_form"):
+                customer_name = st.selectbox("Select Customer", customer_options)
+                products_sold = st.multiselect("Select Products", product_options, key="sale_products")
                 sale_products = []
                 total_amount = 0
 
                 for product in products_sold:
-                    product_id = st.session_state.inventory[
-                        st.session_state.inventory['Product Name'] == product
-                    ]['Product ID'].iloc[0]
-                    unit_price = st.session_state.inventory[
-                        st.session_state.inventory['Product Name'] == product
-                    ]['Unit Price'].iloc[0]
+                    product_row = repo.product_by_name(product)
+                    product_id = product_row['Product ID']
+                    unit_price = product_row['Unit Price']
                     quantity = st.number_input(
-                        f"Quantity for {product} (Unit Price: ₹{unit_price:.2f})",
+                        f"Quantity for {product} (Unit Price: ₹{unit_price:.2f}, "
+                        f"In Stock: {repo.get_stock(product_id, sale_location):,})",
                         min_value=1, step=1, key=f"sale_qty_{product_id}"
                     )
                     sale_products.append({
@@ -264,79 +353,120 @@ elif page == "Sales Management":
                 submitted = st.form_submit_button("Record Sale")
 
                 if submitted:
-                    success = True
-                    for item in sale_products:
-                        current_stock = st.session_state.inventory[
-                            st.session_state.inventory['Product ID'] == item['product_id']
-                        ]['Current Stock Quantity'].iloc[0]
-                        if current_stock < item['quantity']:
-                            st.error(f"Cannot sell {item['quantity']} units of {item['product_name']}. Only {current_stock} available.")
-                            success = False
-                            break
-                    
-                    if success:
-                        new_sale = pd.DataFrame([{
-                            'Order ID': generate_unique_id('SALE'),
-                            'Date': datetime.now().strftime("%Y-%m-%d"),
-                            'Customer Name': customer_name,
-                            'Products': sale_products,
-                            'Total Amount': total_amount
-                        }])
-                        st.session_state.sales_orders = pd.concat(
-                            [st.session_state.sales_orders, new_sale], ignore_index=True
-                        )
-
-                        for item in sale_products:
-                            update_stock(item['product_id'], item['quantity'], 'sale')
-                            new_history = pd.DataFrame([{
-                                'Date': datetime.now().strftime("%Y-%m-%d"),
-                                'Product ID': item['product_id'],
-                                'Product Name': item['product_name'],
-                                'Quantity': int(item['quantity']),
-                                'Total Sale': float(item['quantity'] * item['unit_price'])
-                            }])
-                            st.session_state.sales_history = pd.concat(
-                                [st.session_state.sales_history, new_history], ignore_index=True
-                            )
-
-                        st.success(f"Sale order for '{customer_name}' recorded successfully!")
+                    with metrics.timed('form', 'create_sale'):
+                        try:
+                            core.record_sale(repo, customer_name, sale_products, sale_location)
+                        except (core.ValidationError, core.InsufficientStockError) as e:
+                            st.error(str(e))
+                        else:
+                            sales_orders = repo.sales_orders()
+                            st.success(f"Sale order for '{customer_name}' recorded successfully!")
+
+    with ingest_tab:
+        import bulk_io
+        import order_ingest
+
+        st.subheader("Import Channel Orders")
+        st.write(
+            "Upload a CSV or Parquet file with one row per order line: 'Order Ref', 'Customer Name', "
+            "'Product ID' or 'Product Name', 'Quantity' and optionally 'Order Time'. "
+            "Orders with an invalid line, or whose 'Order Ref' was imported before, are rejected; "
+            "accepted orders are recorded together."
+        )
+        location_names = repo.location_names()
+        ingest_location = st.selectbox(
+            "Sell From", list(location_names), format_func=location_names.get, key="ingest_location"
+        )
+        ingest_policy = st.radio(
+            "Allocation Policy", list(order_ingest.POLICIES), format_func=order_ingest.POLICIES.get,
+            horizontal=True, key="ingest_policy"
+        )
+        priority_customers = []
+        if ingest_policy == 'priority':
+            priority_options = search_options(
+                repo, 'customers', "Find Priority Customers", "ingest_priority_search",
+                "Name, contact person, email or phone",
+                keep=st.session_state.get("ingest_priority_customers", [])
+            )
+            priority_customers = st.multiselect(
+                "Priority Customers", priority_options, key="ingest_priority_customers"
+            )
+        partial_fills = st.checkbox("Allow partial fills", value=True, key="ingest_partial")
+        orders_file = st.file_uploader("Orders file", type=["csv", "parquet"], key="ingest_file")
+        if orders_file is not None and st.button("Import Orders"):
+            with metrics.timed('form', 'ingest_orders'):
+                try:
+                    order_lines = order_ingest.read_orders(orders_file, bulk_io.format_for(orders_file.name))
+                    report = core.ingest_orders(
+                        repo, order_lines, ingest_policy, priority_customers, partial_fills, ingest_location
+                    )
+                except (ValueError, ImportError, core.InsufficientStockError) as e:
+                    st.error(str(e))
+                else:
+                    sales_orders = repo.sales_orders()
+                    counts = report['Status'].value_counts()
+                    st.success(
+                        f"Recorded {counts.get(order_ingest.FILLED, 0):,} filled and "
+                        f"{counts.get(order_ingest.PARTIAL, 0):,} partially filled orders; "
+                        f"{counts.get(order_ingest.REJECTED, 0):,} rejected."
+                    )
+                    st.dataframe(report, hide_index=True)
 
     with view_sales_tab:
         st.subheader("All Sales Orders")
-        if not st.session_state.sales_orders.empty:
-            st.dataframe(st.session_state.sales_orders)
+        if not sales_orders.empty:
+            paged_table(sales_orders, "sales_orders_view")
+            st.subheader("Order Lines")
+            paged_table(repo.line_items('sale'), "sales_lines_view")
         else:
             st.info("No sales orders recorded yet.")
 
 # Purchase Management
 elif page == "Purchase Management":
+    import replenishment
+    from table_view import paged_table, search_options
+
     st.title("Purchase Management")
     st.markdown("---")
 
-    create_purchase_tab, view_purchases_tab = st.tabs(["Create Purchase Order", "View Purchase Orders"])
+    inventory = repo.inventory()
+    suppliers = repo.suppliers()
+    purchase_orders = repo.purchase_orders()
+
+    create_purchase_tab, reorder_tab, view_purchases_tab = st.tabs(
+        ["Create Purchase Order", "Reorder Suggestions", "View Purchase Orders"]
+    )
 
     with create_purchase_tab:
         st.subheader("Create New Purchase Order")
-        if st.session_state.inventory.empty or st.session_state.suppliers.empty:
+        if inventory.empty or suppliers.empty:
             st.warning("Please add products to inventory and suppliers before creating a purchase.")
         else:
-            with st.form("create_purchase_form"):
-                supplier_name = st.selectbox(
-                    "Select Supplier", st.session_state.suppliers['Name']
+            supplier_col, product_col = st.columns(2)
+            with supplier_col:
+                supplier_options = search_options(
+                    repo, 'suppliers', "Find Supplier", "purchase_supplier_search",
+                    "Name, contact person, email or phone"
                 )
-                products_to_buy = st.multiselect(
-                    "Select Products", st.session_state.inventory['Product Name']
+            with product_col:
+                product_options = search_options(
+                    repo, 'inventory', "Find Products", "purchase_product_search", "Product name or ID",
+                    keep=st.session_state.get("purchase_products", [])
                 )
+            location_names = repo.location_names()
+            with st.form("create_purchase_form"):
+                supplier_name = st.selectbox("Select Supplier", supplier_options)
+                purchase_location = st.selectbox(
+                    "Receive At", list(location_names), format_func=location_names.get, key="purchase_location"
+                )
+                products_to_buy = st.multiselect("Select Products", product_options, key="purchase_products")
                 purchase_products = []
                 total_amount = 0
 
                 for product in products_to_buy:
-                    product_id = st.session_state.inventory[
-                        st.session_state.inventory['Product Name'] == product
-                    ]['Product ID'].iloc[0]
-                    unit_price = st.session_state.inventory[
-                        st.session_state.inventory['Product Name'] == product
-                    ]['Unit Price'].iloc[0]
+                    product_row = repo.product_by_name(product)
+                    product_id = product_row['Product ID']
+                    unit_price = product_row['Unit Price']
                     quantity = st.number_input(
                         f"Quantity for {product} (Unit Price: ₹{unit_price:.2f})",
                         min_value=1, step=1, key=f"purchase_qty_{product_id}"
@@ -353,35 +483,91 @@ elif page == "Purchase Management":
                 submitted = st.form_submit_button("Record Purchase")
 
                 if submitted:
-                    new_purchase = pd.DataFrame([{
-                        'Order ID': generate_unique_id('PURCH'),
-                        'Date': datetime.now().strftime("%Y-%m-%d"),
-                        'Supplier Name': supplier_name,
-                        'Products': purchase_products,
-                        'Total Amount': total_amount
-                    }])
-                    st.session_state.purchase_orders = pd.concat(
-                        [st.session_state.purchase_orders, new_purchase], ignore_index=True
-                    )
-
-                    for item in purchase_products:
-                        update_stock(item['product_id'], item['quantity'], 'purchase')
-
-                    st.success(f"Purchase order from '{supplier_name}' recorded successfully!")
+                    with metrics.timed('form', 'create_purchase'):
+                        try:
+                            core.record_purchase(repo, supplier_name, purchase_products, purchase_location)
+                        except core.ValidationError as e:
+                            st.error(str(e))
+                        else:
+                            purchase_orders = repo.purchase_orders()
+                            st.success(f"Purchase order from '{supplier_name}' recorded successfully!")
+
+    with reorder_tab:
+        st.subheader("Reorder Suggestions")
+        st.caption(
+            "Products at or below their reorder point, with quantities that cover the lead time, "
+            "safety stock and the next days of sales, grouped by the supplier each was last bought from."
+        )
+        window_col, lead_col, safety_col, cover_col = st.columns(4)
+        window_days = window_col.number_input(
+            "Sales Window (days)", min_value=1, value=replenishment.WINDOW_DAYS, step=1, key="reorder_window"
+        )
+        lead_time_days = lead_col.number_input(
+            "Lead Time (days)", min_value=0, value=replenishment.LEAD_TIME_DAYS, step=1, key="reorder_lead_time"
+        )
+        safety_days = safety_col.number_input(
+            "Safety Stock (days)", min_value=0, value=replenishment.SAFETY_DAYS, step=1, key="reorder_safety"
+        )
+        cover_days = cover_col.number_input(
+            "Cover (days)", min_value=0, value=replenishment.COVER_DAYS, step=1, key="reorder_cover"
+        )
+        suggestions = core.reorder_suggestions(repo, window_days, lead_time_days, safety_days, cover_days)
+        if suggestions.empty:
+            st.success("No products need reordering.")
+        else:
+            default_supplier = None
+            if suggestions['Supplier Name'].isna().any() and not suppliers.empty:
+                supplier_options = search_options(
+                    repo, 'suppliers', "Find Supplier for Products Never Purchased", "reorder_supplier_search",
+                    "Name, contact person, email or phone"
+                )
+                default_supplier = st.selectbox(
+                    "Supplier for Products Never Purchased", [None] + supplier_options,
+                    format_func=lambda name: "Leave them out" if name is None else name
+                )
+            st.subheader("Draft Purchase Orders")
+            st.dataframe(
+                replenishment.order_summary(suggestions, default_supplier), hide_index=True,
+                column_config={'Amount': st.column_config.NumberColumn(format="₹%.2f")}
+            )
+            paged_table(suggestions, "reorder_suggestions")
+            drafts = replenishment.draft_orders(suggestions, default_supplier)
+            location_names = repo.location_names()
+            reorder_location = st.selectbox(
+                "Receive At", list(location_names), format_func=location_names.get, key="reorder_location"
+            )
+            if st.button("Record Draft Purchase Orders", disabled=not drafts):
+                with metrics.timed('form', 'record_reorders'):
+                    try:
+                        order_ids = core.record_reorders(repo, suggestions, default_supplier, reorder_location)
+                    except core.ValidationError as e:
+                        st.error(str(e))
+                    else:
+                        purchase_orders = repo.purchase_orders()
+                        st.success(f"Recorded {len(order_ids)} draft purchase order(s).")
 
     with view_purchases_tab:
         st.subheader("All Purchase Orders")
-        if not st.session_state.purchase_orders.empty:
-            st.dataframe(st.session_state.purchase_orders)
+        if not purchase_orders.empty:
+            paged_table(purchase_orders, "purchase_orders_view")
+            st.subheader("Order Lines")
+            paged_table(repo.line_items('purchase'), "purchase_lines_view")
         else:
             st.info("No purchase orders recorded yet.")
 
 # Customer Management
 elif page == "Customer Management":
+    from aggregates import WINDOWS
+    from table_view import paged_table
+
     st.title("Customer Management (CRM)")
     st.markdown("---")
 
-    add_customer_tab, view_customers_tab = st.tabs(["Add New Customer", "View Customers"])
+    customers = repo.customers()
+
+    add_customer_tab, view_customers_tab, top_customers_tab = st.tabs(
+        ["Add New Customer", "View Customers", "Top Customers"]
+    )
 
     with add_customer_tab:
         st.subheader("Add New Customer")
@@ -394,34 +580,51 @@ elif page == "Customer Management":
             submitted = st.form_submit_button("Add Customer")
 
             if submitted:
-                if name:
-                    new_customer = pd.DataFrame([{
-                        'Customer ID': generate_unique_id('CUST'),
-                        'Name': name,
-                        'Contact Person': contact_person,
-                        'Email': email,
-                        'Phone': phone,
-                        'Address': address
-                    }])
-                    st.session_state.customers = pd.concat(
-                        [st.session_state.customers, new_customer], ignore_index=True
-                    )
-                    st.success(f"Customer '{name}' added successfully!")
-                else:
-                    st.error("Please enter a company name.")
+                with metrics.timed('form', 'add_customer'):
+                    try:
+                        core.add_customer(repo, name, contact_person, email, phone, address)
+                    except core.ValidationError:
+                        st.error("Please enter a company name.")
+                    else:
+                        customers = repo.customers()
+                        st.success(f"Customer '{name}' added successfully!")
 
     with view_customers_tab:
         st.subheader("All Customers")
-        if not st.session_state.customers.empty:
-            st.dataframe(st.session_state.customers)
+        if not customers.empty:
+            paged_table(customers, "customers_view")
         else:
             st.info("No customers added yet.")
 
+    with top_customers_tab:
+        st.subheader("Top Customers")
+        window_col, rank_col = st.columns(2)
+        customer_window = window_col.radio(
+            "Period", list(WINDOWS), index=len(WINDOWS) - 1, horizontal=True, key="top_customers_window"
+        )
+        rank_by = rank_col.radio(
+            "Rank by", ["Amount", "Orders"], horizontal=True, key="top_customers_rank"
+        )
+        top_customers = repo.top_customers(
+            10, WINDOWS[customer_window], 'amount' if rank_by == "Amount" else 'count'
+        )
+        if not top_customers.empty:
+            st.dataframe(
+                top_customers, hide_index=True,
+                column_config={'Amount': st.column_config.NumberColumn(format="₹%.2f")}
+            )
+        else:
+            st.info("No sales to customers in this period.")
+
 # Supplier Management
 elif page == "Supplier Management":
+    from table_view import paged_table
+
     st.title("Supplier Management")
     st.markdown("---")
 
+    suppliers = repo.suppliers()
+
     add_supplier_tab, view_suppliers_tab = st.tabs(["Add New Supplier", "View Suppliers"])
 
     with add_supplier_tab:
@@ -435,55 +638,69 @@ elif page == "Supplier Management":
             submitted = st.form_submit_button("Add Supplier")
 
             if submitted:
-                if name:
-                    new_supplier = pd.DataFrame([{
-                        'Supplier ID': generate_unique_id('SUPPL'),
-                        'Name': name,
-                        'Contact Person': contact_person,
-                        'Email': email,
-                        'Phone': phone,
-                        'Address': address
-                    }])
-                    st.session_state.suppliers = pd.concat(
-                        [st.session_state.suppliers, new_supplier], ignore_index=True
-                    )
-                    st.success(f"Supplier '{name}' added successfully!")
-                else:
-                    st.error("Please enter a company name.")
+                with metrics.timed('form', 'add_supplier'):
+                    try:
+                        core.add_supplier(repo, name, contact_person, email, phone, address)
+                    except core.ValidationError:
+                        st.error("Please enter a company name.")
+                    else:
+                        suppliers = repo.suppliers()
+                        st.success(f"Supplier '{name}' added successfully!")
 
     with view_suppliers_tab:
         st.subheader("All Suppliers")
-        if not st.session_state.suppliers.empty:
-            st.dataframe(st.session_state.suppliers)
+        if not suppliers.empty:
+            paged_table(suppliers, "suppliers_view")
         else:
             st.info("No suppliers added yet.")
 
 # Reporting
 elif page == "Reporting":
+    from datetime import date, timedelta
+
+    import report_jobs
+    from table_view import highlight_low_stock, paged_table, search_options
+
     st.title("Reporting")
     st.markdown("---")
 
-    sales_tab, inventory_tab, purchase_tab, toolkit_tab = st.tabs(
-        ["Sales Report", "Inventory Report", "Purchase Report", "Expansion Toolkit"]
+    inventory = repo.inventory()
+    purchase_orders = repo.purchase_orders()
+
+    sales_tab, inventory_tab, purchase_tab, toolkit_tab, jobs_tab = st.tabs(
+        ["Sales Report", "Inventory Report", "Purchase Report", "Expansion Toolkit", "Report Jobs"]
     )
 
     with sales_tab:
         st.subheader("Sales Report")
-        if not st.session_state.sales_history.empty:
-            st.dataframe(st.session_state.sales_history)
+        if repo.aggregates.sales_by_day:
+            # Only the partitions overlapping the chosen range are read.
+            range_col, product_col = st.columns([1, 2])
+            report_range = range_col.date_input(
+                "Date range", (date.today() - timedelta(days=30), date.today()),
+                key="sales_report_range"
+            )
+            with product_col:
+                product_options = search_options(
+                    repo, 'inventory', "Find Products", "sales_report_product_search", "Product name or ID",
+                    keep=st.session_state.get("sales_report_products", [])
+                )
+                report_products = st.multiselect("Products", product_options, key="sales_report_products")
+            start, end = (report_range + report_range)[:2]
+            product_ids = [repo.product_id_for_name(name) for name in report_products] or None
+            paged_table(repo.sales_history_range(start, end, product_ids), "sales_report")
+            st.subheader("Sales by Product")
+            paged_table(repo.totals_by_product('sale'), "sales_by_product")
         else:
             st.info("No sales history to display.")
 
     with inventory_tab:
         st.subheader("Inventory Report")
-        if not st.session_state.inventory.empty:
-            st.dataframe(st.session_state.inventory)
-            low_stock_items = st.session_state.inventory[
-                st.session_state.inventory['Current Stock Quantity'] <= st.session_state.inventory['Reorder Level']
-            ]
-            if not low_stock_items.empty:
+        if not inventory.empty:
+            paged_table(inventory, "inventory_report", highlight=highlight_low_stock)
+            if repo.aggregates.low_stock_count:
                 st.warning("Low Stock Items")
-                st.dataframe(low_stock_items)
+                paged_table(repo.low_stock_items(), "inventory_report_low_stock")
             else:
                 st.success("All inventory levels are good!")
         else:
@@ -491,14 +708,18 @@ elif page == "Reporting":
 
     with purchase_tab:
         st.subheader("Purchase Report")
-        if not st.session_state.purchase_orders.empty:
-            st.dataframe(st.session_state.purchase_orders)
+        if not purchase_orders.empty:
+            paged_table(purchase_orders, "purchase_report")
+            st.subheader("Purchases by Supplier")
+            paged_table(repo.purchases_by_supplier(), "purchases_by_supplier")
+            st.subheader("Purchases by Product")
+            paged_table(repo.totals_by_product('purchase'), "purchases_by_product")
         else:
             st.info("No purchase orders to display.")
 
     with toolkit_tab:
         st.subheader("Expansion Toolkit for MSMEs")
-        total_sales = st.session_state.sales_orders['Total Amount'].sum()
+        total_sales = repo.aggregates.total_sales
         st.info(f"Your total lifetime sales are currently: ₹{total_sales:,.2f}")
         st.markdown("---")
 
@@ -529,3 +750,160 @@ elif page == "Reporting":
             - **Finance**: Consult with a financial advisor to plan for business expansion, potential investments, or franchising opportunities.
             - **Next Step**: Solidify your market position and explore new product lines.
             """)
+
+    with jobs_tab:
+        st.subheader("Report Jobs")
+        st.caption(
+            "Full exports build in background worker processes. Keep working and "
+            "come back here to download them when they finish."
+        )
+        jobs = get_report_jobs()
+        kind_col, format_col = st.columns(2)
+        job_kind = kind_col.selectbox(
+            "Report", list(report_jobs.REPORTS), format_func=report_jobs.REPORTS.get, key="report_job_kind"
+        )
+        job_format = format_col.selectbox(
+            "Format", report_jobs.available_formats(), format_func=str.upper, key="report_job_format"
+        )
+        job_params = {}
+        if job_kind in ('sales', 'purchases'):
+            all_dates = st.checkbox("All dates", value=True, key="report_job_all_dates")
+            if not all_dates:
+                job_range = st.date_input(
+                    "Date range", (date(date.today().year, 1, 1), date.today()), key="report_job_range"
+                )
+                job_params['start'], job_params['end'] = (job_range + job_range)[:2]
+        elif job_kind == 'inventory_valuation':
+            job_params['as_of'] = st.date_input(
+                "Stock as of", date.today(), key="report_job_as_of",
+                help="Stock is rebuilt from the stock ledger and valued at current unit prices."
+            )
+        if st.button("Start Report"):
+            with metrics.timed('form', 'start_report'):
+                jobs.submit(job_kind, job_format, **job_params)
+
+        @st.fragment(run_every=1 if jobs.busy() else None)
+        def show_report_jobs():
+            """Lists the jobs; reruns on its own every second while any is unfinished."""
+            submitted = jobs.jobs()
+            if not submitted:
+                st.info("No reports started yet.")
+            for job in submitted:
+                st.markdown(f"**{job.label}** ({job.fmt.upper()}), started {job.submitted:%d %b %H:%M:%S}")
+                if job.status == 'done':
+                    st.download_button(
+                        f"Download {job.file_name}", job.read, file_name=job.file_name,
+                        mime=job.mime, key=f"report_job_{job.id}", on_click='ignore'
+                    )
+                elif job.status == 'failed':
+                    st.error(f"The report failed: {job.error}")
+                else:
+                    fraction, message = job.progress()
+                    st.progress(fraction, text=message)
+
+        show_report_jobs()
+
+# Import / Export
+elif page == "Import / Export":
+    import bulk_io
+
+    st.title("Import / Export")
+    st.markdown("---")
+
+    import_tab, export_tab = st.tabs(["Bulk Import", "Export"])
+
+    with import_tab:
+        st.subheader("Bulk Import")
+        st.write(
+            "Upload a CSV or Parquet file whose column names match the table. "
+            "Rows without an ID get a new one; invalid or duplicate rows are skipped and listed below."
+        )
+        import_table = st.selectbox(
+            "Import into", list(bulk_io.TABLE_LABELS), format_func=bulk_io.TABLE_LABELS.get,
+            key="import_table"
+        )
+        uploaded = st.file_uploader("Source file", type=["csv", "parquet"])
+        if uploaded is not None and st.button("Import"):
+            with metrics.timed('form', 'bulk_import'):
+                try:
+                    report = bulk_io.import_table(
+                        repo, import_table, uploaded, bulk_io.format_for(uploaded.name)
+                    )
+                except (ValueError, ImportError) as e:
+                    st.error(str(e))
+                else:
+                    st.success(
+                        f"Imported {report.imported:,} rows into {bulk_io.TABLE_LABELS[import_table]}."
+                    )
+                    if report.rejected_count:
+                        st.warning(f"{report.rejected_count:,} rows were rejected.")
+                        st.dataframe(report.rejected_frame())
+
+    with export_tab:
+        st.subheader("Export")
+        reports = {"Low Stock Report": repo.low_stock_items}
+        export_choice = st.selectbox(
+            "Export", list(bulk_io.TABLE_LABELS) + list(reports),
+            format_func=lambda choice: bulk_io.TABLE_LABELS.get(choice, choice), key="export_table"
+        )
+        export_format = st.radio("Format", bulk_io.FORMATS, horizontal=True)
+        if st.button("Prepare Export"):
+            if export_choice in reports:
+                frame = reports[export_choice]()
+                write = lambda destination: bulk_io.export_frame(frame, destination, export_format)
+            else:
+                write = lambda destination: bulk_io.export_table(repo, export_choice, destination, export_format)
+            try:
+                data = bulk_io.to_bytes(write, export_format)
+            except ImportError as e:
+                st.error(str(e))
+            else:
+                st.download_button(
+                    "Download", data,
+                    file_name=f"{export_choice.lower().replace(' ', '_')}.{export_format}",
+                )
+
+# Diagnostics
+elif page == "Diagnostics":
+    import pandas as pd
+
+    st.title("Diagnostics")
+    st.markdown("---")
+
+    latency_tab, tables_tab, export_tab = st.tabs(["Latency", "Tables", "Prometheus"])
+
+    with latency_tab:
+        st.subheader("Rolling Latency")
+        st.caption(f"Percentiles over the last {metrics.ROLLING_SAMPLES:,} samples of each series.")
+        latency = pd.DataFrame(metrics.latency_rows())
+        if not latency.empty:
+            st.dataframe(latency.sort_values('p95 ms', ascending=False, ignore_index=True).round(2))
+        else:
+            st.info("No timings recorded yet.")
+        if st.button("Reset Timings"):
+            metrics.REGISTRY.reset()
+
+    with tables_tab:
+        st.subheader("In-Memory Tables")
+        sizes = repo.table_sizes()
+        st.dataframe(pd.DataFrame({
+            'Table': list(sizes),
+            'Rows': [rows for rows, _ in sizes.values()],
+            'Memory (KiB)': [round(nbytes / 1024, 1) for _, nbytes in sizes.values()],
+        }))
+        peak_rss = metrics.peak_rss_bytes()
+        if peak_rss is not None:
+            st.metric("Process Peak Memory", f"{peak_rss / 2**20:,.1f} MiB")
+        st.subheader("Derived View Cache")
+        col1, col2, col3 = st.columns(3)
+        col1.metric("Cached Views", len(repo.views))
+        col2.metric("Hits", f"{repo.views.hits:,}")
+        col3.metric("Misses", f"{repo.views.misses:,}")
+
+    with export_tab:
+        st.subheader("Prometheus Export")
+        text = metrics.prometheus_text(repo)
+        st.download_button("Download metrics.prom", text, file_name="metrics.prom", mime="text/plain")
+        st.code(text, language="text")
+
+metrics.observe('page', page, time.perf_counter() - run_started)
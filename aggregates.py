@@ -0,0 +1,198 @@
+"""Running dashboard aggregates for MSME360.
+
+The repository updates these on every write path (add product, sale,
+purchase and stock update), so the Dashboard reads its metrics, sales trend
+and top sellers, and the CRM pages their top customers, without scanning the
+inventory or the sales history.
+"""
+
+import threading
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+import metrics
+
+# Rolling windows offered for top-K views: label -> days, None meaning all time.
+WINDOWS = {"Today": 1, "Last 7 days": 7, "Last 30 days": 30, "All time": None}
+
+# Days of daily buckets kept: enough for the longest rolling window.
+BUCKET_DAYS = max(days for days in WINDOWS.values() if days)
+
+
+def bucket_start(today=None):
+    """The first day that still has a bucket, as a "YYYY-MM-DD" string."""
+    today = np.datetime64(date.today() if today is None else today, 'D')
+    return str(today - (BUCKET_DAYS - 1))
+
+
+def _combine(slots, values):
+    """Sums the value rows of repeated slots; returns (unique slots, summed values)."""
+    unique, positions = np.unique(slots, return_inverse=True)
+    return unique, np.column_stack([
+        np.bincount(positions, column, minlength=len(unique)) for column in values.T
+    ])
+
+
+class RollingCounters:
+    """Count and amount per key (a product or a customer) in daily buckets, plus all-time totals.
+
+    Only the last BUCKET_DAYS days keep a bucket, so the top keys over any
+    rolling window are a bincount over at most that many small buckets and a
+    partial sort, whatever the length of the history.
+    """
+
+    def __init__(self, key, count):
+        self.key = key
+        self.count = count
+        self._slots = {}
+        self._keys = []
+        # All-time totals per slot: column 0 is the count, column 1 the amount.
+        self._totals = np.zeros((0, 2))
+        # Day -> list of (slots, values) pieces, merged into one when read.
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def _slots_for(self, keys):
+        """Slot of each key, assigning slots to keys seen for the first time."""
+        codes, uniques = pd.factorize(np.asarray(keys, dtype=object))
+        slots = np.empty(len(uniques), dtype=np.int64)
+        for position, key in enumerate(uniques):
+            slot = self._slots.get(key)
+            if slot is None:
+                slot = self._slots[key] = len(self._keys)
+                self._keys.append(key)
+            slots[position] = slot
+        if len(self._keys) > len(self._totals):
+            grown = np.zeros((max(len(self._keys), 2 * len(self._totals)), 2))
+            grown[:len(self._totals)] = self._totals
+            self._totals = grown
+        return slots[codes]
+
+    @staticmethod
+    def _values(counts, amounts):
+        return np.column_stack((np.asarray(counts, dtype=float), np.asarray(amounts, dtype=float)))
+
+    def add_totals(self, keys, counts, amounts):
+        """Adds to the all-time totals only."""
+        with self._lock:
+            slots = self._slots_for(keys)
+            for column, values in enumerate(self._values(counts, amounts).T):
+                self._totals[:, column] += np.bincount(slots, values, minlength=len(self._totals))
+
+    def add_days(self, days, keys, counts, amounts):
+        """Adds to the daily buckets only; days before the oldest kept bucket are ignored."""
+        days = np.asarray(days, dtype='datetime64[D]')
+        first = np.datetime64(bucket_start(), 'D')
+        keep = days >= first
+        with self._lock:
+            slots = self._slots_for(keys)[keep]
+            values = self._values(counts, amounts)[keep]
+            days = days[keep]
+            for day in np.unique(days):
+                on_day = days == day
+                self._buckets.setdefault(day, []).append(_combine(slots[on_day], values[on_day]))
+            for day in [day for day in self._buckets if day < first]:
+                del self._buckets[day]
+
+    def add(self, days, keys, counts, amounts):
+        """Adds new sales to the totals and their days' buckets."""
+        self.add_totals(keys, counts, amounts)
+        self.add_days(days, keys, counts, amounts)
+
+    def _summed(self, window, today):
+        if window is None:
+            return self._totals[:len(self._keys)].copy()
+        last = np.datetime64(date.today() if today is None else today, 'D')
+        summed = np.zeros((len(self._keys), 2))
+        for day in np.arange(last - (window - 1), last + 1):
+            pieces = self._buckets.get(day)
+            if not pieces:
+                continue
+            if len(pieces) > 1:
+                pieces[:] = [_combine(
+                    np.concatenate([slots for slots, _ in pieces]),
+                    np.concatenate([values for _, values in pieces]),
+                )]
+            slots, values = pieces[0]
+            summed[slots] += values
+        return summed
+
+    @metrics.timed_operation('aggregates.top')
+    def top(self, k, window=None, by='count', today=None):
+        """The `k` keys with the highest count (or amount) over the last `window` days.
+
+        `window` None means all time. Returns a DataFrame of key, count and
+        Amount, highest first, without keys that sold nothing in the window.
+        """
+        with self._lock:
+            summed = self._summed(window, today)
+            keys = self._keys[:len(summed)]
+        ranked = summed[:, 0 if by == 'count' else 1]
+        candidates = np.flatnonzero(ranked > 0)
+        if len(candidates) > k:
+            candidates = candidates[np.argpartition(-ranked[candidates], k - 1)[:k]]
+        # Highest first; ties keep the order in which keys were first seen.
+        order = candidates[np.lexsort((candidates, -ranked[candidates]))]
+        return pd.DataFrame({
+            self.key: [keys[slot] for slot in order],
+            self.count: summed[order, 0].round().astype('int64'),
+            'Amount': summed[order, 1],
+        })
+
+
+class DashboardAggregates:
+    """Total sales, stock value, low-stock set and per-day sales, kept up to date on write."""
+
+    def __init__(self):
+        self.total_sales = 0.0
+        self.stock_value = 0.0
+        self.low_stock = set()
+        self.sales_by_day = {}
+        self.product_sales = RollingCounters('Product ID', 'Units')
+        self.customer_sales = RollingCounters('Customer Name', 'Orders')
+
+    @classmethod
+    @metrics.timed_operation('aggregates.from_tables')
+    def from_tables(cls, inventory, sales_orders, sales_history):
+        """Builds the aggregates with one vectorized pass over each table."""
+        aggregates = cls()
+        aggregates.total_sales = float(sales_orders['Total Amount'].sum())
+        stock = inventory['Current Stock Quantity']
+        aggregates.stock_value = float((inventory['Unit Price'] * stock).sum())
+        aggregates.low_stock = set(inventory.loc[stock <= inventory['Reorder Level'], 'Product ID'])
+        daily = sales_history.groupby('Date', sort=False)['Total Sale'].sum()
+        aggregates.sales_by_day = {date: float(total) for date, total in daily.items()}
+        return aggregates
+
+    def on_product_added(self, product_id, unit_price, stock, reorder_level):
+        self.stock_value += unit_price * stock
+        if stock <= reorder_level:
+            self.low_stock.add(product_id)
+
+    def on_stock_changed(self, product_id, unit_price, old_stock, new_stock, reorder_level):
+        self.stock_value += unit_price * (new_stock - old_stock)
+        if new_stock <= reorder_level:
+            self.low_stock.add(product_id)
+        else:
+            self.low_stock.discard(product_id)
+
+    def on_sale(self, date, order_total, line_totals):
+        day = pd.Timestamp(date)
+        self.total_sales += order_total
+        self.sales_by_day[day] = self.sales_by_day.get(day, 0.0) + sum(line_totals)
+
+    @property
+    def low_stock_count(self):
+        return len(self.low_stock)
+
+    @metrics.timed_operation('aggregates.sales_trend')
+    def sales_trend(self):
+        """Returns total sales per day as a date-indexed DataFrame for charting."""
+        trend = pd.DataFrame(
+            {'Total Sale': list(self.sales_by_day.values())},
+            index=pd.DatetimeIndex(list(self.sales_by_day)),
+        )
+        trend.index.name = 'Date'
+        return trend.sort_index()
@@ -0,0 +1,259 @@
+"""Local HTTP/JSON API over the MSME360 core, for POS terminals and warehouse scanners.
+
+Run it next to the Streamlit app on the same database:
+
+    python api.py --port 8360
+
+Both processes share the SQLite store, so a sale posted here shows up on the
+dashboard on its next run, and stock can never be oversold from either side.
+
+    GET  /health                           GET  /metrics (Prometheus text)
+    GET  /products?offset=0&limit=100      GET  /products/<product_id>
+    POST /products                         POST /products/<product_id>/stock
+    GET  /customers    POST /customers     GET  /suppliers    POST /suppliers
+    GET  /sales        POST /sales         GET  /purchases    POST /purchases
+    GET  /locations    POST /locations     POST /transfers
+    POST /sales/batch
+
+POST bodies are JSON objects with the core function's arguments, for example
+{"customer_name": "Acme", "lines": [{"product_id": "PROD-1a2b3c4d", "quantity": 2}]}
+for /sales or {"operation": "dispatch", "quantity": 5} for a stock update.
+Stock updates, sales, purchases and new products take an optional
+"location_id" (the default location if left out), and /transfers takes
+"from_location", "to_location" and "lines". /sales/batch takes channel order
+"lines" as objects with the import file's columns ("Order Ref",
+"Customer Name", "Product ID" or "Product Name", "Quantity"), plus optional
+"policy", "priority_customers" and "partial", and answers with one report
+row per order. An "Order Ref" imported before is rejected, so a batch can be
+retried safely.
+Errors come back as {"error": "..."} with status 400, 404 or 409, or 500 for
+an unexpected failure.
+"""
+
+import argparse
+import json
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pandas as pd
+
+import core
+import metrics
+from schema import DATE_FORMAT
+from storage import DB_PATH
+
+DEFAULT_PORT = 8360
+
+DEFAULT_LIMIT = 100
+
+MAX_LIMIT = 1000
+
+# Listing path -> repository read method.
+LISTINGS = {
+    'products': 'inventory',
+    'customers': 'customers',
+    'suppliers': 'suppliers',
+    'sales': 'sales_orders',
+    'purchases': 'purchase_orders',
+    'locations': 'locations',
+}
+
+
+class NotFound(Exception):
+    pass
+
+
+def records(frame):
+    """Converts a table page to JSON-ready dicts, with dates as "YYYY-MM-DD"."""
+    frame = frame.copy()
+    for column in frame.columns:
+        if frame[column].dtype.kind == 'M':
+            frame[column] = frame[column].dt.strftime(DATE_FORMAT)
+    return json.loads(frame.to_json(orient='records'))
+
+
+def _paging(query):
+    try:
+        offset = int(query.get('offset', ['0'])[0])
+        limit = int(query.get('limit', [str(DEFAULT_LIMIT)])[0])
+    except ValueError:
+        raise core.ValidationError("'offset' and 'limit' must be whole numbers") from None
+    if offset < 0 or limit < 1:
+        raise core.ValidationError("'offset' must be at least 0 and 'limit' at least 1")
+    return offset, min(limit, MAX_LIMIT)
+
+
+def _plain(value):
+    """Turns NumPy scalars from a repository row into JSON-ready values."""
+    if hasattr(value, 'item'):
+        return value.item()
+    return value
+
+
+def handle_get(repo, parts, query):
+    """Dispatches a GET; returns (status, body)."""
+    if parts == ['health']:
+        return HTTPStatus.OK, {'status': 'ok'}
+    if parts == ['metrics']:
+        return HTTPStatus.OK, metrics.prometheus_text(repo)
+    if len(parts) == 1 and parts[0] in LISTINGS:
+        frame = getattr(repo, LISTINGS[parts[0]])()
+        offset, limit = _paging(query)
+        return HTTPStatus.OK, {
+            'total': len(frame),
+            'offset': offset,
+            'items': records(frame.iloc[offset:offset + limit]),
+        }
+    if len(parts) == 2 and parts[0] == 'products':
+        product = repo.product(parts[1])
+        if product is None:
+            raise NotFound(f"Unknown product '{parts[1]}'")
+        body = {name: _plain(value) for name, value in product.items()}
+        body['stock_by_location'] = {
+            location_id: repo.get_stock(parts[1], location_id) for location_id in repo.location_names()
+        }
+        return HTTPStatus.OK, body
+    raise NotFound("Not found")
+
+
+def handle_post(repo, parts, body):
+    """Dispatches a POST; returns (status, body)."""
+    if parts == ['products']:
+        product_id = core.add_product(
+            repo, body.get('product_name'), body.get('unit_price'), body.get('description', ""),
+            body.get('current_stock_quantity', 0), body.get('reorder_level', 0), body.get('location_id'),
+        )
+        return HTTPStatus.CREATED, {'product_id': product_id}
+    if len(parts) == 3 and parts[0] == 'products' and parts[2] == 'stock':
+        if repo.product(parts[1]) is None:
+            raise NotFound(f"Unknown product '{parts[1]}'")
+        operation = body.get('operation')
+        if operation == 'receive':
+            stock = core.receive_stock(repo, parts[1], body.get('quantity'), body.get('location_id'))
+        elif operation == 'dispatch':
+            stock = core.dispatch_stock(repo, parts[1], body.get('quantity'), body.get('location_id'))
+        else:
+            raise core.ValidationError("'operation' must be 'receive' or 'dispatch'")
+        return HTTPStatus.OK, {'product_id': parts[1], 'stock': stock}
+    if parts in (['customers'], ['suppliers']):
+        add = core.add_customer if parts[0] == 'customers' else core.add_supplier
+        party_id = add(
+            repo, body.get('name'), body.get('contact_person', ""), body.get('email', ""),
+            body.get('phone', ""), body.get('address', ""),
+        )
+        return HTTPStatus.CREATED, {'id': party_id}
+    if parts == ['locations']:
+        location_id = core.add_location(
+            repo, body.get('name'), body.get('kind', core.LOCATION_KINDS[0]), body.get('address', ""),
+        )
+        return HTTPStatus.CREATED, {'location_id': location_id}
+    if parts == ['transfers']:
+        transfer_id = core.transfer_stock(
+            repo, body.get('from_location'), body.get('to_location'), body.get('lines'),
+        )
+        return HTTPStatus.CREATED, {'transfer_id': transfer_id}
+    if parts == ['sales']:
+        order_id = core.record_sale(repo, body.get('customer_name'), body.get('lines'), body.get('location_id'))
+        return HTTPStatus.CREATED, {'order_id': order_id}
+    if parts == ['sales', 'batch']:
+        lines = body.get('lines')
+        if not isinstance(lines, list):
+            raise core.ValidationError("'lines' must be a list of order lines")
+        partial = body.get('partial', True)
+        if not isinstance(partial, bool):
+            raise core.ValidationError("'partial' must be true or false")
+        report = core.ingest_orders(
+            repo, pd.DataFrame(lines), body.get('policy', 'fifo'), body.get('priority_customers', ()),
+            partial, body.get('location_id'),
+        )
+        return HTTPStatus.OK, {'orders': records(report)}
+    if parts == ['purchases']:
+        order_id = core.record_purchase(
+            repo, body.get('supplier_name'), body.get('lines'), body.get('location_id'),
+        )
+        return HTTPStatus.CREATED, {'order_id': order_id}
+    raise NotFound("Not found")
+
+
+class Handler(BaseHTTPRequestHandler):
+    """Routes requests to the core; the repository is `self.server.repo`."""
+
+    def _respond(self, status, body):
+        """Sends `body` as JSON, or as Prometheus text when it is already a string."""
+        if isinstance(body, str):
+            payload, content_type = body.encode('utf-8'), 'text/plain; version=0.0.4'
+        else:
+            payload, content_type = json.dumps(body).encode('utf-8'), 'application/json'
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _dispatch(self, handle, arguments):
+        url = urlparse(self.path)
+        parts = [part for part in url.path.split('/') if part]
+        repo = self.server.repo
+        try:
+            repo.refresh()
+            with metrics.timed('operation', f"api.{self.command} /{'/'.join(parts[:1])}"):
+                status, body = handle(repo, parts, *arguments(url))
+        except NotFound as e:
+            status, body = HTTPStatus.NOT_FOUND, {'error': str(e)}
+        except core.InsufficientStockError as e:
+            status, body = HTTPStatus.CONFLICT, {
+                'error': str(e), 'product_name': e.product_name,
+                'requested': e.requested, 'available': e.available,
+            }
+        except ValueError as e:
+            status, body = HTTPStatus.BAD_REQUEST, {'error': str(e)}
+        except Exception as e:
+            # Answer the client instead of dropping the connection; the error is logged.
+            self.log_error("Unhandled error on %s %s: %r", self.command, self.path, e)
+            status, body = HTTPStatus.INTERNAL_SERVER_ERROR, {'error': f"Internal error: {e}"}
+        self._respond(status, body)
+
+    def do_GET(self):
+        self._dispatch(handle_get, lambda url: (parse_qs(url.query),))
+
+    def do_POST(self):
+        self._dispatch(handle_post, lambda url: (self._json_body(),))
+
+    def _json_body(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        try:
+            body = json.loads(self.rfile.read(length) or b'{}')
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Request body is not valid JSON: {e}") from None
+        if not isinstance(body, dict):
+            raise ValueError("Request body must be a JSON object")
+        return body
+
+
+def make_server(repo, host='127.0.0.1', port=DEFAULT_PORT):
+    """Returns a threaded server; each request runs on its own thread."""
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    server.repo = repo
+    return server
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="MSME360 local HTTP/JSON API")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--db', default=DB_PATH, help="SQLite database shared with the Streamlit app")
+    args = parser.parse_args(argv)
+    server = make_server(core.open_repository(args.db), args.host, args.port)
+    print(f"MSME360 API listening on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
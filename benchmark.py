@@ -0,0 +1,198 @@
+"""Headless benchmarks of the MSME360 write paths and pages at several data scales.
+
+    python benchmark.py --scales small,medium --json baseline.json
+    python benchmark.py --scales small,medium --compare baseline.json
+
+Each scale runs in its own process on a fresh database filled by
+`synthetic.generate`. The write paths are timed through `core`. The pages are
+run through Streamlit's AppTest, which executes the script exactly as a
+browser rerun does. The Expansion Toolkit is a tab of the Reporting page, and
+Streamlit renders every tab, so the Reporting run covers it. Latency is the
+median and 95th percentile over `--repeat` runs. Peak memory is the
+tracemalloc peak of one extra run, so it counts what an operation allocates
+and not the data already loaded. `--compare` exits with status 1 when a
+median is slower than the baseline by more than `--tolerance`.
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+APP = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Untitled32.py')
+
+PAGES = ["Dashboard", "Inventory Management", "Reporting"]
+
+# Medians faster than this are not reported as regressions; they are noise.
+NOISE_FLOOR_MS = 1.0
+
+
+def measure(operation, repeat):
+    """Times `operation()` `repeat` times, then traces one more run for its peak memory."""
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        operation()
+        timings.append(time.perf_counter() - started)
+    tracemalloc.start()
+    try:
+        operation()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    timings.sort()
+    return {
+        'p50_ms': 1000 * timings[len(timings) // 2],
+        'p95_ms': 1000 * timings[min(len(timings) - 1, int(len(timings) * 0.95))],
+        'peak_kib': peak / 1024,
+    }
+
+
+def _write_paths(repo, repeat):
+    """Times each write path on products added for the benchmark, so stock never runs out."""
+    import core
+
+    # Each measured call runs repeat + 1 times (the last one traced).
+    runs = repeat + 1
+    counter = iter(range(10 * runs))
+    results = {'add product': measure(
+        lambda: core.add_product(repo, f"Benchmark product {next(counter)}", 99.0, "", 10 * runs, 5), repeat,
+    )}
+    products = [repo.product_id_for_name(f"Benchmark product {number}") for number in range(2)]
+    lines = [{'product_id': product_id, 'quantity': 1} for product_id in products]
+    customer = repo.customers()['Name'].iloc[0]
+    supplier = repo.suppliers()['Name'].iloc[0]
+    results['record sale'] = measure(lambda: core.record_sale(repo, customer, lines), repeat)
+    results['record purchase'] = measure(lambda: core.record_purchase(repo, supplier, lines), repeat)
+    flip = iter(range(2 * runs))
+    results['update stock'] = measure(
+        lambda: (core.receive_stock if next(flip) % 2 else core.dispatch_stock)(repo, products[0], 1), repeat,
+    )
+    return results
+
+
+def _pages(repeat):
+    """Times a cold first run of the app, then a rerun of each page."""
+    from streamlit.testing.v1 import AppTest
+
+    app = AppTest.from_file(APP, default_timeout=600)
+    started = time.perf_counter()
+    app.run()
+    results = {'cold start': {'p50_ms': 1000 * (time.perf_counter() - started), 'p95_ms': None, 'peak_kib': None}}
+    for page in PAGES:
+        app.sidebar.radio[0].set_value(page)
+        results[f"page: {page}"] = measure(app.run, repeat)
+        if app.exception:
+            raise RuntimeError(f"{page} raised: {app.exception[0].value}")
+    return results
+
+
+def run_scale(scale, repeat, directory):
+    """Generates a database for one scale and benchmarks it; runs inside the worker process."""
+    import synthetic
+    from storage import Repository
+
+    path = os.path.join(directory, f"{scale}.db")
+    repo = Repository(path)
+    started = time.perf_counter()
+    rows = synthetic.generate(repo, **synthetic.SCALES[scale])
+    generate_s = time.perf_counter() - started
+    results = {'open repository': measure(lambda: Repository(path).close(), 1)}
+    results.update(_write_paths(repo, repeat))
+    repo.close()
+    del repo
+    results.update(_pages(repeat))
+    return {'rows': rows, 'generate_s': generate_s, 'results': results}
+
+
+def _worker(scale, repeat):
+    # MSME360_DB must be set before storage is imported, so the app opens the
+    # benchmark database; one process per scale also keeps peaks independent.
+    directory = tempfile.mkdtemp(prefix=f"msme360_bench_{scale}_")
+    os.environ['MSME360_DB'] = os.path.join(directory, f"{scale}.db")
+    json.dump(run_scale(scale, repeat, directory), sys.stdout)
+
+
+def run(scales, repeat):
+    """Benchmarks each scale in a fresh process; returns {scale: results}."""
+    report = {}
+    for scale in scales:
+        finished = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), '--worker', scale, '--repeat', str(repeat)],
+            capture_output=True, text=True,
+        )
+        if finished.returncode:
+            raise RuntimeError(f"Benchmark of scale '{scale}' failed:\n{finished.stderr}")
+        report[scale] = json.loads(finished.stdout.strip().splitlines()[-1])
+    return report
+
+
+def _cell(value, digits):
+    return "-" if value is None else f"{value:,.{digits}f}"
+
+
+def print_report(report):
+    print(f"{'scale':<8} {'benchmark':<28} {'p50 ms':>10} {'p95 ms':>10} {'peak KiB':>12}")
+    for scale, measured in report.items():
+        rows = ", ".join(f"{table} {count:,}" for table, count in measured['rows'].items())
+        print(f"{scale:<8} {'(data: ' + rows + ')'}")
+        for name, result in measured['results'].items():
+            print(
+                f"{scale:<8} {name:<28} {_cell(result['p50_ms'], 2):>10} "
+                f"{_cell(result['p95_ms'], 2):>10} {_cell(result['peak_kib'], 0):>12}"
+            )
+
+
+def regressions(report, baseline, tolerance):
+    """Lists benchmarks whose median got slower than the baseline by more than `tolerance`."""
+    found = []
+    for scale, measured in report.items():
+        for name, result in measured['results'].items():
+            before = baseline.get(scale, {}).get('results', {}).get(name)
+            if before is None:
+                continue
+            now, then = result['p50_ms'], before['p50_ms']
+            if now > then * (1 + tolerance) and now - then > NOISE_FLOOR_MS:
+                found.append(f"{scale} / {name}: {then:,.2f} ms -> {now:,.2f} ms")
+    return found
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="MSME360 latency and memory benchmarks")
+    parser.add_argument('--scales', default='small', help="comma-separated names from synthetic.SCALES")
+    parser.add_argument('--repeat', type=int, default=10)
+    parser.add_argument('--json', help="write the results to this file")
+    parser.add_argument('--compare', help="baseline results file to check for regressions")
+    parser.add_argument('--tolerance', type=float, default=0.25, help="allowed slowdown, 0.25 = 25%%")
+    parser.add_argument('--worker', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    if args.worker:
+        _worker(args.worker, args.repeat)
+        return 0
+
+    import synthetic
+
+    scales = [scale.strip() for scale in args.scales.split(',') if scale.strip()]
+    unknown = [scale for scale in scales if scale not in synthetic.SCALES]
+    if unknown:
+        parser.error(f"unknown scales: {', '.join(unknown)}; choose from {', '.join(synthetic.SCALES)}")
+    report = run(scales, args.repeat)
+    print_report(report)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as handle:
+            json.dump(report, handle, indent=2)
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as handle:
+            found = regressions(report, json.load(handle), args.tolerance)
+        for line in found:
+            print(f"REGRESSION {line}")
+        return 1 if found else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,266 @@
+"""Streaming bulk import and export of MSME360 tables as CSV or Parquet.
+
+Imports read the source a chunk at a time, check every row against the
+declared schema, give rows without an ID one from `generate_unique_id` with
+the table's usual prefix, and commit each chunk in a single transaction.
+Exports stream a table out of SQLite (or a report frame) chunk by chunk, so
+neither direction holds a whole file in memory.
+"""
+
+import io
+
+import pandas as pd
+
+import metrics
+from schema import TABLE_SCHEMAS, SchemaError, coerce_row
+from storage import ID_PREFIXES, LOCATION_KINDS, TABLES, generate_unique_id
+
+CHUNK_ROWS = 10_000
+
+FORMATS = ('csv', 'parquet')
+
+TABLE_LABELS = {
+    'inventory': "Inventory",
+    'customers': "Customers",
+    'suppliers': "Suppliers",
+    'sales_orders': "Sales Orders",
+    'purchase_orders': "Purchase Orders",
+    'order_lines': "Order Lines",
+    'sales_history': "Sales History",
+    'locations': "Locations",
+}
+
+# Columns that may be left out of an import file, and the value they get.
+OPTIONAL_COLUMNS = {
+    'Description': '',
+    'Current Stock Quantity': 0,
+    'Reorder Level': 0,
+    'Contact Person': '',
+    'Email': '',
+    'Phone': '',
+    'Address': '',
+    'Kind': 'Godown',
+}
+
+# Rejected rows kept in an ImportReport; later rejections are only counted.
+MAX_REPORTED_ERRORS = 1000
+
+
+def _parquet():
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise ImportError("Parquet import and export need the 'pyarrow' package.") from e
+    return pa, pq
+
+
+def format_for(filename):
+    """Guesses the file format from a file name."""
+    return 'parquet' if str(filename).lower().endswith(('.parquet', '.pq')) else 'csv'
+
+
+def read_chunks(source, fmt='csv', chunk_rows=CHUNK_ROWS):
+    """Yields DataFrames of at most `chunk_rows` rows from a CSV or Parquet source."""
+    if fmt == 'csv':
+        yield from pd.read_csv(source, chunksize=chunk_rows, dtype=str, keep_default_na=False)
+    elif fmt == 'parquet':
+        _, pq = _parquet()
+        for batch in pq.ParquetFile(source).iter_batches(batch_size=chunk_rows):
+            yield batch.to_pandas()
+    else:
+        raise ValueError(f"Unsupported format '{fmt}'. Use one of: {', '.join(FORMATS)}.")
+
+
+class ImportReport:
+    """Counts of imported and rejected rows; rejections keep their 1-based source row number."""
+
+    def __init__(self, table):
+        self.table = table
+        self.imported = 0
+        self.rejected_count = 0
+        self.rejected = []
+
+    def reject(self, row_number, message):
+        self.rejected_count += 1
+        if len(self.rejected) < MAX_REPORTED_ERRORS:
+            self.rejected.append((row_number, message))
+
+    def rejected_frame(self):
+        return pd.DataFrame(self.rejected, columns=['Row', 'Error'])
+
+
+def _validate(table, row):
+    """Business rules on top of the schema types, matching the add forms."""
+    if table == 'inventory':
+        if not row['Product Name']:
+            raise SchemaError("'Product Name' is required")
+        if row['Unit Price'] <= 0:
+            raise SchemaError("'Unit Price' must be positive")
+        if row['Current Stock Quantity'] < 0 or row['Reorder Level'] < 0:
+            raise SchemaError("stock quantities cannot be negative")
+    elif table in ('customers', 'suppliers', 'locations'):
+        if not row['Name']:
+            raise SchemaError("'Name' is required")
+        if table == 'locations' and row['Kind'] not in LOCATION_KINDS:
+            raise SchemaError(f"'Kind' must be one of: {', '.join(LOCATION_KINDS)}")
+    elif table in ('sales_history', 'order_lines'):
+        if not row['Product ID'] or row['Quantity'] <= 0:
+            raise SchemaError("rows need a 'Product ID' and a positive 'Quantity'")
+        if table == 'order_lines' and row['Order Type'] not in ('sale', 'purchase'):
+            raise SchemaError("'Order Type' must be 'sale' or 'purchase'")
+
+
+def _prepare(table, record, id_column, prefix):
+    """Returns the coerced row and whether its ID was generated rather than given in the file."""
+    raw = {}
+    generated = False
+    for column in TABLE_SCHEMAS[table]:
+        value = record.get(column, OPTIONAL_COLUMNS.get(column))
+        if column == id_column and (value is None or value == ''):
+            value = generate_unique_id(prefix)
+            generated = True
+        raw[column] = value
+    row = coerce_row(table, raw)
+    _validate(table, row)
+    return row, generated
+
+
+def _regenerate_ids(repo, table, rows, id_column, prefix, taken):
+    """Gives `rows` new generated IDs until none is stored or in `taken`; adds them to `taken`."""
+    while rows:
+        for row in rows:
+            row[id_column] = generate_unique_id(prefix)
+        stored = repo.existing_ids(table, [row[id_column] for row in rows])
+        clashing = []
+        for row in rows:
+            if row[id_column] in stored or row[id_column] in taken:
+                clashing.append(row)
+            else:
+                taken.add(row[id_column])
+        rows = clashing
+
+
+@metrics.timed_operation('bulk_io.import_table')
+def import_table(repo, table, source, fmt='csv', chunk_rows=CHUNK_ROWS):
+    """Streams `source` into `table` through the repository; returns an ImportReport.
+
+    Rows that fail validation, or whose ID given in the file already exists,
+    are rejected and reported; a generated ID that is already taken is
+    replaced. The rest of each chunk is committed as one batch. Raises
+    ValueError if the file lacks a required column.
+    """
+    id_column, prefix = ID_PREFIXES.get(table, (None, None))
+    required = [
+        column for column in TABLE_SCHEMAS[table]
+        if column not in OPTIONAL_COLUMNS and column != id_column
+    ]
+    report = ImportReport(table)
+    row_number = 0
+    for chunk in read_chunks(source, fmt, chunk_rows):
+        missing = [column for column in required if column not in chunk.columns]
+        if missing:
+            raise ValueError(f"The file is missing required columns: {', '.join(missing)}")
+        rows = []
+        numbers = []
+        generated = []
+        for record in chunk.to_dict('records'):
+            row_number += 1
+            try:
+                row, generated_id = _prepare(table, record, id_column, prefix)
+            except (ValueError, TypeError) as e:
+                report.reject(row_number, str(e))
+            else:
+                rows.append(row)
+                numbers.append(row_number)
+                generated.append(generated_id)
+        if id_column is not None:
+            # IDs from the file are checked first, so a generated ID never
+            # makes a supplied one look taken; generated IDs that clash are
+            # replaced instead of rejecting the row.
+            taken = repo.existing_ids(table, [row[id_column] for row in rows])
+            rejected = set()
+            for index, (number, row) in enumerate(zip(numbers, rows)):
+                if generated[index]:
+                    continue
+                if row[id_column] in taken:
+                    report.reject(number, f"{id_column} '{row[id_column]}' already exists")
+                    rejected.add(index)
+                else:
+                    taken.add(row[id_column])
+            clashing = []
+            for index, row in enumerate(rows):
+                if not generated[index]:
+                    continue
+                if row[id_column] in taken:
+                    clashing.append(row)
+                else:
+                    taken.add(row[id_column])
+            _regenerate_ids(repo, table, clashing, id_column, prefix, taken)
+            rows = [row for index, row in enumerate(rows) if index not in rejected]
+        repo.bulk_insert(table, rows)
+        report.imported += len(rows)
+    return report
+
+
+def write_chunks(chunks, destination, fmt='csv', columns=None):
+    """Writes an iterable of DataFrames to a path or file object as one CSV or Parquet file.
+
+    `columns` names the columns to write when `chunks` turns out to be empty.
+    """
+    if fmt == 'csv':
+        handle = open(destination, 'w', newline='', encoding='utf-8') if isinstance(destination, str) else destination
+        try:
+            header = True
+            for chunk in chunks:
+                chunk.to_csv(handle, header=header, index=False)
+                header = False
+            if header and columns is not None:
+                pd.DataFrame(columns=columns).to_csv(handle, index=False)
+        finally:
+            if handle is not destination:
+                handle.close()
+    elif fmt == 'parquet':
+        pa, pq = _parquet()
+        writer = None
+        try:
+            for chunk in chunks:
+                arrow_chunk = pa.Table.from_pandas(chunk, preserve_index=False)
+                if writer is None:
+                    writer = pq.ParquetWriter(destination, arrow_chunk.schema)
+                writer.write_table(arrow_chunk.cast(writer.schema))
+            if writer is None and columns is not None:
+                pq.write_table(pa.Table.from_pandas(pd.DataFrame(columns=columns)), destination)
+        finally:
+            if writer is not None:
+                writer.close()
+    else:
+        raise ValueError(f"Unsupported format '{fmt}'. Use one of: {', '.join(FORMATS)}.")
+
+
+@metrics.timed_operation('bulk_io.export_table')
+def export_table(repo, table, destination, fmt='csv', chunk_rows=CHUNK_ROWS):
+    """Streams a stored table to `destination` in the form `import_table` reads back."""
+    write_chunks(repo.iter_rows(table, chunk_rows), destination, fmt, columns=list(TABLES[table]))
+
+
+def _frame_chunks(frame, chunk_rows):
+    for start in range(0, len(frame), chunk_rows):
+        yield frame.iloc[start:start + chunk_rows]
+
+
+@metrics.timed_operation('bulk_io.export_frame')
+def export_frame(frame, destination, fmt='csv', chunk_rows=CHUNK_ROWS):
+    """Streams a report DataFrame to `destination` chunk by chunk."""
+    write_chunks(_frame_chunks(frame, chunk_rows), destination, fmt, columns=list(frame.columns))
+
+
+def to_bytes(write, fmt):
+    """Runs `write(destination)` against an in-memory buffer and returns the file bytes."""
+    if fmt == 'csv':
+        buffer = io.StringIO()
+        write(buffer)
+        return buffer.getvalue().encode('utf-8')
+    buffer = io.BytesIO()
+    write(buffer)
+    return buffer.getvalue()
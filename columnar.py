@@ -0,0 +1,186 @@
+"""Append-optimized columnar tables for the in-memory copies of MSME360 data.
+
+Each column is a preallocated NumPy array that grows geometrically, so
+appending a row is amortized O(1) and a multi-line order is written as one
+batch. Pages read through `ColumnarTable.view()`, a DataFrame over the filled
+part of the arrays that is cached until the next write.
+
+Columns declared with the dtype "category" are dictionary-encoded: the array
+holds int32 codes and each distinct value is stored once, which is what
+keeps repeated product, customer and supplier names compact.
+"""
+
+import sys
+
+import numpy as np
+import pandas as pd
+
+GROWTH_FACTOR = 2
+MIN_CAPACITY = 64
+
+CATEGORY = 'category'
+CODE_DTYPE = np.dtype(np.int32)
+
+
+class _Categories:
+    """The distinct values of a dictionary-encoded column and their codes."""
+
+    def __init__(self):
+        self.values = []
+        self.codes = {}
+        self.nbytes = 0
+        self._dtype = None
+
+    def encode(self, values):
+        """Returns int32 codes for `values`, adding unseen values; missing values get -1."""
+        inverse, uniques = pd.factorize(np.asarray(values, dtype=object))
+        mapped = np.empty(len(uniques) + 1, dtype=CODE_DTYPE)
+        for i, value in enumerate(uniques):
+            code = self.codes.get(value)
+            if code is None:
+                code = self.codes[value] = len(self.values)
+                self.values.append(value)
+                self.nbytes += sys.getsizeof(value)
+                self._dtype = None
+            mapped[i] = code
+        mapped[-1] = -1
+        return mapped[inverse]
+
+    def decode(self, codes):
+        return np.asarray(self.values + [None], dtype=object)[codes]
+
+    @property
+    def dtype(self):
+        if self._dtype is None:
+            self._dtype = pd.CategoricalDtype(self.values)
+        return self._dtype
+
+
+class ColumnarTable:
+    """A table stored as one typed, geometrically grown array per column."""
+
+    def __init__(self, dtypes, capacity=MIN_CAPACITY):
+        self.columns = list(dtypes)
+        self.categories = {
+            name: _Categories() for name, dtype in dtypes.items() if str(dtype) == CATEGORY
+        }
+        self.dtypes = {
+            name: CODE_DTYPE if name in self.categories else np.dtype(dtype)
+            for name, dtype in dtypes.items()
+        }
+        capacity = max(int(capacity), MIN_CAPACITY)
+        self._data = {name: np.empty(capacity, dtype=self.dtypes[name]) for name in self.columns}
+        self._size = 0
+        self._view = None
+
+    def __len__(self):
+        return self._size
+
+    @property
+    def capacity(self):
+        return len(self._data[self.columns[0]])
+
+    @property
+    def nbytes(self):
+        """Approximate memory held: the column arrays plus each distinct category value.
+
+        Strings in free-text (object) columns are counted as pointers only.
+        """
+        return sum(values.nbytes for values in self._data.values()) + sum(
+            categories.nbytes for categories in self.categories.values()
+        )
+
+    def _reserve(self, extra):
+        needed = self._size + extra
+        capacity = self.capacity
+        if needed <= capacity:
+            return
+        while capacity < needed:
+            capacity *= GROWTH_FACTOR
+        for name in self.columns:
+            grown = np.empty(capacity, dtype=self.dtypes[name])
+            grown[:self._size] = self._data[name][:self._size]
+            self._data[name] = grown
+
+    def append(self, row):
+        """Appends one row given as a dict keyed by column name; returns its position."""
+        position = self._size
+        self.extend({name: [row[name]] for name in self.columns})
+        return position
+
+    def append_rows(self, rows):
+        """Appends a batch of dict rows with a single reservation."""
+        if rows:
+            self.extend({name: [row[name] for row in rows] for name in self.columns})
+
+    def extend(self, columns):
+        """Appends column-wise data: a dict (or DataFrame) of equal-length sequences."""
+        length = len(columns[self.columns[0]])
+        if length == 0:
+            return
+        self._reserve(length)
+        start, stop = self._size, self._size + length
+        for name in self.columns:
+            values = columns[name]
+            if isinstance(values, pd.Series):
+                values = values.to_numpy()
+            if name in self.categories:
+                values = self.categories[name].encode(values)
+            elif self.dtypes[name] == object:
+                # fromiter keeps list-valued cells as single objects.
+                values = np.fromiter(values, dtype=object, count=length)
+            self._data[name][start:stop] = np.asarray(values, dtype=self.dtypes[name])
+        self._size = stop
+        self._view = None
+
+    def get(self, position, column):
+        value = self._data[column][position]
+        if column in self.categories:
+            return self.categories[column].values[value]
+        return value
+
+    def set(self, position, column, value):
+        if column in self.categories:
+            value = self.categories[column].encode([value])[0]
+        self._data[column][position] = value
+        self._view = None
+
+    def add_at(self, positions, column, deltas):
+        """Adds `deltas` to `column` at `positions`; repeated positions accumulate."""
+        np.add.at(self._data[column], np.asarray(positions, dtype=np.intp), deltas)
+        self._view = None
+
+    def column(self, name):
+        """Returns a read-only array over the filled part of a column.
+
+        Dictionary-encoded columns are decoded into a new object array.
+        """
+        values = self._data[name][:self._size]
+        if name in self.categories:
+            return self.categories[name].decode(values)
+        values.flags.writeable = False
+        return values
+
+    def _series(self, name):
+        values = self._data[name][:self._size]
+        values.flags.writeable = False
+        if name in self.categories:
+            categories = self.categories[name]
+            return pd.Series(
+                pd.Categorical.from_codes(values, dtype=categories.dtype, validate=False),
+                copy=False,
+            )
+        return pd.Series(values, dtype=self.dtypes[name], copy=False)
+
+    def view(self):
+        """Returns a DataFrame over the table without copying the column arrays.
+
+        The frame is cached until the next write. Callers must treat it as
+        read-only.
+        """
+        if self._view is None:
+            self._view = pd.DataFrame(
+                {name: self._series(name) for name in self.columns},
+                copy=False,
+            )
+        return self._view
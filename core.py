@@ -0,0 +1,300 @@
+"""Headless MSME360 operations: inventory, locations, sales, purchases and CRM.
+
+Every function takes a Repository and plain Python values, so the Streamlit
+pages, the HTTP API in `api.py` and scripts all apply the same business
+rules without a Streamlit rerun. Invalid input raises ValidationError; a sale
+that cannot be filled raises storage.InsufficientStockError.
+"""
+
+from storage import (  # noqa: F401
+    DEFAULT_LOCATION, LOCATION_KINDS, DuplicateOrderError, InsufficientStockError, Repository,
+)
+
+
+class ValidationError(ValueError):
+    """Raised when a request breaks a business rule; nothing is written."""
+
+
+# Times a batch of orders is allocated and committed when other sessions sell
+# the same stock in between.
+INGEST_ATTEMPTS = 3
+
+
+def open_repository(path=None):
+    """Opens the shared repository, at `path` or the configured database."""
+    return Repository() if path is None else Repository(path)
+
+
+def _whole_number(value, label, minimum):
+    try:
+        number = int(value)
+    except (TypeError, ValueError, OverflowError):
+        raise ValidationError(f"'{label}' must be a whole number") from None
+    if number != value and not (isinstance(value, str) and value.strip() == str(number)):
+        raise ValidationError(f"'{label}' must be a whole number")
+    if number < minimum:
+        raise ValidationError(f"'{label}' must be at least {minimum}")
+    return number
+
+
+def _price(value, label):
+    try:
+        price = float(value)
+    except (TypeError, ValueError):
+        raise ValidationError(f"'{label}' must be a number") from None
+    if not price > 0:
+        raise ValidationError(f"'{label}' must be positive")
+    return price
+
+
+def _required(value, label):
+    value = "" if value is None else str(value).strip()
+    if not value:
+        raise ValidationError(f"'{label}' is required")
+    return value
+
+
+def _known_name(frame, name, label):
+    """Checks `name` against a categorical Name column without scanning the rows."""
+    name = _required(name, label)
+    if name not in frame['Name'].cat.categories:
+        raise ValidationError(f"Unknown {label.lower()} '{name}'")
+    return name
+
+
+def _known_location(repo, location_id):
+    """The location to use: `location_id` if it exists, the default location if it is None."""
+    if location_id is None:
+        return DEFAULT_LOCATION
+    if location_id not in repo.location_names():
+        raise ValidationError(f"Unknown location '{location_id}'")
+    return location_id
+
+
+# --- Inventory ---
+
+def add_product(repo, product_name, unit_price, description="", current_stock_quantity=0, reorder_level=0,
+                location_id=None):
+    """Adds a product, with its opening stock at `location_id`, and returns its Product ID."""
+    return repo.add_product(
+        _required(product_name, "Product Name"),
+        "" if description is None else str(description),
+        _price(unit_price, "Unit Price"),
+        _whole_number(current_stock_quantity, "Current Stock Quantity", 0),
+        _whole_number(reorder_level, "Reorder Level", 0),
+        _known_location(repo, location_id),
+    )
+
+
+def get_product(repo, product_id):
+    """Returns a product's inventory row as a dict; raises ValidationError if unknown."""
+    product = repo.product(product_id)
+    if product is None:
+        raise ValidationError(f"Unknown product '{product_id}'")
+    return product
+
+
+def receive_stock(repo, product_id, quantity, location_id=None):
+    """Adds received units to a product's stock at a location (the default one if None).
+
+    Returns the new stock level at `location_id`, or in total when it is None.
+    """
+    get_product(repo, product_id)
+    repo.update_stock(
+        product_id, _whole_number(quantity, "Quantity", 1), 'purchase', _known_location(repo, location_id)
+    )
+    return repo.get_stock(product_id, location_id)
+
+
+def dispatch_stock(repo, product_id, quantity, location_id=None):
+    """Takes units out of a location's stock (the default one if None); returns the new stock level.
+
+    Raises InsufficientStockError, and changes nothing, if fewer are in stock there.
+    """
+    get_product(repo, product_id)
+    repo.update_stock(
+        product_id, _whole_number(quantity, "Quantity", 1), 'sale', _known_location(repo, location_id)
+    )
+    return repo.get_stock(product_id, location_id)
+
+
+# --- Locations ---
+
+def add_location(repo, name, kind=LOCATION_KINDS[0], address=""):
+    """Adds a godown or shop and returns its Location ID; names must be unique."""
+    name = _required(name, "Name")
+    if kind not in LOCATION_KINDS:
+        raise ValidationError(f"'Kind' must be one of: {', '.join(LOCATION_KINDS)}")
+    if name.casefold() in {existing.casefold() for existing in repo.location_names().values()}:
+        raise ValidationError(f"A location named '{name}' already exists")
+    return repo.add_location(name, kind, "" if address is None else str(address))
+
+
+def transfer_stock(repo, from_location, to_location, lines):
+    """Moves stock from one location to another in one transaction and returns the transfer ID.
+
+    `lines` are order lines as for `order_items`. Raises
+    InsufficientStockError, and moves nothing, if the source cannot cover them.
+    """
+    from_location = _known_location(repo, _required(from_location, "From Location"))
+    to_location = _known_location(repo, _required(to_location, "To Location"))
+    if from_location == to_location:
+        raise ValidationError("Stock can only be transferred between two different locations")
+    return repo.transfer_stock(from_location, to_location, order_items(repo, lines))
+
+
+# --- Orders ---
+
+def order_items(repo, lines):
+    """Resolves order lines into the line-item dicts the repository records.
+
+    Each line is a dict with a 'quantity' and either a 'product_id' or a
+    'product_name'; unit prices come from the inventory.
+    """
+    if not isinstance(lines, list) or not all(isinstance(line, dict) for line in lines):
+        raise ValidationError("'lines' must be a list of order lines")
+    if not lines:
+        raise ValidationError("An order needs at least one product")
+    items = []
+    for line in lines:
+        product_id = line.get('product_id')
+        if product_id is None:
+            product_id = repo.product_id_for_name(_required(line.get('product_name'), "Product Name"))
+            if product_id is None:
+                raise ValidationError(f"Unknown product '{line.get('product_name')}'")
+        product = get_product(repo, product_id)
+        items.append({
+            'product_id': product_id,
+            'product_name': product['Product Name'],
+            'quantity': _whole_number(line.get('quantity'), "Quantity", 1),
+            'unit_price': float(product['Unit Price']),
+        })
+    return items
+
+
+def record_sale(repo, customer_name, lines, location_id=None):
+    """Records a sale to a known customer from a location's stock in one transaction; returns the Order ID."""
+    customer_name = _known_name(repo.customers(), customer_name, "Customer")
+    return repo.record_sale(customer_name, order_items(repo, lines), _known_location(repo, location_id))
+
+
+def record_purchase(repo, supplier_name, lines, location_id=None):
+    """Records a purchase from a known supplier, received at a location, in one transaction; returns the Order ID."""
+    supplier_name = _known_name(repo.suppliers(), supplier_name, "Supplier")
+    return repo.record_purchase(supplier_name, order_items(repo, lines), _known_location(repo, location_id))
+
+
+def record_purchases(repo, orders, location_id=None):
+    """Records several purchase orders received at one location in one transaction; returns their Order IDs.
+
+    `orders` is a list of (supplier name, lines) pairs. If any order is
+    invalid, ValidationError is raised and none is written.
+    """
+    suppliers = repo.suppliers()
+    orders = [
+        (_known_name(suppliers, supplier_name, "Supplier"), order_items(repo, lines))
+        for supplier_name, lines in orders
+    ]
+    if not orders:
+        raise ValidationError("There are no purchase orders to record")
+    return repo.record_purchases(orders, _known_location(repo, location_id))
+
+
+def ingest_orders(repo, lines, policy='fifo', priority_customers=(), partial=True, location_id=None):
+    """Validates, allocates and records a batch of channel order lines; returns the per-order report.
+
+    `lines` is a DataFrame as `order_ingest.read_orders` returns. Stock at
+    the location is allocated by `policy` ('fifo' or 'priority', which
+    serves `priority_customers` first), filling orders partly when `partial`
+    is set. Every accepted order is recorded in one transaction, keeping its
+    'Order Ref'; orders whose ref was imported before are rejected. The
+    report has one row per order with its status, reason and 'Order ID'
+    (empty for rejected orders).
+    """
+    import order_ingest
+
+    location_id = _known_location(repo, location_id)
+    if policy not in order_ingest.POLICIES:
+        raise ValidationError(f"'Policy' must be one of: {', '.join(order_ingest.POLICIES)}")
+    if not isinstance(priority_customers, (list, tuple)) or not all(
+        isinstance(name, str) for name in priority_customers
+    ):
+        raise ValidationError("'Priority Customers' must be a list of customer names")
+    if lines.empty:
+        raise ValidationError("There are no order lines to import")
+    try:
+        order_ingest.check_columns(lines)
+    except ValueError as e:
+        raise ValidationError(str(e)) from None
+    checked = order_ingest.validate(lines, repo.inventory(), repo.customers())
+    order_refs = checked['Order Ref'].unique().tolist()
+    for attempt in range(INGEST_ATTEMPTS):
+        allocated = order_ingest.allocate(
+            order_ingest.reject_ingested(checked, repo.ingested_orders(order_refs)),
+            repo.stock_at(location_id), policy, priority_customers, partial,
+        )
+        orders = order_ingest.sale_orders(allocated)
+        try:
+            order_ids = repo.record_sales(
+                [(customer_name, items) for _, customer_name, items in orders], location_id,
+                [order_ref for order_ref, _, _ in orders],
+            ) if orders else []
+        except (InsufficientStockError, DuplicateOrderError):
+            # Another session sold some of the stock, or imported some of
+            # these orders, since they were allocated.
+            if attempt == INGEST_ATTEMPTS - 1:
+                raise
+            repo.refresh()
+        else:
+            break
+    report = order_ingest.summarize(allocated)
+    report['Order ID'] = report['Order Ref'].map(
+        dict(zip((order_ref for order_ref, _, _ in orders), order_ids))
+    ).fillna("")
+    return report
+
+
+# --- Replenishment ---
+
+def reorder_suggestions(repo, window_days=None, lead_time_days=None, safety_days=None, cover_days=None):
+    """Returns the products due for reordering with suggested quantities; see replenishment.suggest.
+
+    Arguments left as None take the replenishment module's defaults. The
+    result is cached until the inventory, sales history or orders change;
+    callers must not modify it.
+    """
+    import replenishment
+
+    window_days = replenishment.WINDOW_DAYS if window_days is None else window_days
+    lead_time_days = replenishment.LEAD_TIME_DAYS if lead_time_days is None else lead_time_days
+    safety_days = replenishment.SAFETY_DAYS if safety_days is None else safety_days
+    cover_days = replenishment.COVER_DAYS if cover_days is None else cover_days
+    return repo.reorder_suggestions(
+        _whole_number(window_days, "Window Days", 1),
+        _whole_number(lead_time_days, "Lead Time Days", 0),
+        _whole_number(safety_days, "Safety Days", 0),
+        _whole_number(cover_days, "Cover Days", 0),
+    )
+
+
+def record_reorders(repo, suggestions, default_supplier=None, location_id=None):
+    """Records the suggestions as one purchase order per supplier, received at one location, in one transaction.
+
+    Products never bought before go to `default_supplier`, or are skipped
+    when it is None. Returns the Order IDs.
+    """
+    import replenishment
+
+    return record_purchases(repo, replenishment.draft_orders(suggestions, default_supplier), location_id)
+
+
+# --- CRM ---
+
+def add_customer(repo, name, contact_person="", email="", phone="", address=""):
+    """Adds a customer and returns its Customer ID."""
+    return repo.add_customer(_required(name, "Name"), contact_person, email, phone, address)
+
+
+def add_supplier(repo, name, contact_person="", email="", phone="", address=""):
+    """Adds a supplier and returns its Supplier ID."""
+    return repo.add_supplier(_required(name, "Name"), contact_person, email, phone, address)
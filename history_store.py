@@ -0,0 +1,120 @@
+"""Monthly, memory-mapped partitions of the sales history.
+
+Closed months of `sales_history` are sealed into one Arrow IPC file per month
+("2024-05.arrow"). Date-range reports open only the partitions that overlap
+the range, memory-mapped, so a "last 30 days" query over years of history
+touches a few files instead of loading everything into RAM. The current month
+stays in SQLite and in memory. Partitioning needs `pyarrow` (listed in
+requirements.txt); without it the store warns, reports itself unavailable and
+the repository keeps all history in memory as before.
+"""
+
+import os
+import warnings
+
+import pandas as pd
+
+COLUMNS = ['Date', 'Product ID', 'Product Name', 'Quantity', 'Total Sale']
+
+SUFFIX = '.arrow'
+
+
+def month_of(date):
+    """Returns the "YYYY-MM" partition key of a date or "YYYY-MM-DD" string."""
+    return pd.Timestamp(date).strftime("%Y-%m")
+
+
+def month_start(month):
+    return pd.Timestamp(f"{month}-01")
+
+
+def next_month(month):
+    return (month_start(month) + pd.offsets.MonthBegin(1)).strftime("%Y-%m")
+
+
+class HistoryPartitions:
+    """A directory of sealed monthly sales history partitions."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            warnings.warn(
+                "pyarrow is not installed: sales history partitioning is off and all history is kept in memory.",
+                RuntimeWarning, stacklevel=2,
+            )
+            self.available = False
+        else:
+            self.available = True
+            os.makedirs(directory, exist_ok=True)
+
+    def _path(self, month):
+        return os.path.join(self.directory, f"{month}{SUFFIX}")
+
+    def months(self):
+        """Returns the sealed months in ascending order."""
+        if not self.available:
+            return []
+        return sorted(
+            name[:-len(SUFFIX)] for name in os.listdir(self.directory) if name.endswith(SUFFIX)
+        )
+
+    def seal(self, month, frame):
+        """Writes (or rewrites) the partition for `month` from a history frame."""
+        import pyarrow as pa
+
+        frame = pd.DataFrame({
+            'Date': pd.to_datetime(frame['Date']).astype('datetime64[s]'),
+            'Product ID': frame['Product ID'].astype(str),
+            'Product Name': frame['Product Name'].astype(str),
+            'Quantity': frame['Quantity'].astype('int32'),
+            'Total Sale': frame['Total Sale'].astype('float64'),
+        })
+        table = pa.Table.from_pandas(frame, preserve_index=False)
+        temporary = self._path(month) + '.tmp'
+        with pa.OSFile(temporary, 'wb') as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+        os.replace(temporary, self._path(month))
+
+    def _open(self, month):
+        import pyarrow as pa
+
+        # Buffers of the returned table point into the mapping; nothing is copied.
+        return pa.ipc.open_file(pa.memory_map(self._path(month), 'r')).read_all()
+
+    def query(self, start=None, end=None, product_ids=None):
+        """Returns sealed history rows with start <= Date <= end, optionally for some products.
+
+        Only partitions whose month overlaps the range are opened.
+        """
+        import pyarrow as pa
+        import pyarrow.compute as pc
+
+        start = None if start is None else pd.Timestamp(start)
+        end = None if end is None else pd.Timestamp(end)
+        pieces = []
+        for month in self.months():
+            first = month_start(month)
+            if (end is not None and first > end) or (
+                start is not None and month_start(next_month(month)) <= start
+            ):
+                continue
+            table = self._open(month)
+            mask = None
+            if start is not None and start > first:
+                mask = pc.greater_equal(table['Date'], pa.scalar(start.to_pydatetime(), pa.timestamp('s')))
+            if end is not None:
+                upper = pc.less_equal(table['Date'], pa.scalar(end.to_pydatetime(), pa.timestamp('s')))
+                mask = upper if mask is None else pc.and_(mask, upper)
+            if product_ids is not None:
+                wanted = pc.is_in(table['Product ID'], value_set=pa.array(list(product_ids), pa.string()))
+                mask = wanted if mask is None else pc.and_(mask, wanted)
+            if mask is not None:
+                table = table.filter(mask)
+            if table.num_rows:
+                pieces.append(table)
+        if not pieces:
+            return pd.DataFrame({column: [] for column in COLUMNS})
+        return pa.concat_tables(pieces).to_pandas()
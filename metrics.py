@@ -0,0 +1,194 @@
+"""In-process performance metrics for MSME360.
+
+Timing hooks wrap page renders, form submits, the repository write paths and
+the operations whose cost grows with table size (concat, merge/groupby,
+search, sort, styling). Each hook feeds a latency histogram with cumulative
+Prometheus-style buckets plus a window of recent samples for rolling
+percentiles. Per-table row and memory gauges are read from the repository
+when they are displayed or scraped. `prometheus_text` renders everything in
+the Prometheus text exposition format.
+"""
+
+import sys
+import threading
+import time
+from bisect import bisect_left
+from collections import deque
+from contextlib import contextmanager
+from functools import wraps
+
+import numpy as np
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Upper bounds, in seconds, of the latency histogram buckets.
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Recent observations kept per series for the rolling percentiles.
+ROLLING_SAMPLES = 1024
+
+# Hook kind -> (metric name, label name, help text).
+KINDS = {
+    'page': ('msme360_page_render_seconds', 'page', "Time to render one page, one Streamlit run."),
+    'form': ('msme360_form_submit_seconds', 'form', "Time to handle one form submit."),
+    'operation': ('msme360_operation_seconds', 'operation', "Time spent in one repository or table operation."),
+}
+
+
+class LatencyHistogram:
+    """Cumulative bucket counts for export, plus the most recent samples for percentiles."""
+
+    def __init__(self):
+        self.bucket_counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.recent = deque(maxlen=ROLLING_SAMPLES)
+
+    def observe(self, seconds):
+        self.bucket_counts[bisect_left(BUCKETS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        self.recent.append(seconds)
+
+    def copy(self):
+        copied = LatencyHistogram()
+        copied.bucket_counts = list(self.bucket_counts)
+        copied.count = self.count
+        copied.total = self.total
+        copied.recent = deque(self.recent, maxlen=ROLLING_SAMPLES)
+        return copied
+
+    def percentiles(self, quantiles=(50, 95, 99)):
+        if not self.recent:
+            return [None] * len(quantiles)
+        return list(np.percentile(np.fromiter(self.recent, dtype=float), quantiles))
+
+
+class Registry:
+    """Thread-safe collection of latency histograms keyed by (kind, label value)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = {}
+
+    def observe(self, kind, name, seconds):
+        with self._lock:
+            histogram = self._histograms.get((kind, name))
+            if histogram is None:
+                histogram = self._histograms[(kind, name)] = LatencyHistogram()
+            histogram.observe(seconds)
+
+    @contextmanager
+    def timed(self, kind, name):
+        """Times the `with` block into the `kind` histogram labelled `name`."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(kind, name, time.perf_counter() - started)
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+
+    def items(self):
+        """Returns ((kind, name), histogram copy) pairs sorted by kind and name."""
+        with self._lock:
+            return sorted(
+                ((key, histogram.copy()) for key, histogram in self._histograms.items()),
+                key=lambda item: item[0],
+            )
+
+
+REGISTRY = Registry()
+
+observe = REGISTRY.observe
+timed = REGISTRY.timed
+
+
+def timed_operation(name):
+    """Decorator timing every call of a function as the operation `name`."""
+    def decorate(function):
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            with timed('operation', name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def peak_rss_bytes():
+    """Peak resident memory of this process, or None where it cannot be read."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes.
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def latency_rows(registry=REGISTRY):
+    """One dict per series with counts and rolling percentiles in milliseconds, for display."""
+    rows = []
+    for (kind, name), histogram in registry.items():
+        p50, p95, p99 = histogram.percentiles()
+        rows.append({
+            'Kind': kind,
+            'Name': name,
+            'Count': histogram.count,
+            'Mean ms': 1000 * histogram.total / histogram.count,
+            'p50 ms': 1000 * p50,
+            'p95 ms': 1000 * p95,
+            'p99 ms': 1000 * p99,
+            'Max ms': 1000 * max(histogram.recent),
+        })
+    return rows
+
+
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def prometheus_text(repo=None, registry=REGISTRY):
+    """Renders the histograms, table gauges, view cache counters and process memory as Prometheus text."""
+    lines = []
+    series = registry.items()
+    for kind, (metric, label, help_text) in KINDS.items():
+        histograms = [(name, histogram) for (series_kind, name), histogram in series if series_kind == kind]
+        if not histograms:
+            continue
+        lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} histogram"]
+        for name, histogram in histograms:
+            labels = f'{label}="{_label(name)}"'
+            cumulative = 0
+            for bound, count in zip(BUCKETS + (float('inf'),), histogram.bucket_counts):
+                cumulative += count
+                le = "+Inf" if bound == float('inf') else repr(bound)
+                lines.append(f'{metric}_bucket{{{labels},le="{le}"}} {cumulative}')
+            lines.append(f"{metric}_sum{{{labels}}} {histogram.total!r}")
+            lines.append(f"{metric}_count{{{labels}}} {histogram.count}")
+    if repo is not None:
+        sizes = repo.table_sizes()
+        lines += ["# HELP msme360_table_rows Rows held in memory per table.", "# TYPE msme360_table_rows gauge"]
+        lines += [f'msme360_table_rows{{table="{table}"}} {rows}' for table, (rows, _) in sizes.items()]
+        lines += [
+            "# HELP msme360_table_memory_bytes Approximate memory of the in-memory copy of each table.",
+            "# TYPE msme360_table_memory_bytes gauge",
+        ]
+        lines += [f'msme360_table_memory_bytes{{table="{table}"}} {nbytes}' for table, (_, nbytes) in sizes.items()]
+        lines += [
+            "# HELP msme360_view_cache_lookups_total Derived view lookups, by whether a cached view was reused.",
+            "# TYPE msme360_view_cache_lookups_total counter",
+            f'msme360_view_cache_lookups_total{{result="hit"}} {repo.views.hits}',
+            f'msme360_view_cache_lookups_total{{result="miss"}} {repo.views.misses}',
+        ]
+    peak_rss = peak_rss_bytes()
+    if peak_rss is not None:
+        lines += [
+            "# HELP msme360_process_peak_rss_bytes Peak resident memory of the server process.",
+            "# TYPE msme360_process_peak_rss_bytes gauge",
+            f"msme360_process_peak_rss_bytes {peak_rss}",
+        ]
+    return "\n".join(lines) + "\n"
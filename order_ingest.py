@@ -0,0 +1,266 @@
+"""Batch ingestion and stock allocation for marketplace orders in MSME360.
+
+A channel file holds one row per order line: an external 'Order Ref', the
+'Customer Name', a 'Product ID' or 'Product Name' and a 'Quantity', with an
+optional 'Order Time' that FIFO allocation follows (file order otherwise).
+Every line of the file is checked against the customers and the inventory
+with one vectorized join, and an order with any invalid line is rejected as
+a whole. Each 'Order Ref' is stored with the sale it becomes, so an order
+imported before, from a re-uploaded file or a retried request, is rejected
+rather than recorded twice.
+
+Scarce stock is then allocated in policy order, FIFO or priority customers
+first, as a cumulative sum of demand per product against the stock of the
+selling location. With partial fills allowed an order takes whatever is left
+of each line; otherwise an order is accepted only if every line can be filled
+in full, as if the orders were taken one at a time. The accepted lines are
+what `core.ingest_orders` commits with `Repository.record_sales` in a single
+transaction.
+"""
+
+import numpy as np
+import pandas as pd
+
+import metrics
+
+# Allocation policy -> label.
+POLICIES = {
+    'fifo': "First in, first out",
+    'priority': "Priority customers first",
+}
+
+REQUIRED_COLUMNS = ('Order Ref', 'Customer Name', 'Quantity')
+
+FILLED = "Filled"
+PARTIAL = "Partially filled"
+REJECTED = "Rejected"
+
+ORDER_COLUMNS = [
+    'Order Ref', 'Customer Name', 'Status', 'Lines', 'Units Requested', 'Units Allocated', 'Amount', 'Reason',
+]
+
+
+def read_orders(source, fmt='csv'):
+    """Reads a channel file of order lines; raises ValueError if it lacks a required column."""
+    import bulk_io
+
+    chunks = list(bulk_io.read_chunks(source, fmt))
+    lines = pd.concat(chunks, ignore_index=True) if chunks else pd.DataFrame()
+    check_columns(lines)
+    return lines
+
+
+def check_columns(lines):
+    """Raises ValueError if order lines lack a required column."""
+    missing = [column for column in REQUIRED_COLUMNS if column not in lines.columns]
+    if 'Product ID' not in lines.columns and 'Product Name' not in lines.columns:
+        missing.append('Product ID or Product Name')
+    if missing:
+        raise ValueError(f"The order lines are missing required columns: {', '.join(missing)}")
+
+
+def _text(lines, column):
+    if column not in lines.columns:
+        return pd.Series("", index=lines.index, dtype=object)
+    return lines[column].fillna("").astype(str).str.strip()
+
+
+@metrics.timed_operation('order_ingest.validate')
+def validate(lines, inventory, customers):
+    """Resolves products and checks every line in one pass; returns one row per line.
+
+    Adds 'Line' (1-based source row), 'Product ID', 'Product Name', 'Unit
+    Price', a numeric 'Quantity', 'Order Time' and 'Error', the first problem
+    with the line's order, or None if the order is valid.
+    """
+    lines = lines.reset_index(drop=True)
+    checked = pd.DataFrame({
+        'Line': np.arange(1, len(lines) + 1),
+        'Order Ref': _text(lines, 'Order Ref'),
+        'Customer Name': _text(lines, 'Customer Name'),
+        'Product ID': _text(lines, 'Product ID'),
+    })
+    products = pd.DataFrame({
+        'Product ID': inventory['Product ID'].astype(str).to_numpy(),
+        'Product Name': inventory['Product Name'].astype(str).to_numpy(),
+        'Unit Price': inventory['Unit Price'].to_numpy(),
+    })
+    # Lines without a Product ID name the product instead.
+    by_name = products.drop_duplicates('Product Name').set_index('Product Name')['Product ID']
+    named = _text(lines, 'Product Name')
+    missing_id = (checked['Product ID'] == "").to_numpy()
+    checked.loc[missing_id, 'Product ID'] = named[missing_id].map(by_name).fillna("").to_numpy()
+    checked = checked.merge(products, on='Product ID', how='left')
+
+    quantity = pd.to_numeric(lines['Quantity'], errors='coerce').to_numpy()
+    whole = np.isfinite(quantity) & (quantity >= 1) & (quantity == np.floor(quantity))
+    checked['Quantity'] = np.where(whole, quantity, 0).astype('int64')
+    order_time = (
+        pd.to_datetime(lines['Order Time'], errors='coerce') if 'Order Time' in lines.columns
+        else pd.Series(pd.NaT, index=lines.index)
+    )
+    checked['Order Time'] = order_time.to_numpy()
+
+    known_customers = set(customers['Name'].astype(str))
+    problems = [
+        ((checked['Order Ref'] == "").to_numpy(), "missing 'Order Ref'"),
+        (~checked['Customer Name'].isin(known_customers).to_numpy(), "unknown customer"),
+        (checked['Unit Price'].isna().to_numpy(), "unknown product"),
+        (~whole, "'Quantity' is not a positive whole number"),
+        (
+            order_time.isna().to_numpy() if 'Order Time' in lines.columns else np.zeros(len(lines), dtype=bool),
+            "invalid 'Order Time'",
+        ),
+        (
+            (checked.groupby('Order Ref')['Customer Name'].transform('nunique') > 1).to_numpy(),
+            "lines name different customers",
+        ),
+    ]
+    error = pd.Series(None, index=checked.index, dtype=object)
+    for mask, message in reversed(problems):
+        error[mask] = [f"line {line}: {message}" for line in checked['Line'][mask]]
+    # One bad line rejects its whole order, with the first problem found.
+    checked['Error'] = error.groupby(checked['Order Ref']).transform('first')
+    return checked
+
+
+def reject_ingested(lines, ingested):
+    """Returns validated lines with orders already recorded rejected; `ingested` maps Order Ref -> Order ID."""
+    order_ids = lines['Order Ref'].map(ingested).fillna("")
+    imported = (order_ids != "").to_numpy()
+    if not imported.any():
+        return lines
+    lines = lines.copy()
+    lines.loc[imported, 'Error'] = "already imported as " + order_ids[imported]
+    return lines
+
+
+def _sequence(lines, policy, priority_customers):
+    """Policy rank of each line's order: priority customers first if asked, then time, then file order."""
+    if policy not in POLICIES:
+        raise ValueError(f"Unknown allocation policy '{policy}'. Use one of: {', '.join(POLICIES)}.")
+    orders = lines.groupby('Order Ref', sort=False).agg(
+        first_line=('Line', 'min'), time=('Order Time', 'min'), customer=('Customer Name', 'first')
+    )
+    orders['rank'] = 0
+    if policy == 'priority':
+        orders['rank'] = (~orders['customer'].isin(list(priority_customers))).astype('int64')
+    orders = orders.sort_values(['rank', 'time', 'first_line'], na_position='last', kind='stable')
+    return lines['Order Ref'].map(pd.Series(np.arange(len(orders)), index=orders.index)).to_numpy()
+
+
+def _allocation(codes, quantity, available):
+    """Units each line, taken in sequence, gets from its product's stock after the lines before it.
+
+    `codes` are product codes indexing `available`; a stable sort by product
+    keeps the sequence within each product for the running totals.
+    """
+    if not len(codes):
+        return np.zeros(0, dtype=quantity.dtype)
+    order = np.argsort(codes, kind='stable')
+    sorted_codes, sorted_quantity = codes[order], quantity[order]
+    before = np.cumsum(sorted_quantity) - sorted_quantity
+    starts = np.flatnonzero(np.concatenate(([True], sorted_codes[1:] != sorted_codes[:-1])))
+    before -= np.repeat(before[starts], np.diff(np.append(starts, len(order))))
+    allocated = np.empty_like(quantity)
+    allocated[order] = np.clip(available[sorted_codes] - before, 0, sorted_quantity)
+    return allocated
+
+
+@metrics.timed_operation('order_ingest.allocate')
+def allocate(lines, stock, policy='fifo', priority_customers=(), partial=True):
+    """Allocates stock to validated lines in policy order; returns them with 'Allocated', 'Short', 'Sequence'.
+
+    `stock` is a Product ID -> units Series for the selling location. With
+    `partial` an order takes what is left of each line. Without it an order
+    is filled in full or not at all: each round rejects the orders that fall
+    short on a product no earlier short order also wants, since no later
+    rejection can free stock for them, until every remaining order fits.
+    """
+    lines = lines.copy()
+    lines['Sequence'] = _sequence(lines, policy, priority_customers)
+    lines = lines.sort_values(['Sequence', 'Line'], kind='stable', ignore_index=True)
+    codes, products = pd.factorize(lines['Product ID'])
+    available = stock.reindex(products).fillna(0).to_numpy().astype('int64')
+    quantity = lines['Quantity'].to_numpy().astype('int64')
+    sequence = lines['Sequence'].to_numpy()
+    valid = lines['Error'].isna().to_numpy()
+    allocated = np.zeros(len(lines), dtype='int64')
+    # Lines their order could not fill: in partial mode those left short, in
+    # all-or-nothing mode those short in the last round their order was active.
+    short_lines = np.zeros(len(lines), dtype=bool)
+    if partial:
+        allocated[valid] = _allocation(codes[valid], quantity[valid], available)
+        short_lines[valid] = allocated[valid] < quantity[valid]
+    else:
+        active = valid.copy()
+        while True:
+            rows = np.flatnonzero(active)
+            short = _allocation(codes[rows], quantity[rows], available) < quantity[rows]
+            short_lines[rows] = short
+            if not short.any():
+                break
+            failing = rows[np.isin(sequence[rows], sequence[rows[short]])]
+            first_failing = np.full(len(products), len(lines), dtype=sequence.dtype)
+            np.minimum.at(first_failing, codes[failing], sequence[failing])
+            short_rows = rows[short]
+            certain = sequence[short_rows][first_failing[codes[short_rows]] == sequence[short_rows]]
+            active &= ~np.isin(sequence, certain)
+        allocated[active] = quantity[active]
+    lines['Allocated'] = allocated
+    lines['Short'] = short_lines
+    return lines
+
+
+def summarize(lines):
+    """One row per order: status, units requested and allocated, allocated amount and the reason."""
+    lines = lines.assign(Amount=lines['Allocated'].to_numpy() * lines['Unit Price'].fillna(0).to_numpy())
+    orders = lines.groupby('Order Ref', sort=False).agg(**{
+        'Customer Name': ('Customer Name', 'first'),
+        'Lines': ('Line', 'size'),
+        'Units Requested': ('Quantity', 'sum'),
+        'Units Allocated': ('Allocated', 'sum'),
+        'Amount': ('Amount', 'sum'),
+        'Error': ('Error', 'first'),
+        'Sequence': ('Sequence', 'first'),
+    }).reset_index().sort_values('Sequence', ignore_index=True)
+    short = lines[lines['Short'].to_numpy()]
+    short_products = {}
+    for order_ref, product_name in zip(*(
+        short.drop_duplicates(['Order Ref', 'Product ID'])[column].tolist() for column in ('Order Ref', 'Product Name')
+    )):
+        short_products.setdefault(order_ref, []).append(product_name)
+    shortages = orders['Order Ref'].map(
+        {order_ref: ", ".join(names) for order_ref, names in short_products.items()}
+    ).fillna("")
+    requested, allocated = orders['Units Requested'], orders['Units Allocated']
+    orders['Status'] = np.select(
+        [orders['Error'].notna() | (allocated == 0), allocated < requested], [REJECTED, PARTIAL], FILLED
+    )
+    orders['Reason'] = np.select(
+        [orders['Error'].notna(), orders['Status'] != FILLED],
+        [orders['Error'], "insufficient stock: " + shortages],
+        "",
+    )
+    return orders[ORDER_COLUMNS]
+
+
+def sale_orders(lines):
+    """(order ref, customer name, items) for every order with allocated units, in policy order.
+
+    `lines` are as `allocate` returns them, each order's lines together.
+    Items are the line-item dicts `Repository.record_sales` takes, with the
+    allocated quantity.
+    """
+    taken = lines[(lines['Allocated'] > 0).to_numpy()]
+    orders = []
+    for order_ref, customer_name, product_id, product_name, quantity, unit_price in zip(*(
+        taken[column].tolist()
+        for column in ('Order Ref', 'Customer Name', 'Product ID', 'Product Name', 'Allocated', 'Unit Price')
+    )):
+        if not orders or orders[-1][0] != order_ref:
+            orders.append((order_ref, customer_name, []))
+        orders[-1][2].append({
+            'product_id': product_id, 'product_name': product_name, 'quantity': quantity, 'unit_price': unit_price,
+        })
+    return orders
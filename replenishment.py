@@ -0,0 +1,115 @@
+"""Reorder suggestions and draft purchase orders for MSME360.
+
+One vectorized pass over the inventory and the recent sales history gives
+every product its sales velocity (units sold per day over the window), the
+demand expected over the supplier lead time, a reorder point and the quantity
+that brings stock back up. Suggestions are grouped by each product's
+preferred supplier, the one it was last bought from, into draft purchase
+orders that `core.record_purchases` writes in one transaction.
+"""
+
+import numpy as np
+import pandas as pd
+
+import metrics
+
+# Days of sales history the velocity is averaged over.
+WINDOW_DAYS = 90
+
+# Days between placing a purchase order and receiving the stock.
+LEAD_TIME_DAYS = 7
+
+# Extra days of demand held as safety stock.
+SAFETY_DAYS = 7
+
+# Days of demand an order should cover beyond the reorder point.
+COVER_DAYS = 30
+
+
+@metrics.timed_operation('replenishment.preferred_suppliers')
+def preferred_suppliers(order_lines, purchase_orders):
+    """The supplier each product was last bought from, as a Product ID -> Supplier Name Series."""
+    lines = order_lines[(order_lines['Order Type'] == 'purchase').to_numpy()]
+    merged = lines[['Order ID', 'Product ID']].merge(
+        purchase_orders[['Order ID', 'Date', 'Supplier Name']], on='Order ID'
+    )
+    # Lines keep their recording order, so a stable sort leaves the latest purchase last.
+    latest = merged.sort_values('Date', kind='stable').drop_duplicates('Product ID', keep='last')
+    return pd.Series(
+        latest['Supplier Name'].astype(str).to_numpy(), index=latest['Product ID'].astype(str).to_numpy(),
+        dtype=object,
+    )
+
+
+@metrics.timed_operation('replenishment.suggest')
+def suggest(inventory, recent_sales, suppliers, window_days=WINDOW_DAYS, lead_time_days=LEAD_TIME_DAYS,
+            safety_days=SAFETY_DAYS, cover_days=COVER_DAYS):
+    """Returns one row per product due for reordering, with its supplier and order quantity.
+
+    `recent_sales` is the sales history of the last `window_days` days and
+    `suppliers` maps Product ID to preferred supplier. A product is due when
+    its stock is at or below its reorder point: the larger of its reorder
+    level and the units it is expected to sell over the lead time plus the
+    safety days. It is ordered up to the reorder point plus `cover_days` of
+    sales, and to at least one unit above the reorder point. Products with
+    no purchase history have no Supplier Name.
+    """
+    product_ids = inventory['Product ID'].astype(str).to_numpy()
+    sold = recent_sales.groupby(recent_sales['Product ID'].astype(str))['Quantity'].sum()
+    velocity = sold.reindex(product_ids, fill_value=0).to_numpy() / window_days
+    stock = inventory['Current Stock Quantity'].to_numpy()
+    reorder_level = inventory['Reorder Level'].to_numpy()
+    reorder_point = np.maximum(reorder_level, np.ceil(velocity * (lead_time_days + safety_days)))
+    # Ordering up to at least one unit above the reorder point takes the product off the low-stock list.
+    quantity = reorder_point + np.maximum(np.ceil(velocity * cover_days), 1) - stock
+    unit_price = inventory['Unit Price'].to_numpy()
+    due = stock <= reorder_point
+    suggestions = pd.DataFrame({
+        'Supplier Name': suppliers.reindex(product_ids).to_numpy(),
+        'Product ID': product_ids,
+        'Product Name': inventory['Product Name'].astype(str).to_numpy(),
+        'Current Stock': stock,
+        'Reorder Level': reorder_level,
+        'Units per Day': np.round(velocity, 2),
+        'Lead-Time Demand': np.ceil(velocity * lead_time_days).astype('int64'),
+        'Reorder Point': reorder_point.astype('int64'),
+        'Order Quantity': quantity.astype('int64'),
+        'Unit Price': unit_price,
+        'Amount': quantity * unit_price,
+    })[due]
+    return suggestions.sort_values(
+        ['Supplier Name', 'Amount'], ascending=[True, False], na_position='last', ignore_index=True
+    )
+
+
+def draft_orders(suggestions, default_supplier=None):
+    """Groups suggestions into (supplier name, lines) draft purchase orders, by supplier name.
+
+    Lines are {'product_id', 'quantity'} dicts. Products with no preferred
+    supplier go to `default_supplier`, or are left out when it is None.
+    """
+    suppliers = suggestions['Supplier Name']
+    if default_supplier is not None:
+        suppliers = suppliers.fillna(default_supplier)
+    return [
+        (supplier, [
+            {'product_id': product_id, 'quantity': int(quantity)}
+            for product_id, quantity in zip(group['Product ID'], group['Order Quantity'])
+        ])
+        for supplier, group in suggestions.groupby(suppliers, sort=True)
+    ]
+
+
+def order_summary(suggestions, default_supplier=None):
+    """Lines, units and amount of each draft purchase order, for review before recording."""
+    suppliers = suggestions['Supplier Name']
+    if default_supplier is not None:
+        suppliers = suppliers.fillna(default_supplier)
+    summary = suggestions.groupby(suppliers.fillna("(no supplier)").rename('Supplier Name')).agg(
+        **{
+            'Lines': ('Product ID', 'size'),
+            'Units': ('Order Quantity', 'sum'),
+            'Amount': ('Amount', 'sum'),
+        }
+    )
+    return summary.reset_index()
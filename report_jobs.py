@@ -0,0 +1,428 @@
+"""Background report jobs for MSME360.
+
+Heavy reports (full sales and purchase exports, inventory valuation and the
+Expansion Toolkit over lifetime sales) run in worker processes instead of
+inside a Streamlit rerun. A small thread pool starts one `python
+report_jobs.py` process per job, as benchmark.py does per scale, so a worker
+imports only what the report needs and never re-runs the app script. The
+worker opens the database itself, reads one consistent snapshot in chunks,
+writes the result to a CSV, Excel or PDF file and reports its progress
+through a small file next to the result, which the page polls. Results are
+kept in a directory next to the database until MAX_JOBS newer jobs replace
+them.
+"""
+
+import json
+import os
+import sqlite3
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+
+import pandas as pd
+
+import metrics
+import stock_ledger
+
+CHUNK_ROWS = 10_000
+
+# Worker processes building reports at the same time.
+REPORT_WORKERS = 2
+
+# Finished jobs kept, with their files, per server process.
+MAX_JOBS = 20
+
+# Excel sheets hold at most this many data rows; longer reports continue on another sheet.
+EXCEL_SHEET_ROWS = 1_000_000
+
+# PDF is for reading and printing, so long reports stop after this many rows.
+MAX_PDF_ROWS = 20_000
+
+REPORTS = {
+    'sales': "Full Sales Export",
+    'purchases': "Full Purchase Export",
+    'inventory_valuation': "Inventory Valuation",
+    'expansion': "Expansion Toolkit (Lifetime Sales)",
+}
+
+# Format -> (file extension, MIME type).
+FORMATS = {
+    'csv': ('.csv', 'text/csv'),
+    'xlsx': ('.xlsx', 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'),
+    'pdf': ('.pdf', 'application/pdf'),
+}
+
+# Lifetime sales below each bound reach that level; the last has no bound.
+EXPANSION_LEVELS = [
+    (100_000, "Level 1: Getting Started"),
+    (1_000_000, "Level 2: Growing Up"),
+    (None, "Level 3: Scaling & Expanding"),
+]
+
+
+def _excel_engine():
+    for engine in ('xlsxwriter', 'openpyxl'):
+        try:
+            __import__(engine)
+        except ImportError:
+            continue
+        return engine
+    raise ImportError("Excel export needs the 'XlsxWriter' or 'openpyxl' package.")
+
+
+def available_formats():
+    """The formats this installation can write; Excel needs an optional package."""
+    try:
+        _excel_engine()
+    except ImportError:
+        return [fmt for fmt in FORMATS if fmt != 'xlsx']
+    return list(FORMATS)
+
+
+def expansion_level(total_sales):
+    """The Expansion Toolkit level reached by a lifetime sales total."""
+    for bound, level in EXPANSION_LEVELS:
+        if bound is None or total_sales < bound:
+            return level
+
+
+# --- Report sources ---
+# Each returns (title, columns, row count, chunk iterator) from an open snapshot.
+
+def _rows(cursor, columns):
+    while True:
+        rows = cursor.fetchmany(CHUNK_ROWS)
+        if not rows:
+            break
+        yield pd.DataFrame.from_records(rows, columns=columns)
+
+
+def _date_filter(params):
+    where, values = "", []
+    if params.get('start'):
+        where += " AND o.date >= ?"
+        values.append(str(params['start']))
+    if params.get('end'):
+        where += " AND o.date <= ?"
+        values.append(str(params['end']))
+    return where, values
+
+
+def _order_export(conn, params, order_type):
+    orders, party, label = {
+        'sale': ('sales_orders', 'customer_name', 'Customer Name'),
+        'purchase': ('purchase_orders', 'supplier_name', 'Supplier Name'),
+    }[order_type]
+    where, values = _date_filter(params)
+    joins = (
+        f"FROM order_lines l JOIN {orders} o ON o.order_id = l.order_id "
+        f"LEFT JOIN inventory i ON i.product_id = l.product_id "
+        f"WHERE l.order_type = ?{where}"
+    )
+    (count,) = conn.execute(f"SELECT COUNT(*) {joins}", [order_type] + values).fetchone()
+    columns = ['Order ID', 'Date', label, 'Product ID', 'Product Name', 'Quantity', 'Unit Price', 'Line Total']
+    cursor = conn.execute(
+        f"SELECT o.order_id, o.date, o.{party}, l.product_id, COALESCE(i.product_name, ''), "
+        f"l.quantity, l.unit_price, l.quantity * l.unit_price {joins} ORDER BY o.date, l.rowid",
+        [order_type] + values,
+    )
+    period = f"{params.get('start') or 'start'} to {params.get('end') or 'today'}"
+    title = f"{REPORTS['sales' if order_type == 'sale' else 'purchases']}, {period}"
+    return title, columns, count, _rows(cursor, columns)
+
+
+def _inventory_valuation(conn, params):
+    """Stock of each product at the end of `as_of` (or now) from the stock ledger, at current prices."""
+    as_of = params.get('as_of')
+    stock = None if as_of is None else stock_ledger.stock_as_of(conn, as_of)
+    inventory = pd.read_sql_query(
+        "SELECT product_id AS \"Product ID\", product_name AS \"Product Name\", unit_price AS \"Unit Price\", "
+        "stock_quantity AS \"Stock\", reorder_level AS \"Reorder Level\" FROM inventory ORDER BY rowid",
+        conn,
+    )
+    if stock is not None:
+        inventory['Stock'] = inventory['Product ID'].map(stock).fillna(0).astype('int64')
+    inventory['Value'] = inventory['Stock'] * inventory['Unit Price']
+    inventory['Low Stock'] = inventory['Stock'] <= inventory['Reorder Level']
+    title = (
+        f"{REPORTS['inventory_valuation']} as of {as_of or 'now'}: "
+        f"total value Rs. {inventory['Value'].sum():,.2f}"
+    )
+    chunks = (inventory.iloc[start:start + CHUNK_ROWS] for start in range(0, len(inventory), CHUNK_ROWS))
+    return title, list(inventory.columns), len(inventory), chunks
+
+
+def _expansion(conn, params):
+    """Monthly and cumulative lifetime sales with the toolkit level reached each month."""
+    monthly = pd.read_sql_query(
+        "SELECT substr(date, 1, 7) AS \"Month\", COUNT(*) AS \"Orders\", SUM(total_amount) AS \"Sales\" "
+        "FROM sales_orders GROUP BY substr(date, 1, 7) ORDER BY 1",
+        conn,
+    )
+    monthly['Lifetime Sales'] = monthly['Sales'].cumsum()
+    monthly['Level'] = [expansion_level(total) for total in monthly['Lifetime Sales']]
+    total = float(monthly['Sales'].sum())
+    title = f"{REPORTS['expansion']}: Rs. {total:,.2f}, {expansion_level(total)}"
+    return title, list(monthly.columns), len(monthly), iter([monthly])
+
+
+SOURCES = {
+    'sales': lambda conn, params: _order_export(conn, params, 'sale'),
+    'purchases': lambda conn, params: _order_export(conn, params, 'purchase'),
+    'inventory_valuation': _inventory_valuation,
+    'expansion': _expansion,
+}
+
+
+# --- Writers ---
+
+def _write_csv(chunks, destination, title, columns, progress):
+    with open(destination, 'w', newline='', encoding='utf-8') as handle:
+        pd.DataFrame(columns=columns).to_csv(handle, index=False)
+        for chunk in chunks:
+            chunk.to_csv(handle, header=False, index=False)
+            progress(len(chunk))
+
+
+def _write_excel(chunks, destination, title, columns, progress):
+    with pd.ExcelWriter(destination, engine=_excel_engine()) as writer:
+        sheet, row = 1, 0
+        pd.DataFrame(columns=columns).to_excel(writer, sheet_name=f"Report {sheet}", index=False)
+        for chunk in chunks:
+            while len(chunk):
+                if row == EXCEL_SHEET_ROWS:
+                    sheet, row = sheet + 1, 0
+                    pd.DataFrame(columns=columns).to_excel(writer, sheet_name=f"Report {sheet}", index=False)
+                part = chunk.iloc[:EXCEL_SHEET_ROWS - row]
+                part.to_excel(
+                    writer, sheet_name=f"Report {sheet}", startrow=row + 1, header=False, index=False
+                )
+                row += len(part)
+                progress(len(part))
+                chunk = chunk.iloc[len(part):]
+
+
+def _pdf_text(value):
+    text = str(value).replace('₹', 'Rs.').encode('latin-1', 'replace').decode('latin-1')
+    return text.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+
+
+def _write_pdf(chunks, destination, title, columns, progress, page_width=842, page_height=595, size=7):
+    """A plain landscape A4 PDF: the title, then the rows as fixed-width Courier text."""
+    # Courier glyphs are 0.6 em wide; margins are 30 points, plus room for the title and page number.
+    characters = int((page_width - 60) / (0.6 * size))
+    lines = (page_height - 80) // (size + 1)
+    rows, written, truncated = [], 0, False
+    for chunk in chunks:
+        keep = chunk.iloc[:MAX_PDF_ROWS - written]
+        rows += [[str(value) for value in row] for row in keep.itertuples(index=False)]
+        written += len(keep)
+        progress(len(chunk))
+        if written == MAX_PDF_ROWS:
+            truncated = True
+            break
+    widths = [
+        min(28, max([len(column)] + [len(row[index]) for row in rows]))
+        for index, column in enumerate(columns)
+    ]
+
+    def line(values):
+        return "  ".join(value[:width].ljust(width) for value, width in zip(values, widths))[:characters]
+
+    body = [line(columns), line("-" * width for width in widths)] + [line(row) for row in rows]
+    if truncated:
+        body.append(f"... first {MAX_PDF_ROWS:,} rows only; export as CSV for all of them.")
+    pages = [body[start:start + lines] for start in range(0, len(body), lines)] or [[]]
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>", None, "<< /Type /Font /Subtype /Type1 /BaseFont /Courier >>"]
+    page_ids = []
+    for number, page in enumerate(pages, 1):
+        text = [f"BT /F1 {size + 3} Tf 30 {page_height - 30} Td ({_pdf_text(title)}) Tj ET"]
+        text += [
+            f"BT /F1 {size} Tf 30 {page_height - 50 - index * (size + 1)} Td ({_pdf_text(content)}) Tj ET"
+            for index, content in enumerate(page)
+        ]
+        text.append(f"BT /F1 {size} Tf {page_width - 90} 20 Td (Page {number} of {len(pages)}) Tj ET")
+        stream = "\n".join(text).encode('latin-1')
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream.decode('latin-1')}\nendstream")
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {page_width} {page_height}] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {len(objects)} 0 R >>"
+        )
+        page_ids.append(len(objects))
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(f'{id_} 0 R' for id_ in page_ids)}] /Count {len(page_ids)} >>"
+    with open(destination, 'wb') as handle:
+        handle.write(b"%PDF-1.4\n")
+        offsets = []
+        for number, content in enumerate(objects, 1):
+            offsets.append(handle.tell())
+            handle.write(f"{number} 0 obj\n{content}\nendobj\n".encode('latin-1'))
+        xref = handle.tell()
+        handle.write(f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode('latin-1'))
+        handle.write("".join(f"{offset:010d} 00000 n \n" for offset in offsets).encode('latin-1'))
+        handle.write(
+            f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode('latin-1')
+        )
+
+
+WRITERS = {'csv': _write_csv, 'xlsx': _write_excel, 'pdf': _write_pdf}
+
+
+# --- Worker ---
+
+def _save_progress(path, done, total, message):
+    temporary = f"{path}.tmp"
+    with open(temporary, 'w', encoding='utf-8') as handle:
+        json.dump({'done': done, 'total': total, 'message': message}, handle)
+    os.replace(temporary, path)
+
+
+def run_report(kind, db_path, destination, fmt, params, progress_path):
+    """Builds one report file and returns its row count and title; runs in the worker process."""
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    try:
+        # One read transaction: the whole report sees one consistent snapshot.
+        conn.execute("BEGIN")
+        title, columns, total, chunks = SOURCES[kind](conn, params)
+        state = {'done': 0, 'saved': 0.0}
+
+        def progress(rows):
+            state['done'] += rows
+            if time.monotonic() - state['saved'] > 0.2:
+                state['saved'] = time.monotonic()
+                _save_progress(progress_path, state['done'], total, f"{state['done']:,} of {total:,} rows")
+
+        _save_progress(progress_path, 0, total, f"0 of {total:,} rows")
+        WRITERS[fmt](chunks, destination, title, columns, progress)
+        conn.execute("COMMIT")
+    finally:
+        conn.close()
+    _save_progress(progress_path, total, total, "Done")
+    return {'rows': total, 'title': title}
+
+
+def _run_worker(kind, db_path, destination, fmt, params, progress_path):
+    """Runs `run_report` in a fresh Python process; raises RuntimeError with its error if it fails."""
+    job = {
+        'kind': kind, 'db_path': db_path, 'destination': destination,
+        'fmt': fmt, 'params': params, 'progress_path': progress_path,
+    }
+    finished = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), json.dumps(job)], capture_output=True, text=True,
+    )
+    if finished.returncode:
+        lines = finished.stderr.strip().splitlines()
+        raise RuntimeError(lines[-1] if lines else f"worker exited with status {finished.returncode}")
+    return json.loads(finished.stdout.strip().splitlines()[-1])
+
+
+# --- Jobs ---
+
+class Job:
+    """One submitted report: what was asked for, where it goes and its future."""
+
+    def __init__(self, kind, fmt, params, path, future):
+        self.id = uuid.uuid4().hex[:8]
+        self.kind = kind
+        self.fmt = fmt
+        self.params = params
+        self.path = path
+        self.future = future
+        self.submitted = datetime.now()
+
+    @property
+    def label(self):
+        return REPORTS[self.kind]
+
+    @property
+    def file_name(self):
+        return os.path.basename(self.path)
+
+    @property
+    def mime(self):
+        return FORMATS[self.fmt][1]
+
+    @property
+    def status(self):
+        if self.future.running():
+            return 'running'
+        if not self.future.done():
+            return 'queued'
+        return 'failed' if self.future.exception() is not None else 'done'
+
+    @property
+    def error(self):
+        if self.future.done() and self.future.exception() is not None:
+            return str(self.future.exception())
+        return None
+
+    def progress(self):
+        """(fraction done, message) as last reported by the worker."""
+        if self.status == 'done':
+            return 1.0, f"{self.future.result()['rows']:,} rows"
+        try:
+            with open(f"{self.path}.progress", encoding='utf-8') as handle:
+                state = json.load(handle)
+        except (OSError, ValueError):
+            return 0.0, "Waiting for a worker" if self.status == 'queued' else "Starting"
+        return (state['done'] / state['total'] if state['total'] else 0.0), state['message']
+
+    def read(self):
+        with open(self.path, 'rb') as handle:
+            return handle.read()
+
+
+class ReportJobs:
+    """Runs report jobs in worker processes, REPORT_WORKERS at a time, and keeps the most recent ones."""
+
+    def __init__(self, db_path, directory=None, workers=REPORT_WORKERS):
+        self.db_path = db_path
+        self.directory = directory or f"{os.path.splitext(db_path)[0]}_reports"
+        os.makedirs(self.directory, exist_ok=True)
+        # Each thread waits on one worker process at a time.
+        self._pool = ThreadPoolExecutor(workers, thread_name_prefix='report-job')
+        self._jobs = []
+        self._lock = threading.Lock()
+
+    def submit(self, kind, fmt='csv', **params):
+        """Queues a report; `params` are start/end for exports and as_of for the valuation."""
+        if kind not in REPORTS:
+            raise ValueError(f"Unknown report '{kind}'")
+        if fmt not in FORMATS:
+            raise ValueError(f"Unsupported format '{fmt}'. Use one of: {', '.join(FORMATS)}.")
+        if fmt == 'xlsx':
+            _excel_engine()
+        params = {name: str(value) if isinstance(value, date) else value for name, value in params.items()}
+        stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+        path = os.path.join(self.directory, f"{kind}-{stamp}-{uuid.uuid4().hex[:6]}{FORMATS[fmt][0]}")
+        with metrics.timed('operation', 'report_jobs.submit'):
+            future = self._pool.submit(_run_worker, kind, self.db_path, path, fmt, params, f"{path}.progress")
+        job = Job(kind, fmt, params, path, future)
+        with self._lock:
+            self._jobs.insert(0, job)
+            for old in self._jobs[MAX_JOBS:]:
+                if old.future.done():
+                    self._jobs.remove(old)
+                    for stale in (old.path, f"{old.path}.progress"):
+                        if os.path.exists(stale):
+                            os.remove(stale)
+        return job
+
+    def jobs(self):
+        """Submitted jobs, newest first."""
+        with self._lock:
+            return list(self._jobs)
+
+    def busy(self):
+        return any(job.status in ('queued', 'running') for job in self.jobs())
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+
+if __name__ == '__main__':
+    job = json.loads(sys.argv[1])
+    json.dump(run_report(**job), sys.stdout)
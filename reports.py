@@ -0,0 +1,43 @@
+"""Order-line reports for MSME360.
+
+Line items live in the typed `order_lines` table, so per-product and
+per-supplier figures are vectorized joins and groupbys rather than loops
+over nested lists.
+"""
+
+import metrics
+
+
+@metrics.timed_operation('reports.line_items')
+def line_items(order_lines, inventory, order_type):
+    """Returns the lines of one order type with product names and line totals."""
+    lines = order_lines[(order_lines['Order Type'] == order_type).to_numpy()]
+    items = lines.merge(inventory[['Product ID', 'Product Name']], on='Product ID', how='left')
+    items['Line Total'] = items['Quantity'].to_numpy().astype('float64') * items['Unit Price'].to_numpy()
+    return items[['Order ID', 'Product ID', 'Product Name', 'Quantity', 'Unit Price', 'Line Total']]
+
+
+@metrics.timed_operation('reports.by_product')
+def by_product(order_lines, inventory, order_type):
+    """Units and amount per product for one order type, largest amount first."""
+    items = line_items(order_lines, inventory, order_type)
+    totals = items.groupby(['Product ID', 'Product Name'], observed=True, dropna=False).agg(
+        **{'Units': ('Quantity', 'sum'), 'Amount': ('Line Total', 'sum')}
+    )
+    return totals.reset_index().sort_values('Amount', ascending=False, ignore_index=True)
+
+
+@metrics.timed_operation('reports.purchases_by_supplier')
+def purchases_by_supplier(order_lines, purchase_orders):
+    """Orders, units and amount bought from each supplier, largest amount first."""
+    lines = order_lines[(order_lines['Order Type'] == 'purchase').to_numpy()]
+    merged = lines.merge(purchase_orders[['Order ID', 'Supplier Name']], on='Order ID')
+    merged['Line Total'] = merged['Quantity'].to_numpy().astype('float64') * merged['Unit Price'].to_numpy()
+    totals = merged.groupby('Supplier Name', observed=True).agg(
+        **{
+            'Orders': ('Order ID', 'nunique'),
+            'Units': ('Quantity', 'sum'),
+            'Amount': ('Line Total', 'sum'),
+        }
+    )
+    return totals.reset_index().sort_values('Amount', ascending=False, ignore_index=True)
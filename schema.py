@@ -0,0 +1,142 @@
+"""Declared column types for every MSME360 table.
+
+Rows are checked against these types before they are written, and the
+in-memory tables store each column in its declared compact dtype, so pages
+never have to convert columns with `pd.to_datetime` or `pd.to_numeric`.
+"""
+
+from datetime import datetime
+
+import numpy as np
+
+# Column kinds. CATEGORY columns are dictionary-encoded in memory (int32 codes
+# plus one copy of each distinct value), for low-cardinality values only; TEXT
+# columns hold free-form strings and IDs that are mostly unique.
+CATEGORY = 'category'
+TEXT = 'text'
+DATE = 'date'
+QUANTITY = 'quantity'
+AMOUNT = 'amount'
+
+# In-memory dtype of each column kind.
+DTYPES = {
+    CATEGORY: CATEGORY,
+    TEXT: object,
+    DATE: 'datetime64[s]',
+    QUANTITY: 'int32',
+    AMOUNT: 'float64',
+}
+
+DATE_FORMAT = "%Y-%m-%d"
+
+INT32_MIN, INT32_MAX = np.iinfo(np.int32).min, np.iinfo(np.int32).max
+
+TABLE_SCHEMAS = {
+    'inventory': {
+        'Product ID': CATEGORY,
+        'Product Name': CATEGORY,
+        'Description': TEXT,
+        'Unit Price': AMOUNT,
+        'Current Stock Quantity': QUANTITY,
+        'Reorder Level': QUANTITY,
+    },
+    'sales_orders': {
+        'Order ID': TEXT,
+        'Date': DATE,
+        'Customer Name': CATEGORY,
+        'Total Amount': AMOUNT,
+    },
+    'purchase_orders': {
+        'Order ID': TEXT,
+        'Date': DATE,
+        'Supplier Name': CATEGORY,
+        'Total Amount': AMOUNT,
+    },
+    'customers': {
+        'Customer ID': CATEGORY,
+        'Name': CATEGORY,
+        'Contact Person': TEXT,
+        'Email': TEXT,
+        'Phone': TEXT,
+        'Address': TEXT,
+    },
+    'suppliers': {
+        'Supplier ID': CATEGORY,
+        'Name': CATEGORY,
+        'Contact Person': TEXT,
+        'Email': TEXT,
+        'Phone': TEXT,
+        'Address': TEXT,
+    },
+    'order_lines': {
+        # Nearly every write brings new Order IDs, so they are not worth a dictionary.
+        'Order ID': TEXT,
+        'Order Type': CATEGORY,
+        'Product ID': CATEGORY,
+        'Quantity': QUANTITY,
+        'Unit Price': AMOUNT,
+    },
+    'locations': {
+        'Location ID': CATEGORY,
+        'Name': CATEGORY,
+        'Kind': CATEGORY,
+        'Address': TEXT,
+    },
+    'sales_history': {
+        'Date': DATE,
+        'Product ID': CATEGORY,
+        'Product Name': CATEGORY,
+        'Quantity': QUANTITY,
+        'Total Sale': AMOUNT,
+    },
+}
+
+
+class SchemaError(ValueError):
+    """Raised when a value cannot be stored in its declared column type."""
+
+
+def dtypes(table):
+    """Returns the in-memory dtype of each column of a table."""
+    return {column: DTYPES[kind] for column, kind in TABLE_SCHEMAS[table].items()}
+
+
+def _coerce(kind, value):
+    if kind in (CATEGORY, TEXT):
+        return '' if value is None else str(value)
+    if kind == DATE:
+        if isinstance(value, datetime):
+            return value.strftime(DATE_FORMAT)
+        return datetime.strptime(str(value)[:10], DATE_FORMAT).strftime(DATE_FORMAT)
+    if kind == QUANTITY:
+        number = float(value) if isinstance(value, str) else value
+        if number != int(number) or not INT32_MIN <= int(number) <= INT32_MAX:
+            raise ValueError(f"{value!r} is not a 32-bit whole number")
+        return int(number)
+    if kind == AMOUNT:
+        number = float(value)
+        if not np.isfinite(number):
+            raise ValueError(f"{value!r} is not a finite amount")
+        return number
+    raise ValueError(f"unknown column kind {kind!r}")
+
+
+def coerce_row(table, row):
+    """Returns a copy of `row` with every value converted to its declared type.
+
+    Dates are normalised to "YYYY-MM-DD" strings, the form stored in SQLite.
+    Raises SchemaError naming the offending column.
+    """
+    coerced = {}
+    for column, kind in TABLE_SCHEMAS[table].items():
+        if column not in row:
+            raise SchemaError(f"{table}: missing column '{column}'")
+        try:
+            coerced[column] = _coerce(kind, row[column])
+        except (TypeError, ValueError, OverflowError) as e:
+            raise SchemaError(f"{table}: invalid value for '{column}': {e}") from e
+    return coerced
+
+
+def coerce_rows(table, rows):
+    return [coerce_row(table, row) for row in rows]
@@ -0,0 +1,232 @@
+"""In-memory trigram and prefix search over a few text columns of a table.
+
+The customer, supplier and product pickers query these indexes instead of
+sending every name to the browser. Each row's fields are casefolded, encoded
+as UTF-8 and indexed under every three-byte substring (for substring search)
+and under the first one and two bytes of every word (for short prefixes).
+
+Keys are built with NumPy over a whole batch of rows at once and stored as
+sorted key arrays with int32 row postings (CSR). Rows appended later form
+small segments that are merged pairwise as they grow, so adding a row costs
+amortized O(log n) and a query intersects a few posting slices, then checks
+only the rows that survive against the query text.
+"""
+
+import re
+import threading
+
+import numpy as np
+import pandas as pd
+
+# Candidates checked against the query before ranking; a very broad query
+# (one letter on a large table) ranks the first ones it finds.
+MAX_CANDIDATES = 5000
+
+# Batches at least this large build their text with pandas string ops.
+VECTORIZED_ROWS = 256
+
+WORD = re.compile(r'\w+')
+
+# Byte values that never occur in indexed text: the field and row separators
+# and the marker of word-prefix keys.
+FIELD_END = 0
+ROW_END = 2
+PREFIX = 1
+
+
+def _normalize(value):
+    return str(value).casefold()
+
+
+def _clean(text):
+    return re.sub('[\x00-\x02]', '', text)
+
+
+def _is_word(data):
+    """Word bytes: ASCII letters, digits and '_', plus every byte of a multi-byte character."""
+    return (
+        ((data >= ord('0')) & (data <= ord('9')))
+        | ((data >= ord('a')) & (data <= ord('z')))
+        | ((data >= ord('A')) & (data <= ord('Z')))
+        | (data == ord('_'))
+        | (data >= 0x80)
+    )
+
+
+def _byte_keys(data):
+    """Returns (keys, positions): every trigram and word-prefix key of a byte array.
+
+    `positions` is the index of the first byte of each key in `data`.
+    """
+    data = data.astype(np.int64)
+    separator = (data == FIELD_END) | (data == ROW_END)
+    trigram_positions = np.flatnonzero(~(separator[:-2] | separator[1:-1] | separator[2:]))
+    trigrams = (
+        (data[trigram_positions] << 16) | (data[trigram_positions + 1] << 8) | data[trigram_positions + 2]
+    )
+    word = _is_word(data)
+    starts = np.flatnonzero(word & ~np.concatenate(([False], word[:-1])))
+    following = np.where(
+        starts + 1 < len(data), data[np.minimum(starts + 1, len(data) - 1)], 0
+    ) * word[np.minimum(starts + 1, len(data) - 1)]
+    first = (PREFIX << 16) | (data[starts] << 8)
+    return (
+        np.concatenate((trigrams, first, first | following)),
+        np.concatenate((trigram_positions, starts, starts)),
+    )
+
+
+def _query_keys(query):
+    """Index keys a matching row must have, or None if the query cannot match."""
+    data = np.frombuffer(_clean(query).encode('utf-8'), dtype=np.uint8).astype(np.int64)
+    if len(data) >= 3:
+        keys, _ = _byte_keys(data)
+        return np.unique(keys[:len(data) - 2])
+    if not _is_word(data).all():
+        # Short queries go through the word-prefix keys, which only cover word bytes.
+        return None
+    key = (PREFIX << 16) | (data[0] << 8)
+    return np.array([key | data[1] if len(data) == 2 else key])
+
+
+class _Segment:
+    """Postings for a contiguous range of rows: sorted unique keys, offsets, row positions."""
+
+    def __init__(self, keys, rows):
+        # Keys fit in 25 bits and rows in 32, so one int64 sort orders by key, then row.
+        pairs = np.sort((keys.astype(np.int64) << 32) | rows.astype(np.int64))
+        if len(pairs):
+            pairs = pairs[np.concatenate(([True], pairs[1:] != pairs[:-1]))]
+        keys = pairs >> 32
+        starts = np.flatnonzero(np.concatenate(([True], keys[1:] != keys[:-1]))) if len(keys) else keys
+        self.keys = keys[starts]
+        self.offsets = np.append(starts, len(keys)).astype(np.int64)
+        self.rows = (pairs & 0xFFFFFFFF).astype(np.int32)
+
+    def __len__(self):
+        return len(self.rows)
+
+    def postings(self, key):
+        i = np.searchsorted(self.keys, key)
+        if i == len(self.keys) or self.keys[i] != key:
+            return self.rows[:0]
+        return self.rows[self.offsets[i]:self.offsets[i + 1]]
+
+    def pairs(self):
+        return np.repeat(self.keys, np.diff(self.offsets)), self.rows
+
+
+def _merge(older, newer):
+    older_keys, older_rows = older.pairs()
+    newer_keys, newer_rows = newer.pairs()
+    return _Segment(np.concatenate((older_keys, newer_keys)), np.concatenate((older_rows, newer_rows)))
+
+
+class SearchIndex:
+    """Search-as-you-type index over `fields` of a table, keyed by row position.
+
+    The first field is the label returned to pickers. Rows are added in the
+    order they are appended to the table.
+    """
+
+    def __init__(self, fields):
+        self.fields = list(fields)
+        self._rows = []
+        self._segments = []
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._rows)
+
+    @property
+    def nbytes(self):
+        return sum(
+            segment.keys.nbytes + segment.offsets.nbytes + segment.rows.nbytes for segment in self._segments
+        )
+
+    def add_rows(self, columns):
+        """Indexes new rows given as a dict (or DataFrame) of equal-length field columns."""
+        rows = list(zip(*(columns[field] for field in self.fields)))
+        if not rows:
+            return
+        # Fields are joined by FIELD_END and rows by ROW_END.
+        if len(rows) >= VECTORIZED_ROWS:
+            text = None
+            for field in self.fields:
+                values = pd.Series(columns[field], dtype=str).str.casefold().str.replace('[\x00-\x02]', '', regex=True)
+                text = values if text is None else text + '\x00' + values
+            text = text.str.cat(sep='\x02') + '\x02'
+        else:
+            text = ''.join('\x00'.join(_clean(_normalize(value)) for value in row) + '\x02' for row in rows)
+        data = np.frombuffer(text.encode('utf-8'), dtype=np.uint8)
+        with self._lock:
+            first_row = len(self._rows)
+            keys, positions = _byte_keys(data)
+            row_of_byte = first_row + np.cumsum(data == ROW_END) - (data == ROW_END)
+            segments = self._segments + [_Segment(keys, row_of_byte[positions])]
+            # Merge while the newest segment is at least half the size of the one before.
+            while len(segments) > 1 and 2 * len(segments[-1]) >= len(segments[-2]):
+                segments[-2:] = [_merge(segments[-2], segments[-1])]
+            self._rows.extend(rows)
+            self._segments = segments
+
+    def _candidates(self, keys):
+        """Row positions holding every key, ascending; narrows on the rarest keys first."""
+        segments = self._segments
+        postings = []
+        for key in keys.tolist():
+            rows = [segment.postings(key) for segment in segments]
+            rows = np.concatenate(rows) if len(rows) > 1 else rows[0] if rows else np.empty(0, np.int32)
+            if not len(rows):
+                return rows
+            postings.append(rows)
+        postings.sort(key=len)
+        candidates = postings[0]
+        for other in postings[1:]:
+            if len(candidates) <= MAX_CANDIDATES // 10:
+                break
+            candidates = np.intersect1d(candidates, other, assume_unique=True)
+        return candidates
+
+    def _rank(self, row, query):
+        """0: a field equals the query, 1: a field starts with it, 2: a word does, 3: it appears inside."""
+        best = None
+        for value in row:
+            text = _normalize(value)
+            if query not in text:
+                continue
+            if text == query:
+                return 0
+            if text.startswith(query):
+                rank = 1
+            elif any(word.startswith(query) for word in WORD.findall(text)):
+                rank = 2
+            else:
+                rank = 3
+            best = rank if best is None else min(best, rank)
+        return best
+
+    def search(self, query, limit=20):
+        """Returns the positions of the best `limit` rows matching `query`.
+
+        An empty query returns the first rows. Matches rank by how they hit
+        (whole field, field prefix, word prefix, substring), then by label.
+        """
+        query = _normalize(query).strip()
+        if not query:
+            return list(range(min(limit, len(self._rows))))
+        keys = _query_keys(query)
+        if keys is None:
+            return []
+        ranked = []
+        for position in self._candidates(keys)[:MAX_CANDIDATES].tolist():
+            row = self._rows[position]
+            rank = self._rank(row, query)
+            if rank is not None:
+                ranked.append((rank, _normalize(row[0]), position))
+        ranked.sort()
+        return [position for _, _, position in ranked[:limit]]
+
+    def labels(self, positions):
+        """The first field of each row position, as picker labels."""
+        return [self._rows[position][0] for position in positions]
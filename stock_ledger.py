@@ -0,0 +1,227 @@
+"""Append-only stock movement ledger for MSME360.
+
+Every change to a product's stock (opening balance, receipt, dispatch, sale,
+purchase, transfer between locations) is appended to `stock_movements` in
+the same transaction as the change itself, with a timestamp, a reason, the
+location it happened at and the order or transfer it belongs to. Rows
+are never updated or deleted, so the ledger is an audit trail from which the
+stock of any product at any past moment can be rebuilt. The inventory's stock
+column stays the materialized current level, so loading current stock needs
+no replay at all. A transfer is two movements that cancel out, so the
+consolidated stock of a product never depends on where it is held.
+
+Replaying from the first movement would make old questions cost more as the
+ledger grows, so the stock of every product is periodically compacted into a
+snapshot. "Stock as of X" reads the last snapshot taken at or before X and
+replays only the movements between the two, never more than one snapshot
+interval.
+
+Functions take an open SQLite connection; writers call them inside the
+caller's transaction.
+"""
+
+from datetime import date, datetime
+
+import pandas as pd
+
+# Least number of movements between snapshots. The interval is also at least
+# the number of products in the last snapshot, so snapshots never take more
+# space than the movements they compact.
+SNAPSHOT_MOVEMENTS = 10_000
+
+# Why stock moved; sales, dispatches and transfers out are negative quantities.
+REASONS = ('opening', 'receipt', 'dispatch', 'sale', 'purchase', 'transfer')
+
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS stock_movements (
+    movement_id INTEGER PRIMARY KEY,
+    moved_at TEXT NOT NULL,
+    product_id TEXT NOT NULL,
+    quantity INTEGER NOT NULL,
+    reason TEXT NOT NULL,
+    reference TEXT NOT NULL DEFAULT '',
+    location_id TEXT NOT NULL DEFAULT ''
+);
+CREATE INDEX IF NOT EXISTS idx_stock_movements_time ON stock_movements (moved_at);
+CREATE INDEX IF NOT EXISTS idx_stock_movements_product ON stock_movements (product_id);
+CREATE TABLE IF NOT EXISTS stock_snapshot_log (
+    last_movement INTEGER PRIMARY KEY,
+    taken_at TEXT NOT NULL,
+    products INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS stock_snapshots (
+    last_movement INTEGER NOT NULL,
+    product_id TEXT NOT NULL,
+    stock_quantity INTEGER NOT NULL,
+    PRIMARY KEY (last_movement, product_id)
+) WITHOUT ROWID;
+"""
+
+COLUMNS = {
+    'Movement ID': 'movement_id',
+    'Time': 'moved_at',
+    'Product ID': 'product_id',
+    'Quantity': 'quantity',
+    'Reason': 'reason',
+    'Reference': 'reference',
+    'Location ID': 'location_id',
+}
+
+
+def moment(value):
+    """Ledger timestamp for a datetime, a date or a string; a bare date means the end of that day."""
+    if isinstance(value, datetime):
+        return value.strftime(TIME_FORMAT)
+    if isinstance(value, date) or len(str(value).strip()) <= 10:
+        return f"{pd.Timestamp(value).strftime('%Y-%m-%d')} 23:59:59"
+    return pd.Timestamp(value).strftime(TIME_FORMAT)
+
+
+def record(conn, reason, quantities, reference="", location_id=""):
+    """Appends one movement per {product_id: signed quantity} entry, then snapshots if one is due.
+
+    Zero quantities are skipped. The timestamp is read inside the caller's
+    write transaction, so ledger order and time order agree.
+    """
+    record_batch(conn, reason, [(reference, quantities)], location_id)
+
+
+def record_batch(conn, reason, entries, location_id=""):
+    """Appends the movements of many (reference, quantities) entries at once, as `record` does for one."""
+    moved_at = datetime.now().strftime(TIME_FORMAT)
+    conn.executemany(
+        "INSERT INTO stock_movements (moved_at, product_id, quantity, reason, reference, location_id) "
+        "VALUES (?, ?, ?, ?, ?, ?)",
+        [
+            (moved_at, product_id, quantity, reason, reference, location_id)
+            for reference, quantities in entries
+            for product_id, quantity in quantities.items() if quantity
+        ],
+    )
+    snapshot_if_due(conn)
+
+
+def _last_snapshot(conn, at_most=None):
+    """(last movement, product count) of the newest snapshot, optionally at or before a movement.
+
+    Movement 0 stands for the empty snapshot before the first movement.
+    """
+    query = "SELECT last_movement, products FROM stock_snapshot_log"
+    params = ()
+    if at_most is not None:
+        query, params = query + " WHERE last_movement <= ?", (at_most,)
+    row = conn.execute(query + " ORDER BY last_movement DESC LIMIT 1", params).fetchone()
+    return (0, 0) if row is None else row
+
+
+def _last_movement(conn):
+    return conn.execute("SELECT COALESCE(MAX(movement_id), 0) FROM stock_movements").fetchone()[0]
+
+
+def snapshot_if_due(conn):
+    """Takes a snapshot once enough movements have been appended since the last one."""
+    previous, products = _last_snapshot(conn)
+    if _last_movement(conn) - previous >= max(SNAPSHOT_MOVEMENTS, products):
+        take_snapshot(conn)
+
+
+def take_snapshot(conn):
+    """Compacts the last snapshot and the movements after it into a new snapshot.
+
+    Products with zero stock are left out. Returns the last movement the snapshot covers.
+    """
+    previous, _ = _last_snapshot(conn)
+    last = _last_movement(conn)
+    if last == previous:
+        return last
+    conn.execute(
+        "INSERT INTO stock_snapshots (last_movement, product_id, stock_quantity) "
+        f"SELECT ?, product_id, SUM(quantity) FROM ({_replay_sql()}) "
+        "GROUP BY product_id HAVING SUM(quantity) != 0",
+        (last, previous, previous, last),
+    )
+    (products,) = conn.execute(
+        "SELECT COUNT(*) FROM stock_snapshots WHERE last_movement = ?", (last,)
+    ).fetchone()
+    (taken_at,) = conn.execute(
+        "SELECT moved_at FROM stock_movements WHERE movement_id = ?", (last,)
+    ).fetchone()
+    conn.execute("INSERT INTO stock_snapshot_log VALUES (?, ?, ?)", (last, taken_at, products))
+    return last
+
+
+def _replay_sql(product_filter=""):
+    """Snapshot rows plus the movements after it; parameters: snapshot, snapshot, last movement."""
+    return (
+        f"SELECT product_id, stock_quantity AS quantity FROM stock_snapshots "
+        f"WHERE last_movement = ? {product_filter} "
+        f"UNION ALL SELECT product_id, quantity FROM stock_movements "
+        f"WHERE movement_id > ? AND movement_id <= ? {product_filter}"
+    )
+
+
+def stock_as_of(conn, when, product_id=None):
+    """Stock per product after the last movement at or before `when`, as {product_id: quantity}.
+
+    Reads the nearest earlier snapshot and replays at most one snapshot
+    interval of movements. Products without stock at that moment are left out.
+    """
+    row = conn.execute(
+        "SELECT movement_id FROM stock_movements WHERE moved_at <= ? "
+        "ORDER BY moved_at DESC, movement_id DESC LIMIT 1",
+        (moment(when),),
+    ).fetchone()
+    if row is None:
+        return {}
+    last = row[0]
+    snapshot, _ = _last_snapshot(conn, last)
+    if product_id is None:
+        params = (snapshot, snapshot, last)
+        product_filter = ""
+    else:
+        params = (snapshot, product_id, snapshot, last, product_id)
+        product_filter = "AND product_id = ?"
+    return dict(conn.execute(
+        f"SELECT product_id, SUM(quantity) FROM ({_replay_sql(product_filter)}) "
+        "GROUP BY product_id HAVING SUM(quantity) != 0",
+        params,
+    ).fetchall())
+
+
+def movements(conn, product_id=None, start=None, end=None, limit=1000, location_id=None):
+    """The newest `limit` movements between `start` and `end`, optionally of one product or location."""
+    where, params = [], []
+    if product_id is not None:
+        where.append("product_id = ?")
+        params.append(product_id)
+    if location_id is not None:
+        where.append("location_id = ?")
+        params.append(location_id)
+    if start is not None:
+        where.append("moved_at >= ?")
+        params.append(f"{pd.Timestamp(start).strftime('%Y-%m-%d')} 00:00:00")
+    if end is not None:
+        where.append("moved_at <= ?")
+        params.append(moment(end))
+    rows = conn.execute(
+        f"SELECT {', '.join(COLUMNS.values())} FROM stock_movements "
+        f"{'WHERE ' + ' AND '.join(where) if where else ''} ORDER BY movement_id DESC LIMIT ?",
+        params + [limit],
+    ).fetchall()
+    return pd.DataFrame.from_records(rows, columns=list(COLUMNS))
+
+
+def discrepancies(conn):
+    """Products whose stored stock differs from the ledger's current balance, for audits."""
+    ledger = stock_as_of(conn, datetime.max.replace(microsecond=0))
+    rows = conn.execute("SELECT product_id, stock_quantity FROM inventory").fetchall()
+    return pd.DataFrame.from_records(
+        [
+            (product_id, stock, ledger.get(product_id, 0))
+            for product_id, stock in rows
+            if stock != ledger.get(product_id, 0)
+        ],
+        columns=['Product ID', 'Stock', 'Ledger Stock'],
+    )
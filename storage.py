@@ -0,0 +1,1316 @@
+"""SQLite storage layer for MSME360.
+
+Every table lives in one SQLite database so data survives restarts, lookups
+go through indexes, and each form submit is a single transaction instead of a
+`pd.concat` over the whole frame. The database is shared by every session
+and server process; a change sequence in the `meta` table lets each process
+notice commits made elsewhere and refresh its in-memory mirror.
+
+Stock is held per location (godowns and shops) in `location_stock`, one row
+per location and product. A write at one site updates only that site's rows
+plus the product's consolidated total in `inventory`, so the work per write
+stays the same however many sites there are, and consolidated stock is read
+without summing over locations.
+"""
+
+import json
+import os
+import queue
+import sqlite3
+import threading
+import uuid
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+import metrics
+import stock_ledger
+from aggregates import DashboardAggregates, bucket_start
+from columnar import ColumnarTable
+from history_store import HistoryPartitions, month_of, next_month
+from search_index import SearchIndex
+from view_cache import ViewCache
+from schema import DATE_FORMAT, coerce_row, coerce_rows, dtypes
+
+DB_PATH = os.environ.get('MSME360_DB', 'msme360.db')
+
+# Display column name -> SQL column name, in display order.
+TABLES = {
+    'inventory': {
+        'Product ID': 'product_id',
+        'Product Name': 'product_name',
+        'Description': 'description',
+        'Unit Price': 'unit_price',
+        'Current Stock Quantity': 'stock_quantity',
+        'Reorder Level': 'reorder_level',
+    },
+    'sales_orders': {
+        'Order ID': 'order_id',
+        'Date': 'date',
+        'Customer Name': 'customer_name',
+        'Total Amount': 'total_amount',
+    },
+    'purchase_orders': {
+        'Order ID': 'order_id',
+        'Date': 'date',
+        'Supplier Name': 'supplier_name',
+        'Total Amount': 'total_amount',
+    },
+    'customers': {
+        'Customer ID': 'customer_id',
+        'Name': 'name',
+        'Contact Person': 'contact_person',
+        'Email': 'email',
+        'Phone': 'phone',
+        'Address': 'address',
+    },
+    'suppliers': {
+        'Supplier ID': 'supplier_id',
+        'Name': 'name',
+        'Contact Person': 'contact_person',
+        'Email': 'email',
+        'Phone': 'phone',
+        'Address': 'address',
+    },
+    'order_lines': {
+        'Order ID': 'order_id',
+        'Order Type': 'order_type',
+        'Product ID': 'product_id',
+        'Quantity': 'quantity',
+        'Unit Price': 'unit_price',
+    },
+    'locations': {
+        'Location ID': 'location_id',
+        'Name': 'name',
+        'Kind': 'kind',
+        'Address': 'address',
+    },
+    'sales_history': {
+        'Date': 'date',
+        'Product ID': 'product_id',
+        'Product Name': 'product_name',
+        'Quantity': 'quantity',
+        'Total Sale': 'total_sale',
+    },
+}
+
+# ID column and generate_unique_id prefix of each table that has one.
+ID_PREFIXES = {
+    'inventory': ('Product ID', 'PROD'),
+    'sales_orders': ('Order ID', 'SALE'),
+    'purchase_orders': ('Order ID', 'PURCH'),
+    'customers': ('Customer ID', 'CUST'),
+    'suppliers': ('Supplier ID', 'SUPPL'),
+    'locations': ('Location ID', 'LOC'),
+}
+
+# Location that stock is held at unless another is given; every database has
+# it, and stock recorded before locations existed was moved there.
+DEFAULT_LOCATION = 'LOC-MAIN'
+
+LOCATION_KINDS = ('Godown', 'Shop')
+
+# Largest number of bound parameters used in one IN (...) lookup.
+MAX_SQL_PARAMS = 900
+
+# Rows fetched per round trip when loading a table into memory at startup.
+LOAD_CHUNK_ROWS = 50_000
+
+# Fields each picker search matches; the first is the label it returns.
+SEARCH_FIELDS = {
+    'inventory': ['Product Name', 'Product ID'],
+    'customers': ['Name', 'Contact Person', 'Email', 'Phone'],
+    'suppliers': ['Name', 'Contact Person', 'Email', 'Phone'],
+}
+
+# Matches a picker search returns by default.
+SEARCH_LIMIT = 50
+
+# Seconds a writer waits for another session's transaction before giving up.
+BUSY_TIMEOUT = 30
+
+# Times a write is retried with fresh IDs when a generated ID is already taken.
+ID_ATTEMPTS = 5
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO meta (key, value) VALUES ('change_seq', 0);
+
+CREATE TABLE IF NOT EXISTS inventory (
+    product_id TEXT PRIMARY KEY,
+    product_name TEXT NOT NULL,
+    description TEXT NOT NULL DEFAULT '',
+    unit_price REAL NOT NULL,
+    stock_quantity INTEGER NOT NULL DEFAULT 0,
+    reorder_level INTEGER NOT NULL DEFAULT 0,
+    changed_seq INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_inventory_name ON inventory (product_name);
+
+CREATE TABLE IF NOT EXISTS sales_orders (
+    order_id TEXT PRIMARY KEY,
+    date TEXT NOT NULL,
+    customer_name TEXT NOT NULL,
+    total_amount REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_sales_orders_date ON sales_orders (date);
+CREATE INDEX IF NOT EXISTS idx_sales_orders_customer ON sales_orders (customer_name);
+
+CREATE TABLE IF NOT EXISTS purchase_orders (
+    order_id TEXT PRIMARY KEY,
+    date TEXT NOT NULL,
+    supplier_name TEXT NOT NULL,
+    total_amount REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_purchase_orders_date ON purchase_orders (date);
+CREATE INDEX IF NOT EXISTS idx_purchase_orders_supplier ON purchase_orders (supplier_name);
+
+CREATE TABLE IF NOT EXISTS order_lines (
+    order_id TEXT NOT NULL,
+    order_type TEXT NOT NULL,
+    product_id TEXT NOT NULL,
+    quantity INTEGER NOT NULL,
+    unit_price REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_order_lines_order ON order_lines (order_id);
+CREATE INDEX IF NOT EXISTS idx_order_lines_product ON order_lines (product_id);
+
+CREATE TABLE IF NOT EXISTS customers (
+    customer_id TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    contact_person TEXT NOT NULL DEFAULT '',
+    email TEXT NOT NULL DEFAULT '',
+    phone TEXT NOT NULL DEFAULT '',
+    address TEXT NOT NULL DEFAULT ''
+);
+CREATE INDEX IF NOT EXISTS idx_customers_name ON customers (name);
+
+CREATE TABLE IF NOT EXISTS suppliers (
+    supplier_id TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    contact_person TEXT NOT NULL DEFAULT '',
+    email TEXT NOT NULL DEFAULT '',
+    phone TEXT NOT NULL DEFAULT '',
+    address TEXT NOT NULL DEFAULT ''
+);
+CREATE INDEX IF NOT EXISTS idx_suppliers_name ON suppliers (name);
+
+CREATE TABLE IF NOT EXISTS locations (
+    location_id TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    kind TEXT NOT NULL DEFAULT 'Godown',
+    address TEXT NOT NULL DEFAULT ''
+);
+INSERT OR IGNORE INTO locations (location_id, name) VALUES ('LOC-MAIN', 'Main Store');
+
+CREATE TABLE IF NOT EXISTS location_stock (
+    location_id TEXT NOT NULL,
+    product_id TEXT NOT NULL,
+    stock_quantity INTEGER NOT NULL DEFAULT 0,
+    changed_seq INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (location_id, product_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_location_stock_changed ON location_stock (changed_seq);
+
+CREATE TABLE IF NOT EXISTS sales_history (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    date TEXT NOT NULL,
+    product_id TEXT NOT NULL,
+    product_name TEXT NOT NULL,
+    quantity INTEGER NOT NULL,
+    total_sale REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_sales_history_date ON sales_history (date);
+CREATE INDEX IF NOT EXISTS idx_sales_history_product ON sales_history (product_id);
+
+CREATE TABLE IF NOT EXISTS channel_orders (
+    order_ref TEXT PRIMARY KEY,
+    order_id TEXT NOT NULL
+) WITHOUT ROWID;
+"""
+
+
+def generate_unique_id(prefix):
+    """Generates a unique ID with a given prefix."""
+    return f"{prefix}-{str(uuid.uuid4())[:8]}"
+
+
+def today():
+    """Returns today's date in the format used by every table."""
+    return datetime.now().strftime(DATE_FORMAT)
+
+
+class InsufficientStockError(Exception):
+    """Raised when a sale asks for more units than are in stock."""
+
+    def __init__(self, product_name, requested, available):
+        self.product_name = product_name
+        self.requested = requested
+        self.available = available
+        super().__init__(
+            f"Cannot sell {requested} units of {product_name}. Only {available} available."
+        )
+
+
+class DuplicateOrderError(ValueError):
+    """Raised when a channel order reference has already been recorded."""
+
+    def __init__(self, order_refs):
+        self.order_refs = order_refs
+        super().__init__(f"Orders already imported: {', '.join(order_refs)}")
+
+
+class ProductIndex:
+    """Hash indexes over the inventory: Product ID -> row and Product Name -> Product ID.
+
+    Rows are positions in the repository's in-memory inventory table. When two
+    products share a name, the name resolves to the first one added.
+    """
+
+    def __init__(self, product_ids=(), product_names=()):
+        self.row_of_id = {}
+        self.id_of_name = {}
+        for product_id, product_name in zip(product_ids, product_names):
+            self.add(product_id, product_name)
+
+    def __len__(self):
+        return len(self.row_of_id)
+
+    def __contains__(self, product_id):
+        return product_id in self.row_of_id
+
+    def add(self, product_id, product_name):
+        self.row_of_id[product_id] = len(self.row_of_id)
+        self.id_of_name.setdefault(product_name, product_id)
+
+    def row(self, product_id):
+        return self.row_of_id.get(product_id)
+
+    def id_for_name(self, product_name):
+        return self.id_of_name.get(product_name)
+
+
+class Repository:
+    """Small repository API over the MSME360 SQLite database.
+
+    The database file is the one shared store: every Streamlit session, and
+    every server process opened on the same file, reads and writes it. Each
+    process keeps an in-memory mirror of the tables in ColumnarTables, which
+    is what the pages read; `refresh` brings the mirror up to date with
+    whatever any session or process has committed. The inventory is indexed
+    by a ProductIndex, so product lookups by ID or name never scan the table,
+    the dashboard metrics are kept as running DashboardAggregates, and views
+    derived from whole tables are cached until refresh changes those tables.
+
+    Writes are optimistic. Nothing is locked while a form is filled in; a sale
+    commits as one transaction in which each product's stock is decremented
+    only if the stored quantity still covers it, and a line that cannot be
+    filled rolls the whole order back. Sessions borrow their own connection
+    from a pool, so concurrent writers only queue on SQLite's short write
+    transaction rather than on a lock held across Python code.
+    """
+
+    def __init__(self, path=DB_PATH):
+        self.path = path
+        self.history = HistoryPartitions(f"{os.path.splitext(path)[0]}_history")
+        self._pool = queue.LifoQueue()
+        self._sync_lock = threading.Lock()
+        # Picker search indexes, built on first use and then kept current by refresh.
+        self._search = {}
+        # Bumped whenever refresh changes a table; derived views are cached against them.
+        self._versions = dict.fromkeys(list(TABLES) + ['location_stock'], 0)
+        self.views = ViewCache()
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+            conn.executescript(stock_ledger.SCHEMA)
+            self._migrate_products_column(conn)
+            self._migrate_change_tracking(conn)
+            self._migrate_locations(conn)
+            self._migrate_stock_ledger(conn)
+            # Sales history before this date lives in sealed monthly partitions.
+            self._hot_from = self._seal_history(conn)
+            # The change sequence and the last rowid of each table mark what the
+            # mirror holds; refresh pulls everything after them.
+            conn.execute("BEGIN")
+            try:
+                self._seq = _change_seq(conn)
+                self._marks = {
+                    table: conn.execute(f"SELECT COALESCE(MAX(rowid), 0) FROM {table}").fetchone()[0]
+                    for table in TABLES
+                }
+                daily_sales = self._daily_sales(conn)
+                sales_counts = self._sales_counts(conn)
+                location_stock = conn.execute(
+                    "SELECT location_id, product_id, stock_quantity FROM location_stock"
+                ).fetchall()
+            finally:
+                conn.execute("COMMIT")
+        # {location_id: {product_id: stock}}, the mirror of location_stock.
+        self._location_stock = {}
+        self._set_location_stock(location_stock)
+        self._tables = {table: self._load_table(table) for table in TABLES}
+        inventory = self._tables['inventory']
+        self.products = ProductIndex(inventory.column('Product ID'), inventory.column('Product Name'))
+        self.aggregates = DashboardAggregates.from_tables(self.inventory(), self.sales_orders(), daily_sales)
+        for name, (totals, daily) in sales_counts.items():
+            counters = getattr(self.aggregates, name)
+            if totals:
+                counters.add_totals(*zip(*totals))
+            if daily:
+                counters.add_days(*zip(*daily))
+
+    def close(self):
+        while not self._pool.empty():
+            self._pool.get_nowait().close()
+
+    def _open_connection(self):
+        # Autocommit mode: transactions are opened explicitly with BEGIN.
+        conn = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT, isolation_level=None, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    @contextmanager
+    def _connect(self):
+        """Borrows a connection from the pool, so concurrent sessions never share one."""
+        try:
+            conn = self._pool.get_nowait()
+        except queue.Empty:
+            conn = self._open_connection()
+        try:
+            yield conn
+        finally:
+            self._pool.put(conn)
+
+    @contextmanager
+    def _transaction(self):
+        """Runs one write transaction and yields (connection, change sequence number).
+
+        The transaction bumps the shared change sequence, which is how other
+        sessions and processes notice it; once it commits, the mirror is
+        refreshed.
+        """
+        with self._connect() as conn:
+            with _atomic(conn):
+                (seq,) = conn.execute(
+                    "UPDATE meta SET value = value + 1 WHERE key = 'change_seq' RETURNING value"
+                ).fetchall()[0]
+                yield conn, seq
+        self.refresh()
+
+    def _migrate_products_column(self, conn):
+        """Moves line items out of the legacy JSON 'products' column into order_lines."""
+        for table, order_type in (('sales_orders', 'sale'), ('purchase_orders', 'purchase')):
+            with _atomic(conn):
+                columns = [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]
+                if 'products' not in columns:
+                    continue
+                for order_id, products in conn.execute(
+                    f"SELECT order_id, products FROM {table}"
+                ).fetchall():
+                    _insert(conn, 'order_lines', _order_lines(order_id, order_type, json.loads(products)))
+                conn.execute(f"ALTER TABLE {table} DROP COLUMN products")
+
+    def _migrate_change_tracking(self, conn):
+        """Adds the inventory 'changed_seq' column to databases created before it existed."""
+        with _atomic(conn):
+            columns = [row[1] for row in conn.execute("PRAGMA table_info(inventory)")]
+            if 'changed_seq' not in columns:
+                conn.execute("ALTER TABLE inventory ADD COLUMN changed_seq INTEGER NOT NULL DEFAULT 0")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_inventory_changed ON inventory (changed_seq)")
+
+    def _migrate_locations(self, conn):
+        """Moves the stock of a database created before locations existed to the default location.
+
+        Also adds the ledger's location column, dating every earlier movement
+        at the default location.
+        """
+        with _atomic(conn):
+            columns = [row[1] for row in conn.execute("PRAGMA table_info(stock_movements)")]
+            if 'location_id' not in columns:
+                conn.execute(
+                    "ALTER TABLE stock_movements ADD COLUMN location_id TEXT NOT NULL "
+                    f"DEFAULT '{DEFAULT_LOCATION}'"
+                )
+            if conn.execute("SELECT 1 FROM location_stock LIMIT 1").fetchone() is None:
+                conn.execute(
+                    "INSERT INTO location_stock (location_id, product_id, stock_quantity) "
+                    "SELECT ?, product_id, stock_quantity FROM inventory WHERE stock_quantity != 0",
+                    (DEFAULT_LOCATION,),
+                )
+
+    def _migrate_stock_ledger(self, conn):
+        """Opens the stock ledger of a database created before it existed with each product's stock."""
+        with _atomic(conn):
+            if conn.execute("SELECT 1 FROM stock_movements LIMIT 1").fetchone() is None:
+                for location_id, quantities in _by_location(conn.execute(
+                    "SELECT location_id, product_id, stock_quantity FROM location_stock WHERE stock_quantity != 0"
+                ).fetchall()).items():
+                    stock_ledger.record(conn, 'opening', quantities, location_id=location_id)
+
+    def _seal_history(self, conn):
+        """Seals closed months of sales history into partitions; returns the first unsealed date.
+
+        Returns None when partitioning is unavailable, meaning all history is kept in memory.
+        """
+        if not self.history.available:
+            return None
+        hot_from = f"{month_of(today())}-01"
+        sealed = set(self.history.months())
+        for (month,) in conn.execute(
+            "SELECT DISTINCT substr(date, 1, 7) FROM sales_history WHERE date < ?", (hot_from,)
+        ).fetchall():
+            if month not in sealed:
+                self._seal_month(month)
+        return hot_from
+
+    def _seal_month(self, month):
+        frame = pd.concat(
+            self.iter_rows(
+                'sales_history', where="WHERE date >= ? AND date < ?",
+                params=(f"{month}-01", f"{next_month(month)}-01"),
+            ),
+            ignore_index=True,
+        )
+        self.history.seal(month, frame)
+
+    def _daily_sales(self, conn):
+        """Total sale per day over the history the mirror holds, aggregated inside SQLite."""
+        daily = pd.read_sql_query(
+            "SELECT date AS \"Date\", SUM(total_sale) AS \"Total Sale\" FROM sales_history "
+            "WHERE rowid <= ? GROUP BY date",
+            conn,
+            params=(self._marks['sales_history'],),
+        )
+        daily['Date'] = pd.to_datetime(daily['Date'])
+        return daily
+
+    def _sales_counts(self, conn):
+        """Per-product and per-customer sales, all time and per recent day, aggregated inside SQLite.
+
+        Returns {counter name: (total rows, daily rows)} to seed the aggregates' rolling counters.
+        """
+        since = bucket_start()
+        counts = {}
+        for name, table, key, count, amount in (
+            ('product_sales', 'sales_history', 'product_id', 'SUM(quantity)', 'SUM(total_sale)'),
+            ('customer_sales', 'sales_orders', 'customer_name', 'COUNT(*)', 'SUM(total_amount)'),
+        ):
+            mark = self._marks[table]
+            totals = conn.execute(
+                f"SELECT {key}, {count}, {amount} FROM {table} WHERE rowid <= ? GROUP BY {key}", (mark,)
+            ).fetchall()
+            daily = conn.execute(
+                f"SELECT date, {key}, {count}, {amount} FROM {table} "
+                f"WHERE rowid <= ? AND date >= ? GROUP BY date, {key}",
+                (mark, since),
+            ).fetchall()
+            counts[name] = (totals, daily)
+        return counts
+
+    @metrics.timed_operation('repository.load_table')
+    def _load_table(self, table):
+        """Loads a table from SQLite into a ColumnarTable, chunk by chunk, up to its mark."""
+        where, params = "WHERE rowid <= ?", (self._marks[table],)
+        if table == 'sales_history' and self._hot_from is not None:
+            where, params = where + " AND date >= ?", params + (self._hot_from,)
+        with self._connect() as conn:
+            (count,) = conn.execute(f"SELECT COUNT(*) FROM {table} {where}", params).fetchone()
+        loaded = ColumnarTable(dtypes(table), capacity=count)
+        for chunk in self.iter_rows(table, where=where, params=params):
+            loaded.extend(chunk)
+        return loaded
+
+    def iter_rows(self, table, chunk_rows=LOAD_CHUNK_ROWS, where="", params=()):
+        """Yields a table as stored in SQLite, as DataFrames of at most `chunk_rows` rows.
+
+        Columns carry their display names and dates are "YYYY-MM-DD" strings.
+        """
+        columns = TABLES[table]
+        # A dedicated connection reads a consistent WAL snapshot for the whole
+        # scan without keeping a pooled connection busy.
+        conn = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT)
+        try:
+            cursor = conn.execute(
+                f"SELECT {', '.join(columns.values())} FROM {table} {where} ORDER BY rowid", params
+            )
+            while True:
+                rows = cursor.fetchmany(chunk_rows)
+                if not rows:
+                    break
+                yield pd.DataFrame.from_records(rows, columns=list(columns))
+        finally:
+            conn.close()
+
+    # --- Shared state ---
+
+    @metrics.timed_operation('repository.refresh')
+    def refresh(self):
+        """Brings the in-memory mirror up to date with every committed change.
+
+        Picks up rows added and stock changed by any session or process since
+        the last refresh. When nothing changed this is a single indexed read,
+        so pages call it on every run.
+        """
+        with self._connect() as conn:
+            if _change_seq(conn) == self._seq:
+                return
+            with self._sync_lock:
+                conn.execute("BEGIN")
+                try:
+                    seq = _change_seq(conn)
+                    if seq == self._seq:
+                        return
+                    new_rows = {table: _rows_after(conn, table, self._marks[table]) for table in TABLES}
+                    stock = conn.execute(
+                        "SELECT product_id, stock_quantity FROM inventory WHERE changed_seq > ? AND rowid <= ?",
+                        (self._seq, self._marks['inventory']),
+                    ).fetchall()
+                    location_stock = conn.execute(
+                        "SELECT location_id, product_id, stock_quantity FROM location_stock WHERE changed_seq > ?",
+                        (self._seq,),
+                    ).fetchall()
+                finally:
+                    conn.execute("COMMIT")
+                self._set_stock(stock)
+                self._set_location_stock(location_stock)
+                for table, (frame, mark) in new_rows.items():
+                    if frame is not None:
+                        self._append(table, frame)
+                        self._marks[table] = mark
+                self._seq = seq
+
+    def _set_stock(self, stock):
+        """Mirrors committed (product_id, stock) pairs into the inventory and aggregates."""
+        inventory = self._tables['inventory']
+        for product_id, new_stock in stock:
+            row = self.products.row(product_id)
+            old_stock = int(inventory.get(row, 'Current Stock Quantity'))
+            if old_stock == new_stock:
+                continue
+            inventory.set(row, 'Current Stock Quantity', new_stock)
+            self._versions['inventory'] += 1
+            self.aggregates.on_stock_changed(
+                product_id,
+                float(inventory.get(row, 'Unit Price')),
+                old_stock,
+                new_stock,
+                int(inventory.get(row, 'Reorder Level')),
+            )
+
+    def _set_location_stock(self, stock):
+        """Mirrors committed (location_id, product_id, stock) rows into the per-location stock."""
+        for location_id, product_id, quantity in stock:
+            self._location_stock.setdefault(location_id, {})[product_id] = quantity
+        if stock:
+            self._versions['location_stock'] += 1
+
+    def _append(self, table, frame):
+        """Mirrors newly committed rows of one table into memory and the aggregates."""
+        if table == 'inventory':
+            for product_id, product_name, unit_price, stock, reorder_level in zip(
+                frame['Product ID'], frame['Product Name'], frame['Unit Price'],
+                frame['Current Stock Quantity'], frame['Reorder Level'],
+            ):
+                self.products.add(product_id, product_name)
+                self.aggregates.on_product_added(product_id, unit_price, stock, reorder_level)
+        elif table == 'sales_orders':
+            self.aggregates.total_sales += float(frame['Total Amount'].sum())
+            self.aggregates.customer_sales.add(
+                frame['Date'], frame['Customer Name'], np.ones(len(frame)), frame['Total Amount']
+            )
+        elif table == 'sales_history':
+            self.aggregates.product_sales.add(
+                frame['Date'], frame['Product ID'], frame['Quantity'], frame['Total Sale']
+            )
+            for date, total in frame.groupby('Date', sort=False)['Total Sale'].sum().items():
+                self.aggregates.on_sale(date, 0.0, [float(total)])
+            if self._hot_from is not None:
+                frame = frame[(frame['Date'] >= self._hot_from).to_numpy()]
+        self._tables[table].extend(frame)
+        self._versions[table] += 1
+        if table in self._search:
+            self._search[table].add_rows(frame)
+
+    # --- Reads ---
+
+    def inventory(self):
+        """Returns the inventory table; like every read, callers must not modify it."""
+        return self._tables['inventory'].view()
+
+    def sales_orders(self):
+        return self._tables['sales_orders'].view()
+
+    def purchase_orders(self):
+        return self._tables['purchase_orders'].view()
+
+    def customers(self):
+        return self._tables['customers'].view()
+
+    def suppliers(self):
+        return self._tables['suppliers'].view()
+
+    def order_lines(self):
+        """Returns the line items of every sale and purchase order, keyed by Order ID."""
+        return self._tables['order_lines'].view()
+
+    def sales_history(self):
+        """Returns the sales history held in memory: every month not yet sealed."""
+        return self._tables['sales_history'].view()
+
+    @metrics.timed_operation('repository.sales_history_range')
+    def sales_history_range(self, start=None, end=None, product_ids=None):
+        """Returns sales history rows with start <= Date <= end, optionally for some products.
+
+        Sealed months before the in-memory ones are read from the
+        memory-mapped partitions that overlap the range; the in-memory months
+        are filtered directly.
+        """
+        hot = self.sales_history()
+        keep = np.ones(len(hot), dtype=bool)
+        if start is not None:
+            keep &= hot['Date'].to_numpy() >= np.datetime64(pd.Timestamp(start), 's')
+        if end is not None:
+            keep &= hot['Date'].to_numpy() <= np.datetime64(pd.Timestamp(end), 's')
+        if product_ids is not None:
+            keep &= hot['Product ID'].isin(list(product_ids)).to_numpy()
+        pieces = [hot[keep]]
+        if self._hot_from is not None and (start is None or pd.Timestamp(start) < pd.Timestamp(self._hot_from)):
+            # Months from _hot_from on are held in memory, even if a process
+            # started after the month rolled over has since sealed them.
+            last_sealed = pd.Timestamp(self._hot_from) - pd.Timedelta(seconds=1)
+            upper = last_sealed if end is None else min(pd.Timestamp(end), last_sealed)
+            pieces.insert(0, self.history.query(start, upper, product_ids))
+        history = pd.concat(pieces, ignore_index=True) if len(pieces) > 1 else pieces[0].reset_index(drop=True)
+        return history.astype(dtypes('sales_history'))
+
+    @metrics.timed_operation('repository.search')
+    def search(self, table, query, limit=SEARCH_LIMIT):
+        """Returns up to `limit` distinct labels of `table` rows matching `query`, best first.
+
+        Customers and suppliers match on name, contact person, email and
+        phone, and return names; products match on name or ID and return
+        product names. An empty query returns the first rows.
+        """
+        index = self._search.get(table)
+        if index is None:
+            with self._sync_lock:
+                index = self._search.get(table)
+                if index is None:
+                    index = SearchIndex(SEARCH_FIELDS[table])
+                    index.add_rows(self._tables[table].view())
+                    self._search[table] = index
+        return list(dict.fromkeys(index.labels(index.search(query, limit))))
+
+    def count(self, table):
+        """Returns the number of rows in a table."""
+        return len(self._tables[table])
+
+    def table_sizes(self):
+        """Returns {table: (rows, approximate bytes)} for the in-memory tables."""
+        return {table: (len(loaded), loaded.nbytes) for table, loaded in self._tables.items()}
+
+    # --- Derived views ---
+
+    def _derived(self, key, tables, build):
+        """Returns `build()`, cached under `key` until one of `tables` changes; callers must not modify it."""
+        versions = tuple(self._versions[table] for table in tables)
+        return self.views.get(key, versions, build)
+
+    def low_stock_items(self):
+        """Inventory rows whose stock is at or below their reorder level."""
+        def build():
+            inventory = self.inventory()
+            return inventory[
+                inventory['Current Stock Quantity'].to_numpy() <= inventory['Reorder Level'].to_numpy()
+            ]
+        return self._derived(('low_stock_items',), ('inventory',), build)
+
+    def line_items(self, order_type):
+        """Lines of one order type ('sale' or 'purchase') with product names and line totals."""
+        import reports
+
+        return self._derived(
+            ('line_items', order_type), ('order_lines', 'inventory'),
+            lambda: reports.line_items(self.order_lines(), self.inventory(), order_type),
+        )
+
+    def totals_by_product(self, order_type):
+        """Units and amount per product for one order type, largest amount first."""
+        import reports
+
+        return self._derived(
+            ('totals_by_product', order_type), ('order_lines', 'inventory'),
+            lambda: reports.by_product(self.order_lines(), self.inventory(), order_type),
+        )
+
+    def purchases_by_supplier(self):
+        """Orders, units and amount bought from each supplier, largest amount first."""
+        import reports
+
+        return self._derived(
+            ('purchases_by_supplier',), ('order_lines', 'purchase_orders'),
+            lambda: reports.purchases_by_supplier(self.order_lines(), self.purchase_orders()),
+        )
+
+    def reorder_suggestions(self, window_days, lead_time_days, safety_days, cover_days):
+        """Products due for reordering with suggested quantities; see replenishment.suggest."""
+        import replenishment
+
+        end = date.today()
+
+        def build():
+            return replenishment.suggest(
+                self.inventory(),
+                self.sales_history_range(end - timedelta(days=window_days - 1), end),
+                replenishment.preferred_suppliers(self.order_lines(), self.purchase_orders()),
+                window_days, lead_time_days, safety_days, cover_days,
+            )
+        return self._derived(
+            ('reorder_suggestions', end, window_days, lead_time_days, safety_days, cover_days),
+            ('order_lines', 'purchase_orders', 'inventory', 'sales_history'),
+            build,
+        )
+
+    def top_products(self, k=5, window=None, by='count'):
+        """The `k` best-selling products by units ('count') or 'amount' over the last `window` days.
+
+        `window` None means all time. Served from the rolling counters, so no history is scanned.
+        """
+        top = self.aggregates.product_sales.top(k, window, by)
+        inventory = self._tables['inventory']
+        rows = [self.products.row(product_id) for product_id in top['Product ID']]
+        top.insert(1, 'Product Name', [
+            product_id if row is None else inventory.get(row, 'Product Name')
+            for product_id, row in zip(top['Product ID'], rows)
+        ])
+        return top
+
+    def top_customers(self, k=10, window=None, by='amount'):
+        """The `k` customers with the most sales 'amount' (or orders, 'count') over the last `window` days."""
+        return self.aggregates.customer_sales.top(k, window, by)
+
+    def product(self, product_id):
+        """Returns a product's inventory row as a dict, or None if it does not exist."""
+        row = self.products.row(product_id)
+        if row is None:
+            return None
+        inventory = self._tables['inventory']
+        return {name: inventory.get(row, name) for name in inventory.columns}
+
+    def product_by_name(self, product_name):
+        """Returns the inventory row of the product with this name, or None."""
+        product_id = self.products.id_for_name(product_name)
+        return None if product_id is None else self.product(product_id)
+
+    def product_id_for_name(self, product_name):
+        return self.products.id_for_name(product_name)
+
+    def get_stock(self, product_id, location_id=None):
+        """Returns the current stock of a product, at one location or in total; None if it does not exist."""
+        row = self.products.row(product_id)
+        if row is None:
+            return None
+        if location_id is not None:
+            return int(self._location_stock.get(location_id, {}).get(product_id, 0))
+        return int(self._tables['inventory'].get(row, 'Current Stock Quantity'))
+
+    def stock_at(self, location_id):
+        """Stock of every product held at one location, as a Product ID -> units Series."""
+        return pd.Series(self._location_stock.get(location_id, {}), dtype='int64')
+
+    # --- Locations ---
+
+    def locations(self):
+        return self._tables['locations'].view()
+
+    def location_names(self):
+        """{location_id: name} of every location, the default location first."""
+        locations = self._tables['locations']
+        return dict(zip(locations.column('Location ID'), locations.column('Name')))
+
+    def _stock_rows(self):
+        """Nonzero per-location stock as a frame of Location ID, Product ID and Stock."""
+        rows = [
+            (location_id, product_id, quantity)
+            for location_id, stock in self._location_stock.items()
+            for product_id, quantity in stock.items() if quantity
+        ]
+        return pd.DataFrame.from_records(rows, columns=['Location ID', 'Product ID', 'Stock'])
+
+    def stock_by_location(self):
+        """Stock of every product with one column per location and the consolidated total."""
+        def build():
+            inventory = self.inventory()
+            names = self.location_names()
+            rows = self._stock_rows()
+            table = rows.pivot_table(
+                index='Product ID', columns='Location ID', values='Stock', aggfunc='sum', fill_value=0
+            ).reindex(index=inventory['Product ID'].astype(str), columns=list(names), fill_value=0)
+            table.columns = list(names.values())
+            table.insert(0, 'Product Name', inventory['Product Name'].astype(str).to_numpy())
+            table['Total'] = inventory['Current Stock Quantity'].to_numpy()
+            return table.reset_index()
+        return self._derived(('stock_by_location',), ('location_stock', 'inventory', 'locations'), build)
+
+    def location_summary(self):
+        """Products held, units and stock value at each location."""
+        def build():
+            inventory = self.inventory()
+            rows = self._stock_rows()
+            prices = pd.Series(
+                inventory['Unit Price'].to_numpy(), index=inventory['Product ID'].astype(str).to_numpy()
+            )
+            rows['Stock Value'] = rows['Stock'].to_numpy() * prices.reindex(rows['Product ID']).to_numpy()
+            totals = rows.groupby('Location ID').agg(
+                **{'Products': ('Product ID', 'size'), 'Units': ('Stock', 'sum'), 'Stock Value': ('Stock Value', 'sum')}
+            )
+            locations = self.locations()
+            summary = pd.DataFrame({
+                'Location ID': locations['Location ID'].astype(str).to_numpy(),
+                'Name': locations['Name'].astype(str).to_numpy(),
+                'Kind': locations['Kind'].astype(str).to_numpy(),
+            })
+            return summary.join(totals, on='Location ID').fillna(
+                {'Products': 0, 'Units': 0, 'Stock Value': 0.0}
+            ).astype({'Products': 'int64', 'Units': 'int64'})
+        return self._derived(('location_summary',), ('location_stock', 'inventory', 'locations'), build)
+
+    # --- Stock ledger ---
+
+    def stock_movements(self, product_id=None, start=None, end=None, limit=1000, location_id=None):
+        """The newest `limit` stock movements between `start` and `end`, optionally of one product or location."""
+        with self._connect() as conn:
+            return stock_ledger.movements(conn, product_id, start, end, limit, location_id)
+
+    @metrics.timed_operation('repository.stock_as_of')
+    def stock_as_of(self, when, product_id=None):
+        """Stock of every product (or one) at `when`, rebuilt from the ledger; a date means its end.
+
+        Read from the nearest earlier snapshot plus the movements after it.
+        Returns Product ID, Product Name and Stock; products without stock
+        then, including those added since, show 0.
+        """
+        with self._connect() as conn:
+            conn.execute("BEGIN")
+            try:
+                stock = stock_ledger.stock_as_of(conn, when, product_id)
+            finally:
+                conn.execute("COMMIT")
+        inventory = self.inventory()
+        if product_id is not None:
+            inventory = inventory[(inventory['Product ID'] == product_id).to_numpy()]
+        ids = inventory['Product ID'].astype(str)
+        return pd.DataFrame({
+            'Product ID': ids.to_numpy(),
+            'Product Name': inventory['Product Name'].astype(str).to_numpy(),
+            'Stock': np.array([stock.get(product_id, 0) for product_id in ids], dtype='int64'),
+        })
+
+    def stock_discrepancies(self):
+        """Products whose stock differs from the ledger's balance; empty when the two agree."""
+        with self._connect() as conn:
+            conn.execute("BEGIN")
+            try:
+                return stock_ledger.discrepancies(conn)
+            finally:
+                conn.execute("COMMIT")
+
+    # --- Writes ---
+
+    def existing_ids(self, table, ids):
+        """Returns the subset of `ids` already present in the ID column of `table`."""
+        id_column = TABLES[table][ID_PREFIXES[table][0]]
+        ids = list(ids)
+        found = set()
+        with self._connect() as conn:
+            for start in range(0, len(ids), MAX_SQL_PARAMS):
+                batch = ids[start:start + MAX_SQL_PARAMS]
+                found.update(
+                    row[0] for row in conn.execute(
+                        f"SELECT {id_column} FROM {table} WHERE {id_column} IN "
+                        f"({', '.join('?' * len(batch))})",
+                        batch,
+                    )
+                )
+        return found
+
+    def ingested_orders(self, order_refs):
+        """Maps each of `order_refs` already recorded from a channel to the Order ID it became."""
+        with self._connect() as conn:
+            return _ingested_orders(conn, order_refs)
+
+    @metrics.timed_operation('repository.bulk_insert')
+    def bulk_insert(self, table, rows):
+        """Inserts a batch of coerced rows in one transaction.
+
+        Imported products hold their opening stock at the default location.
+        Imported orders are recorded as history: they do not change stock.
+        """
+        if not rows:
+            return
+        with self._transaction() as (conn, seq):
+            _insert(conn, table, rows)
+            if table == 'inventory':
+                opening = {row['Product ID']: row['Current Stock Quantity'] for row in rows}
+                _add_location_stock(conn, seq, DEFAULT_LOCATION, opening)
+                stock_ledger.record(conn, 'opening', opening, location_id=DEFAULT_LOCATION)
+        # Rows dated before the in-memory window belong to sealed months.
+        if table == 'sales_history' and self._hot_from is not None:
+            old_months = {month_of(row['Date']) for row in rows if row['Date'] < self._hot_from}
+            for month in sorted(old_months):
+                self._seal_month(month)
+
+    def add_product(self, product_name, description, unit_price, current_stock_quantity, reorder_level,
+                    location_id=DEFAULT_LOCATION):
+        """Adds a product whose opening stock is held at `location_id`; returns its Product ID."""
+        def write():
+            row = coerce_row('inventory', {
+                'Product ID': generate_unique_id('PROD'),
+                'Product Name': product_name,
+                'Description': description,
+                'Unit Price': unit_price,
+                'Current Stock Quantity': current_stock_quantity,
+                'Reorder Level': reorder_level,
+            })
+            opening = {row['Product ID']: row['Current Stock Quantity']}
+            with self._transaction() as (conn, seq):
+                _insert(conn, 'inventory', [row])
+                _add_location_stock(conn, seq, location_id, opening)
+                stock_ledger.record(conn, 'opening', opening, location_id=location_id)
+            return row['Product ID']
+
+        return _with_fresh_ids(write)
+
+    def add_customer(self, name, contact_person, email, phone, address):
+        return self._add_row('customers', {
+            'Name': name,
+            'Contact Person': contact_person,
+            'Email': email,
+            'Phone': phone,
+            'Address': address,
+        })
+
+    def add_supplier(self, name, contact_person, email, phone, address):
+        return self._add_row('suppliers', {
+            'Name': name,
+            'Contact Person': contact_person,
+            'Email': email,
+            'Phone': phone,
+            'Address': address,
+        })
+
+    def add_location(self, name, kind, address):
+        return self._add_row('locations', {
+            'Name': name,
+            'Kind': kind,
+            'Address': address,
+        })
+
+    def _add_row(self, table, row):
+        """Inserts one row under a newly generated ID and returns the ID."""
+        id_column, prefix = ID_PREFIXES[table]
+
+        def write():
+            new_row = coerce_row(table, {id_column: generate_unique_id(prefix), **row})
+            with self._transaction() as (conn, _):
+                _insert(conn, table, [new_row])
+            return new_row[id_column]
+
+        return _with_fresh_ids(write)
+
+    @metrics.timed_operation('repository.update_stock')
+    def update_stock(self, product_id, quantity_change, operation, location_id=DEFAULT_LOCATION):
+        """Updates the stock of a product at one location based on a sale or purchase.
+
+        A sale never takes the location's stock below zero; it raises InsufficientStockError instead.
+        """
+        product = self.product(product_id)
+        if product is None or operation not in ('sale', 'purchase'):
+            return
+        with self._transaction() as (conn, seq):
+            if operation == 'sale':
+                _take_stock(
+                    conn, seq, location_id, {product_id: quantity_change}, {product_id: product['Product Name']}
+                )
+                stock_ledger.record(conn, 'dispatch', {product_id: -quantity_change}, location_id=location_id)
+            else:
+                _add_stock(conn, seq, location_id, {product_id: quantity_change})
+                stock_ledger.record(conn, 'receipt', {product_id: quantity_change}, location_id=location_id)
+
+    @metrics.timed_operation('repository.transfer_stock')
+    def transfer_stock(self, from_location, to_location, items):
+        """Moves stock between two locations in one transaction and returns the transfer ID.
+
+        `items` are dicts with product_id, product_name and quantity. Raises
+        InsufficientStockError and moves nothing if the source location cannot
+        cover every line. Consolidated stock does not change.
+        """
+        transfer_id = generate_unique_id('TRF')
+        names = {item['product_id']: item['product_name'] for item in items}
+        quantities = _quantities(items)
+        with self._transaction() as (conn, seq):
+            _take_location_stock(conn, seq, from_location, quantities, names)
+            _add_location_stock(conn, seq, to_location, quantities)
+            stock_ledger.record(
+                conn, 'transfer', {product_id: -quantity for product_id, quantity in quantities.items()},
+                transfer_id, from_location,
+            )
+            stock_ledger.record(conn, 'transfer', quantities, transfer_id, to_location)
+        return transfer_id
+
+    @metrics.timed_operation('repository.record_sale')
+    def record_sale(self, customer_name, items, location_id=DEFAULT_LOCATION):
+        """Records a sale order, its history rows and the stock changes in one transaction.
+
+        `items` is a list of dicts with product_id, product_name, quantity and
+        unit_price. Stock is taken from `location_id`. Raises
+        InsufficientStockError and writes nothing if any line cannot be filled
+        from that location's stock committed at that moment.
+        """
+        return self.record_sales([(customer_name, items)], location_id)[0]
+
+    @metrics.timed_operation('repository.record_sales')
+    def record_sales(self, orders, location_id=DEFAULT_LOCATION, order_refs=None):
+        """Records a batch of (customer name, items) sale orders from one location in one transaction.
+
+        Orders, lines, history rows, stock changes and ledger movements are
+        written together. Returns the Order IDs in the same order; raises
+        InsufficientStockError and writes nothing if the location's stock no
+        longer covers the whole batch. `order_refs`, one external channel
+        reference per order, are stored with them; DuplicateOrderError is
+        raised and nothing written if any was recorded before.
+        """
+        def write():
+            date = today()
+            records, lines, history, names, quantities, sold = [], [], [], {}, {}, []
+            for customer_name, items in orders:
+                order = {
+                    'Order ID': generate_unique_id('SALE'),
+                    'Date': date,
+                    'Customer Name': customer_name,
+                    'Total Amount': sum(item['quantity'] * item['unit_price'] for item in items),
+                }
+                records.append(order)
+                lines += _order_lines(order['Order ID'], 'sale', items)
+                history += [
+                    {
+                        'Date': date,
+                        'Product ID': item['product_id'],
+                        'Product Name': item['product_name'],
+                        'Quantity': item['quantity'],
+                        'Total Sale': item['quantity'] * item['unit_price'],
+                    }
+                    for item in items
+                ]
+                names.update((item['product_id'], item['product_name']) for item in items)
+                order_quantities = _quantities(items)
+                sold.append((order['Order ID'], {product_id: -quantity for product_id, quantity in order_quantities.items()}))
+                for product_id, quantity in order_quantities.items():
+                    quantities[product_id] = quantities.get(product_id, 0) + quantity
+            records = coerce_rows('sales_orders', records)
+            lines = coerce_rows('order_lines', lines)
+            history = coerce_rows('sales_history', history)
+            with self._transaction() as (conn, seq):
+                if order_refs is not None:
+                    duplicates = _ingested_orders(conn, order_refs)
+                    if duplicates:
+                        raise DuplicateOrderError(list(duplicates))
+                    conn.executemany(
+                        "INSERT INTO channel_orders (order_ref, order_id) VALUES (?, ?)",
+                        zip(order_refs, (order['Order ID'] for order in records)),
+                    )
+                _take_stock(conn, seq, location_id, quantities, names)
+                stock_ledger.record_batch(conn, 'sale', sold, location_id)
+                _insert(conn, 'sales_orders', records)
+                _insert(conn, 'order_lines', lines)
+                _insert(conn, 'sales_history', history)
+            return [order['Order ID'] for order in records]
+
+        return _with_fresh_ids(write)
+
+    @metrics.timed_operation('repository.record_purchase')
+    def record_purchase(self, supplier_name, items, location_id=DEFAULT_LOCATION):
+        """Records a purchase order and the stock it receives at `location_id` in one transaction."""
+        return self.record_purchases([(supplier_name, items)], location_id)[0]
+
+    @metrics.timed_operation('repository.record_purchases')
+    def record_purchases(self, orders, location_id=DEFAULT_LOCATION):
+        """Records a batch of (supplier name, items) purchase orders received at one location in one transaction.
+
+        Returns their Order IDs in the same order; either all are written or none.
+        """
+        def write():
+            date = today()
+            records, lines, quantities, received = [], [], {}, []
+            for supplier_name, items in orders:
+                order = coerce_row('purchase_orders', {
+                    'Order ID': generate_unique_id('PURCH'),
+                    'Date': date,
+                    'Supplier Name': supplier_name,
+                    'Total Amount': sum(item['quantity'] * item['unit_price'] for item in items),
+                })
+                records.append(order)
+                lines += _order_lines(order['Order ID'], 'purchase', items)
+                received.append((order['Order ID'], _quantities(items)))
+                for product_id, quantity in received[-1][1].items():
+                    quantities[product_id] = quantities.get(product_id, 0) + quantity
+            lines = coerce_rows('order_lines', lines)
+            with self._transaction() as (conn, seq):
+                _add_stock(conn, seq, location_id, quantities)
+                for order_id, order_quantities in received:
+                    stock_ledger.record(conn, 'purchase', order_quantities, order_id, location_id)
+                _insert(conn, 'purchase_orders', records)
+                _insert(conn, 'order_lines', lines)
+            return [order['Order ID'] for order in records]
+
+        return _with_fresh_ids(write)
+
+
+def _with_fresh_ids(write):
+    """Runs `write`, which generates its IDs on each call, again if a generated ID was already taken."""
+    for attempt in range(ID_ATTEMPTS):
+        try:
+            return write()
+        except sqlite3.IntegrityError:
+            if attempt == ID_ATTEMPTS - 1:
+                raise
+
+
+@contextmanager
+def _atomic(conn):
+    """BEGIN IMMEDIATE ... COMMIT on an autocommit connection, rolled back on any error.
+
+    IMMEDIATE takes SQLite's write lock up front, so a transaction that reads
+    before writing can never fail halfway with a busy upgrade.
+    """
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    conn.execute("COMMIT")
+
+
+def _change_seq(conn):
+    return conn.execute("SELECT value FROM meta WHERE key = 'change_seq'").fetchone()[0]
+
+
+def _insert(conn, table, rows):
+    """Inserts rows already passed through coerce_row; the caller commits."""
+    columns = TABLES[table]
+    placeholders = ", ".join("?" * len(columns))
+    conn.executemany(
+        f"INSERT INTO {table} ({', '.join(columns.values())}) VALUES ({placeholders})",
+        [
+            tuple(row[name] for name in columns)
+            for row in rows
+        ],
+    )
+
+
+def _rows_after(conn, table, mark):
+    """Returns (frame, last rowid) of the rows stored after rowid `mark`, or (None, mark)."""
+    columns = TABLES[table]
+    rows = conn.execute(
+        f"SELECT rowid, {', '.join(columns.values())} FROM {table} WHERE rowid > ? ORDER BY rowid",
+        (mark,),
+    ).fetchall()
+    if not rows:
+        return None, mark
+    return pd.DataFrame.from_records([row[1:] for row in rows], columns=list(columns)), rows[-1][0]
+
+
+def _quantities(items):
+    """Total quantity per product over the lines of an order."""
+    quantities = {}
+    for item in items:
+        quantities[item['product_id']] = quantities.get(item['product_id'], 0) + int(item['quantity'])
+    return quantities
+
+
+def _by_location(rows):
+    """Groups (location_id, product_id, quantity) rows into {location_id: {product_id: quantity}}."""
+    grouped = {}
+    for location_id, product_id, quantity in rows:
+        grouped.setdefault(location_id, {})[product_id] = quantity
+    return grouped
+
+
+def _take_location_stock(conn, seq, location_id, quantities, names):
+    """Decrements one location's stock only where it covers the quantity; raises InsufficientStockError otherwise.
+
+    The condition and the decrement are one UPDATE, so no other session or
+    process can sell the same units in between. The caller's transaction is
+    rolled back by the raise, so earlier lines of the order are undone too.
+    """
+    for product_id, quantity in quantities.items():
+        updated = conn.execute(
+            "UPDATE location_stock SET stock_quantity = stock_quantity - ?, changed_seq = ? "
+            "WHERE location_id = ? AND product_id = ? AND stock_quantity >= ?",
+            (quantity, seq, location_id, product_id, quantity),
+        ).rowcount
+        if not updated:
+            row = conn.execute(
+                "SELECT stock_quantity FROM location_stock WHERE location_id = ? AND product_id = ?",
+                (location_id, product_id),
+            ).fetchone()
+            raise InsufficientStockError(names[product_id], quantity, 0 if row is None else row[0])
+
+
+def _add_location_stock(conn, seq, location_id, quantities):
+    conn.executemany(
+        "INSERT INTO location_stock (location_id, product_id, stock_quantity, changed_seq) VALUES (?, ?, ?, ?) "
+        "ON CONFLICT (location_id, product_id) DO UPDATE SET "
+        "stock_quantity = stock_quantity + excluded.stock_quantity, changed_seq = excluded.changed_seq",
+        [(location_id, product_id, quantity, seq) for product_id, quantity in quantities.items() if quantity],
+    )
+
+
+def _ingested_orders(conn, order_refs):
+    order_refs = list(order_refs)
+    found = {}
+    for start in range(0, len(order_refs), MAX_SQL_PARAMS):
+        batch = order_refs[start:start + MAX_SQL_PARAMS]
+        found.update(conn.execute(
+            f"SELECT order_ref, order_id FROM channel_orders WHERE order_ref IN ({', '.join('?' * len(batch))})",
+            batch,
+        ).fetchall())
+    return found
+
+
+def _take_stock(conn, seq, location_id, quantities, names):
+    """Takes stock out of one location and the products' consolidated totals; see _take_location_stock."""
+    _take_location_stock(conn, seq, location_id, quantities, names)
+    conn.executemany(
+        "UPDATE inventory SET stock_quantity = stock_quantity - ?, changed_seq = ? WHERE product_id = ?",
+        [(quantity, seq, product_id) for product_id, quantity in quantities.items()],
+    )
+
+
+def _add_stock(conn, seq, location_id, quantities):
+    _add_location_stock(conn, seq, location_id, quantities)
+    conn.executemany(
+        "UPDATE inventory SET stock_quantity = stock_quantity + ?, changed_seq = ? WHERE product_id = ?",
+        [(quantity, seq, product_id) for product_id, quantity in quantities.items()],
+    )
+
+
+def _order_lines(order_id, order_type, items):
+    """Builds order_lines rows from line-item dicts (product_id, quantity, unit_price)."""
+    return [
+        {
+            'Order ID': order_id,
+            'Order Type': order_type,
+            'Product ID': item['product_id'],
+            'Quantity': item['quantity'],
+            'Unit Price': item['unit_price'],
+        }
+        for item in items
+    ]
@@ -0,0 +1,180 @@
+"""Deterministic synthetic MSME data for benchmarks and demos.
+
+`generate` fills an empty Repository with products, customers, suppliers and
+sales and purchase orders spread over a date range. Product and customer
+popularity follow a Zipf-like curve, most orders have one to three lines,
+quantities are geometric and weekdays are busier than weekends, so reports
+and the dashboard see data shaped like a real shop's. The same arguments and
+seed always produce the same data, IDs included.
+"""
+
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+from schema import DATE_FORMAT
+
+# Named sizes used by benchmark.py; any of the counts can also be given directly.
+SCALES = {
+    'small': {'products': 200, 'customers': 100, 'suppliers': 20, 'orders': 5_000},
+    'medium': {'products': 2_000, 'customers': 1_000, 'suppliers': 100, 'orders': 50_000},
+    'large': {'products': 20_000, 'customers': 10_000, 'suppliers': 500, 'orders': 500_000},
+}
+
+# Orders written per bulk_insert batch.
+BATCH_ORDERS = 20_000
+
+MATERIALS = ['Steel', 'Brass', 'Cotton', 'PVC', 'Copper', 'Teak', 'Jute', 'Nylon', 'Granite', 'Ceramic']
+ITEMS = ['Bolt', 'Washer', 'Pipe', 'Sheet', 'Cable', 'Fabric', 'Bracket', 'Hinge', 'Valve', 'Tile', 'Rope', 'Panel']
+FIRMS = ['Sharma', 'Patel', 'Iyer', 'Gupta', 'Reddy', 'Khan', 'Mehta', 'Das', 'Nair', 'Singh']
+FIRM_KINDS = ['Traders', 'Enterprises', 'Industries', 'Agencies', 'Stores', 'Suppliers', 'Exports']
+FIRST_NAMES = ['Asha', 'Ravi', 'Meera', 'Arjun', 'Fatima', 'Vikram', 'Priya', 'Kiran', 'Sunil', 'Divya']
+CITIES = ['Pune', 'Surat', 'Coimbatore', 'Ludhiana', 'Indore', 'Jaipur', 'Nagpur', 'Kochi', 'Rajkot', 'Vadodara']
+
+
+def _ids(prefix, count):
+    return [f"{prefix}-{number:08x}" for number in range(count)]
+
+
+def _popularity(rng, count, exponent=1.1):
+    """Zipf-like selection weights, shuffled so popularity does not follow ID order."""
+    weights = 1.0 / (rng.permutation(count) + 1.0) ** exponent
+    return weights / weights.sum()
+
+
+def _order_dates(rng, count, start, end):
+    """Sorted order dates between start and end, busier on weekdays and later in the range."""
+    days = pd.date_range(start, end, freq='D')
+    weights = np.where(days.dayofweek < 5, 1.0, 0.6) * np.linspace(1.0, 1.5, len(days))
+    picked = np.sort(rng.choice(len(days), size=count, p=weights / weights.sum()))
+    return days[picked].strftime(DATE_FORMAT).to_numpy()
+
+
+def _order_lines(rng, orders, products, popularity, mean_extra_lines=1.2, max_lines=8):
+    """Returns (order index, product index) per line; no product repeats within an order."""
+    lines_per_order = 1 + np.minimum(rng.poisson(mean_extra_lines, size=orders), min(products, max_lines) - 1)
+    order_index = np.repeat(np.arange(orders), lines_per_order)
+    product_index = rng.choice(products, size=len(order_index), p=popularity)
+    _, first = np.unique(order_index * products + product_index, return_index=True)
+    first.sort()
+    return order_index[first], product_index[first]
+
+
+def _rows(columns):
+    """Turns a dict of equal-length lists into row dicts."""
+    names = list(columns)
+    return [dict(zip(names, values)) for values in zip(*(columns[name] for name in names))]
+
+
+def _parties(rng, prefix, count):
+    """Customer or supplier rows with plausible names and contact details."""
+    firms = rng.choice(FIRMS, size=count)
+    kinds = rng.choice(FIRM_KINDS, size=count)
+    contacts = rng.choice(FIRST_NAMES, size=count)
+    cities = rng.choice(CITIES, size=count)
+    phones = rng.integers(6_000_000_000, 9_999_999_999, size=count)
+    return _rows({
+        f"{'Customer' if prefix == 'CUST' else 'Supplier'} ID": _ids(prefix, count),
+        'Name': [f"{firm} {kind} {number}" for number, (firm, kind) in enumerate(zip(firms, kinds))],
+        'Contact Person': [f"{contact} {firm}" for contact, firm in zip(contacts, firms)],
+        'Email': [f"{contact.lower()}{number}@{firm.lower()}.example" for number, (contact, firm) in enumerate(zip(contacts, firms))],
+        'Phone': [f"+91 {phone}" for phone in phones.tolist()],
+        'Address': [f"{number % 200 + 1} Market Road, {city}" for number, city in enumerate(cities)],
+    })
+
+
+def _insert_orders(repo, rng, kind, ids, parties, party_popularity, inventory, popularity, start, end):
+    """Writes sales or purchase orders with their lines (and sales history) in batches."""
+    table, party_column, prefix = {
+        'sale': ('sales_orders', 'Customer Name', 'SALE'),
+        'purchase': ('purchase_orders', 'Supplier Name', 'PURCH'),
+    }[kind]
+    count = len(ids)
+    dates = _order_dates(rng, count, start, end)
+    party = np.asarray(parties)[rng.choice(len(parties), size=count, p=party_popularity)]
+    order_index, product_index = _order_lines(rng, count, len(inventory['ids']), popularity)
+    if kind == 'sale':
+        quantity = rng.geometric(0.4, size=len(order_index))
+        unit_price = inventory['prices'][product_index]
+    else:
+        # Purchases restock in larger lots, bought at roughly cost.
+        quantity = 10 * rng.geometric(0.3, size=len(order_index))
+        unit_price = np.round(inventory['prices'][product_index] * 0.7, 2)
+    line_total = quantity * unit_price
+    totals = np.bincount(order_index, weights=line_total, minlength=count)
+    bounds = np.searchsorted(order_index, np.arange(0, count + BATCH_ORDERS, BATCH_ORDERS).clip(max=count))
+    for batch, (first_line, last_line) in enumerate(zip(bounds[:-1], bounds[1:])):
+        orders = slice(batch * BATCH_ORDERS, min((batch + 1) * BATCH_ORDERS, count))
+        lines = slice(first_line, last_line)
+        line_orders = order_index[lines]
+        line_products = product_index[lines]
+        repo.bulk_insert(table, _rows({
+            'Order ID': ids[orders],
+            'Date': dates[orders].tolist(),
+            party_column: party[orders].tolist(),
+            'Total Amount': np.round(totals[orders], 2).tolist(),
+        }))
+        repo.bulk_insert('order_lines', _rows({
+            'Order ID': [ids[order] for order in line_orders.tolist()],
+            'Order Type': [kind] * len(line_orders),
+            'Product ID': [inventory['ids'][product] for product in line_products.tolist()],
+            'Quantity': quantity[lines].tolist(),
+            'Unit Price': unit_price[lines].tolist(),
+        }))
+        if kind == 'sale':
+            repo.bulk_insert('sales_history', _rows({
+                'Date': dates[line_orders].tolist(),
+                'Product ID': [inventory['ids'][product] for product in line_products.tolist()],
+                'Product Name': [inventory['names'][product] for product in line_products.tolist()],
+                'Quantity': quantity[lines].tolist(),
+                'Total Sale': np.round(line_total[lines], 2).tolist(),
+            }))
+
+
+def generate(repo, products=200, customers=100, suppliers=20, orders=5_000, purchases=None,
+             start=None, end=None, seed=0):
+    """Fills an empty repository with synthetic data and returns the row counts written.
+
+    `orders` sales orders and `purchases` purchase orders (a tenth of
+    `orders` by default) fall between `start` and `end`, which default to the
+    year up to today. Imported orders are history, so stock levels are the
+    generated ones rather than the result of replaying the orders.
+    """
+    rng = np.random.default_rng(seed)
+    end = date.today() if end is None else pd.Timestamp(end).date()
+    start = end - timedelta(days=365) if start is None else pd.Timestamp(start).date()
+    purchases = max(1, orders // 10) if purchases is None else purchases
+
+    product_ids = _ids('PROD', products)
+    product_names = [
+        f"{material} {item} {number}"
+        for number, (material, item) in enumerate(zip(rng.choice(MATERIALS, size=products), rng.choice(ITEMS, size=products)))
+    ]
+    prices = np.round(rng.lognormal(np.log(250.0), 0.9, size=products), 2).clip(min=1.0)
+    repo.bulk_insert('inventory', _rows({
+        'Product ID': product_ids,
+        'Product Name': product_names,
+        'Description': [f"Synthetic {name.split()[1].lower()} stock item" for name in product_names],
+        'Unit Price': prices.tolist(),
+        'Current Stock Quantity': rng.integers(0, 500, size=products).tolist(),
+        'Reorder Level': rng.integers(5, 50, size=products).tolist(),
+    }))
+    customer_rows = _parties(rng, 'CUST', customers)
+    supplier_rows = _parties(rng, 'SUPPL', suppliers)
+    repo.bulk_insert('customers', customer_rows)
+    repo.bulk_insert('suppliers', supplier_rows)
+
+    inventory = {'ids': product_ids, 'names': product_names, 'prices': prices}
+    popularity = _popularity(rng, products)
+    _insert_orders(
+        repo, rng, 'sale', _ids('SALE', orders), [row['Name'] for row in customer_rows],
+        _popularity(rng, customers), inventory, popularity, start, end,
+    )
+    _insert_orders(
+        repo, rng, 'purchase', _ids('PURCH', purchases), [row['Name'] for row in supplier_rows],
+        _popularity(rng, suppliers), inventory, popularity, start, end,
+    )
+    return {table: repo.count(table) for table in (
+        'inventory', 'customers', 'suppliers', 'sales_orders', 'purchase_orders', 'order_lines',
+    )}
@@ -0,0 +1,153 @@
+"""Paged, searchable, sortable table views for the MSME360 pages.
+
+Search, filters and sorting run on the server over the full table, and only
+the visible page is styled and sent to `st.dataframe`, so views stay
+responsive on tables with hundreds of thousands of rows. Pickers likewise
+offer only the best matches of a search box rather than every name.
+"""
+
+import math
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+import metrics
+
+PAGE_SIZES = [25, 50, 100, 250]
+
+LOW_STOCK_STYLE = 'background-color: #ffcccc'
+
+
+def low_stock_mask(inventory):
+    """Vectorized low-stock test: stock at or below the reorder level."""
+    return (
+        inventory['Current Stock Quantity'].to_numpy() <= inventory['Reorder Level'].to_numpy()
+    )
+
+
+def highlight_low_stock(page):
+    """Returns a Styler.apply(axis=None) style frame marking low-stock rows."""
+    styles = np.where(low_stock_mask(page), LOW_STOCK_STYLE, '')
+    return pd.DataFrame(
+        np.repeat(styles[:, None], page.shape[1], axis=1), index=page.index, columns=page.columns
+    )
+
+
+def text_columns(frame):
+    """Categorical columns and object columns holding strings; these are searchable and sortable."""
+    columns = []
+    for column in frame.columns:
+        values = frame[column]
+        if isinstance(values.dtype, pd.CategoricalDtype) or pd.api.types.is_string_dtype(values.dtype):
+            first = values.iloc[0] if len(values) else ''
+            if isinstance(values.dtype, pd.CategoricalDtype) or isinstance(first, str):
+                columns.append(column)
+    return columns
+
+
+def sortable_columns(frame):
+    text = set(text_columns(frame))
+    return [column for column in frame.columns if frame[column].dtype != object or column in text]
+
+
+def _search_mask(frame, search, columns):
+    """Case-insensitive substring match of `search` in any of `columns`."""
+    needle = search.casefold()
+    mask = np.zeros(len(frame), dtype=bool)
+    for column in columns:
+        values = frame[column]
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            # Match each distinct value once, then select rows by code.
+            hits = np.array(
+                [needle in str(value).casefold() for value in values.cat.categories] + [False],
+                dtype=bool,
+            )
+            mask |= hits[values.cat.codes.to_numpy()]
+        else:
+            mask |= values.astype(str).str.casefold().str.contains(needle, regex=False).to_numpy()
+    return mask
+
+
+def _sort_key(values):
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        # Rank the distinct values once instead of sorting row strings.
+        categories = values.cat.categories
+        rank = np.empty(len(categories) + 1, dtype=np.int64)
+        rank[np.argsort(np.asarray(categories, dtype=str), kind='stable')] = np.arange(len(categories))
+        rank[-1] = len(categories)
+        return rank[values.cat.codes.to_numpy()]
+    return values.to_numpy()
+
+
+@metrics.timed_operation('table_view.filter_rows')
+def filter_rows(frame, search="", search_columns=None, mask=None):
+    """Returns the positions of rows that pass `mask` and match `search`."""
+    keep = np.ones(len(frame), dtype=bool) if mask is None else np.asarray(mask, dtype=bool)
+    if search:
+        if search_columns is None:
+            search_columns = text_columns(frame)
+        keep &= _search_mask(frame, search, search_columns)
+    return np.flatnonzero(keep)
+
+
+@metrics.timed_operation('table_view.page_rows')
+def page_rows(frame, positions, sort_by=None, ascending=True, page=1, page_size=PAGE_SIZES[0]):
+    """Sorts the selected row positions by one column and returns one page of `frame`."""
+    if sort_by is not None:
+        key = _sort_key(frame[sort_by].iloc[positions])
+        order = np.argsort(key, kind='stable')
+        positions = positions[order[::-1] if not ascending else order]
+    start = (max(page, 1) - 1) * page_size
+    return frame.iloc[positions[start:start + page_size]]
+
+
+def search_options(repo, table, label, key, placeholder="", keep=()):
+    """Renders a search box and returns picker options: the `keep` values, then the best matches.
+
+    Put it outside any st.form: widgets inside a form do not rerun until it is submitted.
+    """
+    query = st.text_input(label, key=key, placeholder=placeholder)
+    return list(dict.fromkeys(list(keep) + repo.search(table, query)))
+
+
+def paged_table(frame, key, highlight=None, filters=None, search_columns=None):
+    """Renders `frame` as a paged table with search, sort and optional filters.
+
+    `highlight` is a Styler.apply(axis=None) function applied to the visible
+    page only. `filters` maps a checkbox label to a function returning a
+    boolean row mask over the full frame.
+    """
+    search_col, sort_col, order_col, size_col = st.columns([3, 2, 1, 1])
+    search = search_col.text_input("Search", key=f"{key}_search")
+    sort_by = sort_col.selectbox(
+        "Sort by", [None] + sortable_columns(frame), key=f"{key}_sort",
+        format_func=lambda column: "(none)" if column is None else column,
+    )
+    descending = order_col.toggle("Descending", key=f"{key}_desc")
+    page_size = size_col.selectbox("Rows", PAGE_SIZES, key=f"{key}_size")
+
+    mask = None
+    for label, filter_mask in (filters or {}).items():
+        if st.checkbox(label, key=f"{key}_filter_{label}"):
+            rows = filter_mask(frame)
+            mask = rows if mask is None else mask & rows
+
+    positions = filter_rows(frame, search, search_columns, mask)
+    total = len(positions)
+    pages = max(1, math.ceil(total / page_size))
+    if st.session_state.get(f"{key}_page", 1) > pages:
+        st.session_state[f"{key}_page"] = pages
+    page = st.number_input(
+        f"Page (of {pages:,})", min_value=1, max_value=pages, step=1, key=f"{key}_page"
+    )
+    visible = page_rows(frame, positions, sort_by, not descending, page, page_size)
+    if highlight is not None and not visible.empty:
+        # The Styler is evaluated when st.dataframe serializes it.
+        with metrics.timed('operation', 'table_view.style'):
+            st.dataframe(visible.style.apply(highlight, axis=None))
+    else:
+        st.dataframe(visible)
+    first = (page - 1) * page_size
+    st.caption(f"Showing rows {min(first + 1, total):,}–{first + len(visible):,} of {total:,}")
+    return visible
@@ -0,0 +1,56 @@
+"""Version-keyed cache of derived views for MSME360.
+
+The repository keeps a version counter per table and bumps it whenever
+refresh mirrors new rows or changed stock into that table, whichever session
+or process made the write. A derived view (the low-stock subset, order-line
+reports) is cached together with the versions of the tables it was built
+from, so every page and session reuses it until one of those tables changes.
+Entries are evicted least recently used beyond MAX_VIEWS.
+"""
+
+import threading
+from collections import OrderedDict
+
+# Cached views kept per repository; each is a frame derived from whole tables.
+MAX_VIEWS = 32
+
+
+class ViewCache:
+    """LRU cache of views keyed by name and arguments, valid while their table versions hold."""
+
+    def __init__(self, max_views=MAX_VIEWS):
+        self.max_views = max_views
+        self.hits = 0
+        self.misses = 0
+        self._views = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._views)
+
+    def get(self, key, versions, build):
+        """Returns the view cached under `key` if it was built at `versions`, else builds it.
+
+        `build` runs outside the lock, so a slow view never holds up other
+        lookups; two sessions missing together may both build it, and the
+        last one is kept.
+        """
+        with self._lock:
+            cached = self._views.get(key)
+            if cached is not None and cached[0] == versions:
+                self._views.move_to_end(key)
+                self.hits += 1
+                return cached[1]
+            self.misses += 1
+        view = build()
+        with self._lock:
+            self._views[key] = (versions, view)
+            self._views.move_to_end(key)
+            while len(self._views) > self.max_views:
+                self._views.popitem(last=False)
+        return view
+
+    def clear(self):
+        with self._lock:
+            self._views.clear()
+            self.hits = self.misses = 0